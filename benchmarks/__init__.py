@@ -0,0 +1,16 @@
+"""
+Benchmarks for django-sms, run using asv (https://asv.readthedocs.io/).
+"""
+import django  # type: ignore
+from django.conf import settings  # type: ignore
+
+if not settings.configured:
+    settings.configure(
+        SECRET_KEY="it's a secret to everyone",
+        SMS_BACKEND='sms.backends.locmem.SmsBackend',
+        DEFAULT_FROM_SMS='+12065550100',
+        MESSAGEBIRD_ACCESS_KEY='benchmark_access_key',
+        TWILIO_ACCOUNT_SID='benchmark_account_sid',
+        TWILIO_AUTH_TOKEN='benchmark_auth_token',
+    )
+    django.setup()
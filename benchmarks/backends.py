@@ -0,0 +1,63 @@
+"""
+Benchmarks of the backends writing text messages locally.
+"""
+import io
+import shutil
+import tempfile
+
+from sms import get_connection
+from sms.message import Message
+
+from benchmarks.pipeline import BODY, ORIGINATOR, recipients
+
+MESSAGES = [1, 100, 10_000]
+
+
+class Console:
+    params = MESSAGES
+    param_names = ['messages']
+
+    def setup(self, count: int) -> None:
+        self.messages = [
+            Message(BODY, ORIGINATOR, [recipient])
+            for recipient in recipients(count)
+        ]
+
+    def time_send_messages(self, count: int) -> None:
+        connection = get_connection(
+            'sms.backends.console.SmsBackend', stream=io.StringIO()
+        )
+        connection.send_messages(self.messages)  # type: ignore
+
+
+class FileBased:
+    params = [MESSAGES, ['message', 'batch', 'bytes'], [False, True]]
+    param_names = ['messages', 'flush_policy', 'rotate']
+
+    def setup(self, count: int, flush_policy: str, rotate: bool) -> None:
+        self.messages = [
+            Message(BODY, ORIGINATOR, [recipient])
+            for recipient in recipients(count)
+        ]
+        self.file_path = tempfile.mkdtemp()
+
+    def teardown(self, count: int, flush_policy: str, rotate: bool) -> None:
+        from sms.backends import filebased
+
+        filebased.close_rotating_files()
+        shutil.rmtree(self.file_path)
+
+    def time_send_messages(
+        self,
+        count: int,
+        flush_policy: str,
+        rotate: bool
+    ) -> None:
+        connection = get_connection(
+            'sms.backends.filebased.SmsBackend',
+            file_path=self.file_path,
+            flush_policy=flush_policy,
+            max_bytes=1024 * 1024 if rotate else None,
+        )
+        connection.send_messages(self.messages)  # type: ignore
+        connection.close()  # type: ignore
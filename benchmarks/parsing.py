@@ -0,0 +1,68 @@
+"""
+Benchmarks of parsing files written by the file backend using sms.utils.
+"""
+import gzip
+import os
+import shutil
+
+from sms import get_connection
+from sms.message import Message
+from sms.utils import iter_messages_from_path
+
+from benchmarks.pipeline import BODY, ORIGINATOR, recipients
+
+
+class IterMessages:
+    params = [[1_000, 100_000], ['readline', 'mmap', 'gzip']]
+    param_names = ['messages', 'mode']
+    timeout = 300
+
+    def setup_cache(self) -> str:
+        """
+        Write the files once, shared by all parameter combinations. asv runs
+        this in a temporary directory, which is removed afterwards.
+        """
+        file_path = os.path.abspath('messages')
+        for count in self.params[0]:
+            connection = get_connection(
+                'sms.backends.filebased.SmsBackend',
+                file_path=os.path.join(file_path, str(count)),
+                flush_policy='batch',
+            )
+            connection.send_messages([  # type: ignore
+                Message(BODY, ORIGINATOR, [recipient])
+                for recipient in recipients(count)
+            ])
+            connection.close()  # type: ignore
+            path = connection._fname  # type: ignore
+            with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        return file_path
+
+    def path(self, file_path: str, count: int, mode: str) -> str:
+        directory = os.path.join(file_path, str(count))
+        suffix = '.gz' if mode == 'gzip' else '.log'
+        name = next(
+            name for name in os.listdir(directory) if name.endswith(suffix)
+        )
+        return os.path.join(directory, name)
+
+    def time_iter_messages_from_path(
+        self,
+        file_path: str,
+        count: int,
+        mode: str
+    ) -> None:
+        path = self.path(file_path, count, mode)
+        for _ in iter_messages_from_path(path, use_mmap=mode == 'mmap'):
+            pass
+
+    def peakmem_iter_messages_from_path(
+        self,
+        file_path: str,
+        count: int,
+        mode: str
+    ) -> None:
+        path = self.path(file_path, count, mode)
+        for _ in iter_messages_from_path(path, use_mmap=mode == 'mmap'):
+            pass
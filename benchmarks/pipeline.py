@@ -0,0 +1,199 @@
+"""
+Benchmarks of sending text messages through the public API.
+"""
+import time
+from typing import Iterator, List, Tuple
+
+from django.test.utils import override_settings  # type: ignore
+
+import sms
+from sms import dedup, get_connection, phonenumbers, send_mass_sms, send_sms
+from sms.encoding import segment
+from sms.message import Message, TemplateMessage
+
+BACKENDS = ['sms.backends.dummy.SmsBackend', 'sms.backends.locmem.SmsBackend']
+RECIPIENTS = [1, 100, 10_000, 1_000_000]
+
+BODY = 'Here is the message'
+ORIGINATOR = '+12065550100'
+
+
+def recipients(count: int) -> List[str]:
+    return [f'+316{i:08d}' for i in range(count)]
+
+
+def datatuple(count: int) -> Iterator[Tuple[str, str, List[str]]]:
+    for recipient in recipients(count):
+        yield BODY, ORIGINATOR, [recipient]
+
+
+class SingleSend:
+    """Sending a single text message, including creating the connection."""
+    params = BACKENDS
+    param_names = ['backend']
+
+    def setup(self, backend: str) -> None:
+        self.settings = override_settings(SMS_BACKEND=backend)
+        self.settings.enable()
+        sms.outbox = []  # type: ignore
+
+    def teardown(self, backend: str) -> None:
+        self.settings.disable()
+
+    def time_get_connection(self, backend: str) -> None:
+        get_connection()
+
+    def time_message_send(self, backend: str) -> None:
+        Message(BODY, ORIGINATOR, ['+31612345678']).send()
+
+    def time_send_sms(self, backend: str) -> None:
+        send_sms(BODY, ORIGINATOR, ['+31612345678'])
+
+
+class MassSend:
+    """Sending text messages to many recipients over a single connection."""
+    params = [BACKENDS, RECIPIENTS]
+    param_names = ['backend', 'recipients']
+    timeout = 600
+
+    def setup(self, backend: str, count: int) -> None:
+        if backend.endswith('locmem.SmsBackend') and count > 10_000:
+            # Keeping a million messages in the outbox measures the outbox
+            raise NotImplementedError
+        self.connection = get_connection(backend)
+        self.message = Message(BODY, ORIGINATOR, recipients(count))
+
+    def teardown(self, backend: str, count: int) -> None:
+        sms.outbox = []  # type: ignore
+
+    def time_send_mass_sms(self, backend: str, count: int) -> None:
+        sms.outbox = []  # type: ignore
+        send_mass_sms(datatuple(count), connection=self.connection)
+
+    def peakmem_send_mass_sms(self, backend: str, count: int) -> None:
+        send_mass_sms(datatuple(count), connection=self.connection)
+
+    def time_send_messages(self, backend: str, count: int) -> None:
+        sms.outbox = []  # type: ignore
+        self.connection.send_messages([self.message])  # type: ignore
+
+    def track_send_mass_sms_rate(self, backend: str, count: int) -> float:
+        sms.outbox = []  # type: ignore
+        started = time.perf_counter()
+        send_mass_sms(datatuple(count), connection=self.connection)
+        return count / (time.perf_counter() - started)
+
+    track_send_mass_sms_rate.unit = 'messages/s'  # type: ignore
+
+
+class Construct:
+    """Creating text messages to many recipients, one recipient each."""
+    params = [1_000, 100_000]
+    param_names = ['recipients']
+
+    def setup(self, count: int) -> None:
+        self.recipients = recipients(count)
+
+    def time_messages(self, count: int) -> None:
+        [Message(BODY, ORIGINATOR, [r]) for r in self.recipients]
+
+    def time_bulk(self, count: int) -> None:
+        Message.bulk(BODY, ORIGINATOR, self.recipients)
+
+    def peakmem_messages(self, count: int) -> None:
+        [Message(BODY, ORIGINATOR, [r]) for r in self.recipients]
+
+    def peakmem_bulk(self, count: int) -> None:
+        Message.bulk(BODY, ORIGINATOR, self.recipients)
+
+
+class Deduplicate:
+    """Sending a text message to many recipients with deduplication."""
+    params = [[0, 300], [10_000, 1_000_000]]
+    param_names = ['ttl', 'recipients']
+    timeout = 600
+
+    def setup(self, ttl: int, count: int) -> None:
+        self.message = Message(BODY, ORIGINATOR, recipients(count))
+
+    def time_send_messages(self, ttl: int, count: int) -> None:
+        # A new connection, so the recipients weren't sent before
+        connection = get_connection(
+            'sms.backends.dummy.SmsBackend',
+            deduplicate={'ttl': ttl, 'max_size': count}
+        )
+        connection.send_messages([self.message])  # type: ignore
+        dedup._deduplicators.clear()
+
+
+class Segment:
+    """Splitting bodies in SMS segments, without the cache."""
+    params = [['GSM-7', 'GSM-7 extended', 'UCS-2'], [160, 1600]]
+    param_names = ['encoding', 'length']
+
+    def setup(self, encoding: str, length: int) -> None:
+        char = {'GSM-7': 'a', 'GSM-7 extended': '€', 'UCS-2': '\U0001F600'}
+        self.body = ('a' * 9 + char[encoding]) * (length // 10)
+
+    def time_segment(self, encoding: str, length: int) -> None:
+        segment.__wrapped__(self.body)  # type: ignore
+
+
+class Normalize:
+    """Normalizing phone numbers to the E.164 format."""
+    params = [['e164', 'national'], [10_000, 1_000_000]]
+    param_names = ['format', 'recipients']
+
+    def setup(self, format: str, count: int) -> None:
+        self.numbers = recipients(count)
+        if format == 'national':
+            self.numbers = [f'06 {n[4:]}' for n in self.numbers]
+
+    def time_normalize_many(self, format: str, count: int) -> None:
+        phonenumbers.normalize_many(self.numbers, '31')
+
+
+class Personalize:
+    """
+    Sending personalized text messages, as a message per recipient or as a
+    template message with a context per recipient.
+    """
+    params = [['messages', 'template'], [1, 100, 10_000], [10_000, 100_000]]
+    param_names = ['method', 'distinct', 'recipients']
+
+    def setup(self, method: str, distinct: int, count: int) -> None:
+        self.contexts = [
+            (recipient, {'name': f'Name {i % distinct}'})
+            for i, recipient in enumerate(recipients(count))
+        ]
+        self.connection = get_connection('sms.backends.locmem.SmsBackend')
+        sms.outbox = []  # type: ignore
+
+    def teardown(self, method: str, distinct: int, count: int) -> None:
+        sms.outbox = []  # type: ignore
+
+    def send(self, method: str) -> None:
+        if method == 'messages':
+            messages = [
+                Message('Hi {name}'.format_map(context), ORIGINATOR, [r])
+                for r, context in self.contexts
+            ]
+        else:
+            messages = [
+                TemplateMessage('Hi {name}', ORIGINATOR, self.contexts)
+            ]
+        self.connection.send_messages(messages)
+
+    def time_send(self, method: str, distinct: int, count: int) -> None:
+        self.send(method)
+
+    def track_backend_messages(
+        self,
+        method: str,
+        distinct: int,
+        count: int
+    ) -> int:
+        """The number of text messages received by the backend."""
+        sms.outbox = []  # type: ignore
+        self.send(method)
+        return len(sms.outbox)  # type: ignore
@@ -0,0 +1,84 @@
+"""
+Benchmarks of the provider backends against a stub HTTP API.
+"""
+from typing import Any
+
+from sms import get_connection, pool
+from sms.message import Message
+
+from benchmarks.pipeline import BODY, ORIGINATOR, recipients
+from benchmarks.stubs import StubServer
+
+BACKENDS = [
+    'sms.backends.http.TwilioSmsBackend',
+    'sms.backends.http.MessageBirdSmsBackend',
+    'sms.backends.twilio.SmsBackend',
+    'sms.backends.messagebird.SmsBackend',
+]
+
+
+def get_stub_connection(backend: str, url: str, **kwargs) -> Any:
+    """Return a connection of the backend sending to the stub API."""
+    if backend.startswith('sms.backends.http.'):
+        return get_connection(backend, url=url, **kwargs)
+    connection = get_connection(backend, **kwargs)
+    if backend == 'sms.backends.twilio.SmsBackend':
+        connection.client.api.base_url = url  # type: ignore
+    return connection
+
+
+class Providers:
+    params = [BACKENDS, [0, 0.01], [1, 8], [1, 100]]
+    param_names = ['backend', 'latency', 'max_workers', 'recipients']
+    timeout = 300
+
+    def setup(
+        self,
+        backend: str,
+        latency: float,
+        max_workers: int,
+        count: int
+    ) -> None:
+        import messagebird.client  # type: ignore
+
+        self.server = StubServer(latency).start()
+        # The MessageBird backend reads the endpoint of the SDK per request
+        self.endpoint = messagebird.client.ENDPOINT
+        messagebird.client.ENDPOINT = self.server.url
+        self.connection = get_stub_connection(
+            backend, self.server.url, max_workers=max_workers
+        )
+        self.message = Message(BODY, ORIGINATOR, recipients(count))
+
+    def teardown(
+        self,
+        backend: str,
+        latency: float,
+        max_workers: int,
+        count: int
+    ) -> None:
+        import messagebird.client  # type: ignore
+
+        messagebird.client.ENDPOINT = self.endpoint
+        self.server.stop()
+        pool.close_sessions()
+
+    def time_send_messages(
+        self,
+        backend: str,
+        latency: float,
+        max_workers: int,
+        count: int
+    ) -> None:
+        self.connection.send_messages([self.message])
+
+    def time_send_messages_opened(
+        self,
+        backend: str,
+        latency: float,
+        max_workers: int,
+        count: int
+    ) -> None:
+        with self.connection:
+            for _ in range(3):
+                self.connection.send_messages([self.message])
@@ -0,0 +1,94 @@
+"""
+Measure the import time and memory of sms and its backend modules.
+
+Each module is imported in a fresh interpreter, so the measurements include
+everything the module pulls in, like Django or a provider SDK. Usage:
+
+    python benchmarks/startup.py [--repeat N] [module ...]
+
+The import times are also tracked by asv as the Import benchmarks.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    'sms',
+    'sms.backends.base',
+    'sms.backends.console',
+    'sms.backends.filebased',
+    'sms.backends.http',
+    'sms.backends.locmem',
+    'sms.backends.messagebird',
+    'sms.backends.outbox',
+    'sms.backends.queued',
+    'sms.backends.router',
+    'sms.backends.twilio',
+]
+
+# Imports the module and prints the import time, the growth of the maximum
+# resident set size and the total number of imported modules.
+CODE = '''
+import json, resource, sys, time
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.perf_counter()
+__import__(sys.argv[1])
+duration = time.perf_counter() - started
+grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+modules = len(sys.modules)
+print(json.dumps({'time': duration, 'rss': grown, 'modules': modules}))
+'''
+
+
+class Import:
+    params = MODULES
+    param_names = ['module']
+
+    def timeraw_import(self, module: str) -> str:
+        return f'import {module}'
+
+
+def measure(module: str, repeat: int) -> dict:
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [root, env.get('PYTHONPATH')])
+    )
+    runs = [
+        json.loads(subprocess.run(
+            [sys.executable, '-c', CODE, module],
+            check=True,
+            capture_output=True,
+            env=env,
+            text=True
+        ).stdout)
+        for _ in range(repeat)
+    ]
+    return {
+        'time': statistics.median(run['time'] for run in runs),
+        'rss': statistics.median(run['rss'] for run in runs),
+        'modules': runs[0]['modules'],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'module':<28} {'import (ms)':>12} {'RSS growth (KiB)':>17} "
+          f"{'modules':>8}")
+    for module in args.modules:
+        result = measure(module, args.repeat)
+        print(
+            f"{module:<28} {result['time'] * 1000:>12.1f} "
+            f"{result['rss']:>17.0f} {result['modules']:>8}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+A stub HTTP API standing in for the providers, with injected latency.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A response body accepted by both the Twilio and the MessageBird SDK
+RESPONSE = b'{"sid": "SM1", "id": "1", "recipients": {"items": []}}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send the headers and body without waiting for the client's ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.server.latency)  # type: ignore
+        self.send_response(201)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0) -> None:
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.latency = latency
+        self.url = f'http://127.0.0.1:{self.server_port}'
+
+    def start(self) -> 'StubServer':
+        threading.Thread(
+            target=self.serve_forever, args=(0.01,), daemon=True
+        ).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
@@ -1,24 +1,82 @@
 """
 Tools for sending text messages.
 """
-from typing import List, Optional, Type, Union
+from importlib import import_module
+from itertools import islice
+from typing import (
+    TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple, Type, Union
+)
 
 from django.conf import settings  # type: ignore
+from django.core.signals import setting_changed  # type: ignore
+from django.dispatch import receiver  # type: ignore
 from django.utils.module_loading import import_string  # type: ignore
 
-from sms.backends.base import BaseSmsBackend
-from sms.message import Message
+if TYPE_CHECKING:
+    from sms.backends.base import BaseSmsBackend
+    from sms.message import Message, TemplateMessage
 
 __all__ = [
-    'Message', 'get_connection', 'send_sms'
+    'Message', 'TemplateMessage', 'get_connection', 'send_sms',
+    'send_mass_sms', 'asend_sms'
 ]
 
+# Names imported on first access, so importing sms stays cheap for code that
+# never sends text messages
+_lazy_names = {
+    'BaseSmsBackend': 'sms.backends.base',
+    'Message': 'sms.message',
+    'TemplateMessage': 'sms.message',
+}
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module = _lazy_names[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_lazy_names))
+
+
+# Backend classes resolved by get_connection(), keyed by their dotted path
+_backend_classes: Dict[str, Type['BaseSmsBackend']] = {}
+
+
+@receiver(setting_changed)
+def clear_backend_classes(*, setting: str, **kwargs) -> None:
+    """Clear the backend class cache when the SMS_BACKEND setting changes."""
+    if setting == 'SMS_BACKEND':
+        _backend_classes.clear()
+
+
+def get_backend_class(
+    backend: Optional[str] = None
+) -> Type['BaseSmsBackend']:
+    """Return the SMS backend class for the given dotted path.
+
+    If backend is None (default), use settings.SMS_BACKEND.
+
+    The class is only imported the first time a dotted path is requested.
+    """
+    path = backend or settings.SMS_BACKEND
+    try:
+        return _backend_classes[path]
+    except KeyError:
+        klass = _backend_classes[path] = import_string(path)
+        return klass
+
 
 def get_connection(
     backend: Optional[str] = None,
     fail_silently: bool = False,
     **kwargs
-) -> Type[BaseSmsBackend]:
+) -> 'BaseSmsBackend':
     """Load a SMS backend and return an instance of it.
 
     If backend is None (default), use settings.SMS_BACKEND.
@@ -26,7 +84,7 @@ def get_connection(
     Both fail_silently and other keyword arguments are used in the constructor
     of the backend.
     """
-    klass = import_string(backend or settings.SMS_BACKEND)
+    klass = get_backend_class(backend)
     return klass(fail_silently=fail_silently, **kwargs)
 
 
@@ -35,7 +93,7 @@ def send_sms(
     originator: Optional[str] = None,
     recipients: Union[Optional[str], Optional[List[str]]] = None,
     fail_silently: bool = False,
-    connection: Optional[Type['BaseSmsBackend']] = None
+    connection: Optional['BaseSmsBackend'] = None
 ) -> int:
     """
     Easy wrapper for sending a single message to a recipient list.
@@ -48,7 +106,81 @@ def send_sms(
     Note: The API for this method is frozen. New code wanting to extend the
     functionality should the the Message class directly.
     """
+    from sms.message import Message
+
     if isinstance(recipients, str):
         recipients = [recipients]
     msg = Message(body, originator, recipients, connection=connection)
     return msg.send(fail_silently=fail_silently)
+
+
+async def asend_sms(
+    body: str = '',
+    originator: Optional[str] = None,
+    recipients: Union[Optional[str], Optional[List[str]]] = None,
+    fail_silently: bool = False,
+    connection: Optional['BaseSmsBackend'] = None
+) -> int:
+    """
+    Asynchronous version of send_sms().
+
+    The text message is sent using the asend_messages() method of the backend.
+    """
+    from sms.message import Message
+
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    msg = Message(body, originator, recipients, connection=connection)
+    return await msg.asend(fail_silently=fail_silently)
+
+
+def send_mass_sms(
+    datatuple: Iterable[
+        Tuple[str, Optional[str], Union[Optional[str], Optional[List[str]]]]
+    ],
+    fail_silently: bool = False,
+    connection: Optional['BaseSmsBackend'] = None,
+    batch_size: int = 100
+) -> int:
+    """
+    Given a datatuple of (body, originator, recipients), send each text message
+    to each recipient list. Return the number of text messages sent.
+
+    The datatuple may be any iterable, including a generator. It is consumed
+    lazily in chunks of batch_size messages, so it's never loaded into memory
+    as a whole.
+
+    If originator is None, use DEFAULT_FROM_SMS setting.
+
+    A single connection is opened and used for all text messages.
+    """
+    from sms.message import Message
+
+    if batch_size < 1:
+        raise ValueError('"batch_size" argument must be a positive integer')
+    connection = connection or get_connection(
+        fail_silently=fail_silently
+    )
+    datatuple = iter(datatuple)
+    msg_count: int = 0
+    opened = connection.open()
+    try:
+        while True:
+            messages = [
+                Message(
+                    body,
+                    originator,
+                    [recipients] if isinstance(recipients, str)
+                    else recipients,
+                    connection=connection
+                )
+                for body, originator, recipients
+                in islice(datatuple, batch_size)
+            ]
+            if not messages:
+                break
+            msg_count += connection.send_messages(messages)
+    finally:
+        if opened:
+            connection.close()
+    return msg_count
@@ -1,8 +1,136 @@
 """Base SMS backend class."""
-from typing import Optional, Type, List
+import collections
+import copy
+import functools
+import heapq
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+)
+from typing import (
+    Any, Callable, Dict, Optional, Sequence, Tuple, Type, List
+)
 from types import TracebackType
 
-from sms.message import Message
+from asgiref.sync import sync_to_async  # type: ignore
+from django.conf import settings  # type: ignore
+
+from sms.circuitbreaker import (
+    CircuitBreaker, CircuitOpenError, get_circuit_breaker
+)
+from sms.dedup import Deduplicator, get_deduplicator
+from sms.message import Message, TemplateMessage
+from sms.metrics import get_sinks
+from sms.phonenumbers import normalize_many
+from sms.ratelimit import get_rate_limiter
+from sms.retry import RetryPolicy
+from sms.signals import post_send, pre_send
+
+# The backends currently sending text messages in this thread
+_sending = threading.local()
+
+
+def send_concurrently(
+    send: Callable[..., Any],
+    tasks: Sequence[Tuple[Any, ...]],
+    max_workers: int = 1,
+    retry_policy: Optional[RetryPolicy] = None
+) -> List[Tuple[Tuple[Any, ...], Exception]]:
+    """
+    Call send with the arguments of each task using a pool of at most
+    max_workers threads, and return the (task, exception) tuples of the tasks
+    that failed.
+
+    A failing task doesn't prevent the remaining tasks from being sent. If a
+    retry policy is given, failed tasks are retried after the delay of the
+    policy. Other tasks are sent in the meantime, so a task that is waiting
+    to be retried doesn't hold up the rest.
+    """
+    errors: List[Tuple[int, Exception]] = []
+    workers = min(max_workers, len(tasks))
+    ready = collections.deque((index, 1) for index in range(len(tasks)))
+    # Heap of (retry at, index, attempt) tuples
+    delayed: List[Tuple[float, int, int]] = []
+    started = time.monotonic()
+
+    def handle(index: int, attempt: int, exc: Optional[Exception]) -> None:
+        if exc is None:
+            return
+        delay = None
+        if retry_policy is not None:
+            delay = retry_policy.get_delay(
+                exc, attempt, time.monotonic() - started
+            )
+        if delay is None:
+            errors.append((index, exc))
+        else:
+            heapq.heappush(
+                delayed, (time.monotonic() + delay, index, attempt + 1)
+            )
+
+    executor = ThreadPoolExecutor(workers) if workers > 1 else None
+    in_flight: Dict[Future, Tuple[int, int]] = {}
+    try:
+        while ready or delayed or in_flight:
+            now = time.monotonic()
+            while delayed and delayed[0][0] <= now:
+                _, index, attempt = heapq.heappop(delayed)
+                ready.append((index, attempt))
+            timeout = max(delayed[0][0] - now, 0) if delayed else None
+            if executor is None:
+                if not ready:
+                    time.sleep(timeout)  # type: ignore
+                    continue
+                index, attempt = ready.popleft()
+                try:
+                    send(*tasks[index])
+                except Exception as exc:
+                    handle(index, attempt, exc)
+                continue
+            while ready and len(in_flight) < workers:
+                index, attempt = ready.popleft()
+                future = executor.submit(send, *tasks[index])
+                in_flight[future] = (index, attempt)
+            if not in_flight:
+                time.sleep(timeout)  # type: ignore
+                continue
+            done, _ = wait(in_flight, timeout, FIRST_COMPLETED)
+            for future in done:
+                index, attempt = in_flight.pop(future)
+                handle(index, attempt, future.exception())  # type: ignore
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return [(tasks[index], exc) for index, exc in sorted(errors)]
+
+
+def wrap_send_messages(
+    send_messages: Callable[['BaseSmsBackend', List[Message]], int]
+) -> Callable[['BaseSmsBackend', List[Message]], int]:
+    """
+    Wrap the send_messages() method of a backend, to apply the features
+    shared by all backends, like rate limiting.
+
+    Calls made by send_messages() to the send_messages() of a parent class are
+    not wrapped again. Signals and metrics are only emitted by the outermost
+    backend sending the text messages, e.g. the router backend rather than
+    the backends of its routes.
+    """
+    @functools.wraps(send_messages)
+    def wrapper(self: 'BaseSmsBackend', messages: List[Message]) -> int:
+        backends = _sending.__dict__.setdefault('backends', set())
+        if id(self) in backends:
+            return send_messages(self, messages)
+        outermost = not backends
+        backends.add(id(self))
+        try:
+            if outermost and not self.deferred:
+                return self.send_messages_instrumented(send_messages, messages)
+            return self.send_messages_wrapped(send_messages, messages)
+        finally:
+            backends.discard(id(self))
+    return wrapper
 
 
 class BaseSmsBackend:
@@ -17,9 +145,100 @@ class BaseSmsBackend:
         with backend as connection:
             # do something with connection
             pass
+
+    The asynchronous counterparts aopen(), aclose() and asend_messages() run
+    their synchronous versions in a thread by default. Backends that are able
+    to send text messages without blocking the event loop should override
+    them. The backend can also be used as an asynchronous context manager:
+
+        async with backend as connection:
+            # do something with connection
+            pass
+
+    Backends that keep sending the remaining recipients when one of them
+    fails should report the failed recipients of the last call to
+    send_messages() as (message, recipient, exception) tuples in the errors
+    attribute.
+
+    Rate limits, retry policies, circuit breakers and deduplication are
+    configured per backend class using the SMS_RATE_LIMITS,
+    SMS_RETRY_POLICIES, SMS_CIRCUIT_BREAKERS and SMS_DEDUPLICATION settings,
+    or the rate_limit, retry, circuit_breaker and deduplicate arguments.
+    Rate limits, circuit breakers and deduplication are applied to every
+    backend. The retry policy is available as the retry_policy attribute,
+    for backends to retry their calls to the provider, e.g. using
+    send_concurrently() or retry_policy.call(). The recipients dropped as
+    duplicates by the last call to send_messages() are reported as
+    (message, recipient) tuples in the duplicates attribute.
+
+    If the SMS_VALIDATE_RECIPIENTS setting or the validate_recipients
+    argument is True, invalid phone numbers are rejected without sending
+    them, and the recipients are sent in the E.164 format.
     """
-    def __init__(self, fail_silently: bool = False, **kwargs) -> None:
+    # Set by backends that deliver text messages after send_messages() has
+    # returned using another backend, which sends the signals and metrics.
+    deferred: bool = False
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        if 'send_messages' in cls.__dict__:
+            cls.send_messages = wrap_send_messages(  # type: ignore
+                cls.__dict__['send_messages']
+            )
+
+    def __init__(
+        self,
+        fail_silently: bool = False,
+        rate_limit: Optional[Dict[str, Any]] = None,
+        retry: Optional[Dict[str, Any]] = None,
+        circuit_breaker: Optional[Dict[str, Any]] = None,
+        deduplicate: Optional[Dict[str, Any]] = None,
+        validate_recipients: Optional[bool] = None,
+        **kwargs
+    ) -> None:
         self.fail_silently = fail_silently
+        self.errors: List[Tuple[Message, str, Exception]] = []
+        self.duplicates: List[Tuple[Message, str]] = []
+
+        name = f'{type(self).__module__}.{type(self).__qualname__}'
+        if rate_limit is None:
+            rate_limit = getattr(settings, 'SMS_RATE_LIMITS', {}).get(name)
+        self.rate_limiter = None
+        if rate_limit:
+            self.rate_limiter = get_rate_limiter(rate_limit, name)
+
+        if retry is None:
+            retry = getattr(settings, 'SMS_RETRY_POLICIES', {}).get(name)
+        self.retry_policy: Optional[RetryPolicy] = None
+        if retry:
+            self.retry_policy = RetryPolicy(**retry)
+
+        if circuit_breaker is None:
+            circuit_breaker = getattr(
+                settings, 'SMS_CIRCUIT_BREAKERS', {}
+            ).get(name)
+        self.circuit_breaker: Optional[CircuitBreaker] = None
+        self.fallback: Optional[str] = None
+        self._fallback_connection: Optional['BaseSmsBackend'] = None
+        if circuit_breaker:
+            circuit_breaker = dict(circuit_breaker)
+            self.fallback = circuit_breaker.pop('fallback', None)
+            self.circuit_breaker = get_circuit_breaker(name, circuit_breaker)
+
+        if deduplicate is None:
+            deduplicate = getattr(settings, 'SMS_DEDUPLICATION', {}).get(name)
+        self.deduplicator: Optional[Deduplicator] = None
+        if deduplicate:
+            self.deduplicator = get_deduplicator(name, deduplicate)
+
+        if validate_recipients is None:
+            validate_recipients = getattr(
+                settings, 'SMS_VALIDATE_RECIPIENTS', False
+            )
+        self.validate_recipients: bool = validate_recipients
+        self.default_country_code: Optional[str] = getattr(
+            settings, 'SMS_DEFAULT_COUNTRY_CODE', None
+        )
 
     def open(self) -> bool:
         """
@@ -42,6 +261,22 @@ class BaseSmsBackend:
         """Close a network connection."""
         pass
 
+    async def aopen(self) -> bool:
+        """
+        Open a network connection from asynchronous code.
+
+        The default implementation calls open() in a thread.
+        """
+        return await sync_to_async(self.open, thread_sensitive=False)()
+
+    async def aclose(self) -> None:
+        """
+        Close a network connection from asynchronous code.
+
+        The default implementation calls close() in a thread.
+        """
+        await sync_to_async(self.close, thread_sensitive=False)()
+
     def __enter__(self) -> 'BaseSmsBackend':
         try:
             self.open()
@@ -58,6 +293,22 @@ class BaseSmsBackend:
     ) -> None:
         self.close()
 
+    async def __aenter__(self) -> 'BaseSmsBackend':
+        try:
+            await self.aopen()
+        except Exception:
+            await self.aclose()
+            raise
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType]
+    ) -> None:
+        await self.aclose()
+
     def send_messages(
         self,
         messages: List[Message]
@@ -69,3 +320,329 @@ class BaseSmsBackend:
         raise NotImplementedError(
             'subclasses of BaseSmsBacked must override send_messages() method'
         )
+
+    async def asend_messages(
+        self,
+        messages: List[Message]
+    ) -> int:
+        """
+        Send one or more Message objects from asynchronous code and return the
+        number of text messages sent.
+
+        The default implementation calls send_messages() in a thread.
+        """
+        return await sync_to_async(
+            self.send_messages,
+            thread_sensitive=False
+        )(messages)
+
+    def send_messages_instrumented(
+        self,
+        send_messages: Callable[['BaseSmsBackend', List[Message]], int],
+        messages: List[Message]
+    ) -> int:
+        """
+        Send the text messages using send_messages_wrapped(), sending the
+        pre_send and post_send signals and reporting the call to the metrics
+        sinks.
+
+        Without any receivers or sinks, the text messages are sent right away.
+        """
+        sinks = get_sinks()
+        if not (sinks or pre_send.receivers or post_send.receivers):
+            return self.send_messages_wrapped(send_messages, messages)
+
+        pre_send.send(sender=type(self), backend=self, messages=messages)
+        exception: Optional[Exception] = None
+        started = time.perf_counter()
+        try:
+            return self.send_messages_wrapped(send_messages, messages)
+        except Exception as exc:
+            exception = exc
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            # The failed recipients of each text message
+            failures: Dict[int, List[Tuple[str, Exception]]] = {}
+            if self.errors:
+                for message, recipient, error in self.errors:
+                    failures.setdefault(id(message), []).append(
+                        (recipient, error)
+                    )
+            elif exception is not None:
+                for message in messages:
+                    failures[id(message)] = [
+                        (recipient, exception)
+                        for recipient in message.recipients
+                    ]
+            # The recipients of each text message dropped as duplicates
+            duplicates: Dict[int, List[str]] = {}
+            for message, recipient in getattr(self, 'duplicates', ()):
+                duplicates.setdefault(id(message), []).append(recipient)
+            sent = failed = 0
+            for message in messages:
+                errors = failures.get(id(message), [])
+                dropped = duplicates.get(id(message), [])
+                count = len(message.recipients) - len(errors) - len(dropped)
+                post_send.send(
+                    sender=type(message),
+                    instance=message,
+                    backend=self,
+                    duration=duration,
+                    sent=count,
+                    failed=len(errors),
+                    errors=errors,
+                    duplicates=dropped
+                )
+                sent += count
+                failed += len(errors)
+            name = f'{type(self).__module__}.{type(self).__qualname__}'
+            for sink in sinks:
+                sink.record_send(name, duration, sent, failed)
+
+    def send_messages_wrapped(
+        self,
+        send_messages: Callable[['BaseSmsBackend', List[Message]], int],
+        messages: List[Message]
+    ) -> int:
+        """
+        Send the text messages using the send_messages() implementation of
+        the backend, after applying the features shared by all backends.
+
+        Template messages are rendered first, and the backend receives a
+        text message per distinct body instead. Recipients whose body fails
+        to render aren't sent.
+
+        If recipient validation is enabled, the recipients are normalized to
+        the E.164 format before sending them. Invalid phone numbers aren't
+        sent.
+
+        Rejected recipients are reported in the errors attribute, and the
+        first exception is raised after sending the other recipients.
+        """
+        self.errors = []
+        self.duplicates = []
+        validate = getattr(self, 'validate_recipients', False)
+        if not validate and not any(
+            isinstance(message, TemplateMessage) for message in messages
+        ):
+            return self.send_messages_deduplicated(send_messages, messages)
+
+        rejected: List[Tuple[Message, str, Exception]] = []
+        prepared: List[Message] = []
+        # The original text message of each rendered or validated copy
+        originals: Dict[int, Message] = {}
+        for message in messages:
+            rendered: List[Message] = [message]
+            if isinstance(message, TemplateMessage):
+                rendered, failures = message.render()
+                rejected.extend(
+                    (message, recipient, exc) for recipient, exc in failures
+                )
+                for chunk in rendered:
+                    originals[id(chunk)] = message
+            if not validate:
+                prepared.extend(rendered)
+                continue
+            for chunk in rendered:
+                original = originals.get(id(chunk), chunk)
+                valid, invalid = normalize_many(
+                    chunk.recipients, self.default_country_code
+                )
+                rejected.extend(
+                    (original, recipient, exc) for recipient, exc in invalid
+                )
+                if not valid:
+                    continue
+                if valid == list(chunk.recipients):
+                    prepared.append(chunk)
+                    continue
+                chunk = copy.copy(chunk)
+                chunk.recipients = valid
+                originals[id(chunk)] = original
+                prepared.append(chunk)
+
+        msg_count: int = 0
+        try:
+            if prepared:
+                msg_count = self.send_messages_deduplicated(
+                    send_messages, prepared
+                )
+        except Exception as exc:
+            # Report the failed recipients along with the rejected ones
+            if not self.errors:
+                self.errors = [
+                    (message, recipient, exc)
+                    for message in prepared
+                    for recipient in message.recipients
+                ]
+            raise
+        finally:
+            self.duplicates = [
+                (originals.get(id(message), message), recipient)
+                for message, recipient in self.duplicates
+            ]
+            self.errors = rejected + [
+                (originals.get(id(message), message), recipient, exc)
+                for message, recipient, exc in self.errors
+            ]
+        if rejected and not self.fail_silently:
+            raise rejected[0][2]
+        return msg_count
+
+    def send_messages_deduplicated(
+        self,
+        send_messages: Callable[['BaseSmsBackend', List[Message]], int],
+        messages: List[Message]
+    ) -> int:
+        """
+        Send the text messages using send_messages_guarded(), after dropping
+        duplicate recipients if deduplication is configured.
+
+        Recipients that failed to send are forgotten again, so sending them
+        again isn't suppressed.
+        """
+        deduplicator = getattr(self, 'deduplicator', None)
+        if deduplicator is None:
+            return self.send_messages_guarded(send_messages, messages)
+
+        pairs, self.duplicates = deduplicator.deduplicate(messages)
+        if not pairs:
+            return 0
+        originals = {id(sent): message for message, sent in pairs}
+        try:
+            return self.send_messages_guarded(
+                send_messages, [sent for _, sent in pairs]
+            )
+        except Exception:
+            if not self.errors:
+                deduplicator.forget(
+                    (sent, recipient)
+                    for _, sent in pairs for recipient in sent.recipients
+                )
+            raise
+        finally:
+            if self.errors:
+                deduplicator.forget(
+                    (message, recipient)
+                    for message, recipient, _ in self.errors
+                )
+                self.errors = [
+                    (originals.get(id(message), message), recipient, exc)
+                    for message, recipient, exc in self.errors
+                ]
+
+    def send_messages_guarded(
+        self,
+        send_messages: Callable[['BaseSmsBackend', List[Message]], int],
+        messages: List[Message]
+    ) -> int:
+        """
+        Send the text messages using send_messages_paced(), unless the
+        circuit of the backend is open.
+
+        If a circuit breaker is configured and the circuit is open, the text
+        messages are sent using the fallback backend instead. Without a
+        fallback backend, the recipients are reported in the errors attribute
+        and CircuitOpenError is raised.
+        """
+        breaker = getattr(self, 'circuit_breaker', None)
+        if breaker is None:
+            return self.send_messages_paced(send_messages, messages)
+
+        if not breaker.allow():
+            if self.fallback:
+                if self._fallback_connection is None:
+                    from sms import get_connection
+                    self._fallback_connection = get_connection(
+                        self.fallback, fail_silently=self.fail_silently
+                    )
+                fallback = self._fallback_connection
+                try:
+                    return fallback.send_messages(messages)
+                finally:
+                    self.errors = fallback.errors
+            exc = CircuitOpenError(
+                f'The circuit of {type(self).__module__}.'
+                f'{type(self).__qualname__} is open'
+            )
+            self.errors = [
+                (message, recipient, exc)
+                for message in messages for recipient in message.recipients
+            ]
+            if self.fail_silently:
+                return 0
+            raise exc
+
+        try:
+            msg_count = self.send_messages_paced(send_messages, messages)
+        except Exception as exc:
+            breaker.record_exception(exc)
+            raise
+        errors = getattr(self, 'errors', None)
+        if errors:
+            breaker.record(any(breaker.is_failure(exc) for *_, exc in errors))
+        else:
+            breaker.record_success()
+        return msg_count
+
+    def send_messages_paced(
+        self,
+        send_messages: Callable[['BaseSmsBackend', List[Message]], int],
+        messages: List[Message]
+    ) -> int:
+        """
+        Send the text messages using the send_messages() implementation of
+        the backend, according to the rate limit of the backend.
+
+        If a rate limit is configured, the recipients of each text message are
+        sent in chunks of the burst size of the rate limiter, each waiting for
+        its turn. Rate limits per segment charge each recipient the number of
+        SMS segments of the text message. A failing chunk doesn't prevent the
+        remaining chunks from being sent: the errors of all chunks are
+        collected in the errors attribute, and the first exception is raised
+        afterwards.
+        """
+        limiter = getattr(self, 'rate_limiter', None)
+        if limiter is None:
+            return send_messages(self, messages)
+
+        # The chunks to send, with the text message each chunk is part of
+        chunks: List[Tuple[Message, Message]] = []
+        for message in messages:
+            recipients = list(message.recipients)
+            if len(recipients) <= limiter.burst:
+                chunks.append((message, message))
+                continue
+            for i in range(0, len(recipients), limiter.burst):
+                chunk = copy.copy(message)
+                chunk.recipients = recipients[i:i + limiter.burst]
+                chunks.append((message, chunk))
+
+        msg_count: int = 0
+        errors: List[Tuple[Message, str, Exception]] = []
+        exception: Optional[Exception] = None
+        for message, chunk in chunks:
+            limiter.acquire(
+                chunk.originator,
+                list(chunk.recipients),
+                chunk.segment_count if limiter.per_segment else 1
+            )
+            self.errors = []
+            try:
+                msg_count += send_messages(self, [chunk])
+            except Exception as exc:
+                exception = exception or exc
+                if not self.errors:
+                    self.errors = [
+                        (chunk, recipient, exc)
+                        for recipient in chunk.recipients
+                    ]
+            errors.extend(
+                (message, recipient, error)
+                for _, recipient, error in self.errors
+            )
+        self.errors = errors
+        if exception is not None:
+            raise exception
+        return msg_count
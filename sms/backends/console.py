@@ -35,6 +35,7 @@ class SmsBackend(BaseSmsBackend):
         msg_count: int = 0
         if not messages:
             return msg_count
+        written = 0
         with self._lock:
             try:
                 stream_created = self.open()
@@ -42,9 +43,31 @@ class SmsBackend(BaseSmsBackend):
                     count = self.write_message(message)
                     self.stream.flush()  # flush after each message
                     msg_count += count
+                    written += 1
                 if stream_created:
                     self.close()
-            except Exception:
+            except Exception as exc:
+                # Report the recipients of the unwritten text messages
+                self.errors = [
+                    (message, recipient, exc)
+                    for message in messages[written:]
+                    for recipient in message.recipients
+                ]
                 if not self.fail_silently:
                     raise
         return msg_count
+
+    async def aopen(self) -> bool:
+        return self.open()
+
+    async def aclose(self) -> None:
+        self.close()
+
+    async def asend_messages(self, messages: List[Message]) -> int:
+        """
+        Write all text messages to the stream without using a thread.
+
+        Writing to the stream doesn't yield to the event loop, so the text
+        messages of concurrent calls are never interleaved.
+        """
+        return self.send_messages(messages)
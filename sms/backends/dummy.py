@@ -10,3 +10,6 @@ from sms.message import Message
 class SmsBackend(BaseSmsBackend):
     def send_messages(self, messages: List[Message]) -> int:
         return len(list(messages))
+
+    async def asend_messages(self, messages: List[Message]) -> int:
+        return self.send_messages(messages)
@@ -1,27 +1,260 @@
 """
 SMS backend that writes messages to a file.
 """
+import atexit
 import datetime
+import gzip
+import io
+import itertools
 import os
-from typing import Optional
+import re
+import shutil
+import threading
+import time
+from typing import BinaryIO, Dict, List, Optional, Set, Tuple
 
 from django.conf import settings  # type: ignore
 from django.core.exceptions import ImproperlyConfigured  # type: ignore
 
+from sms.backends import base
 from sms.backends.console import SmsBackend as BaseSmsBackend
 from sms.message import Message
 
 
+FLUSH_POLICIES = ('message', 'batch', 'bytes', 'interval')
+
+# The name of a segment written by RotatingFile
+segment_RE = re.compile(r'^\d{8}-\d{6}-\d+-\d{6}\.log(?:\.gz)?$')
+
+# The numbers of the segments of the process, shared by all rotating files
+# so files with different settings writing to the same directory never
+# write to the same segment
+_segment_numbers = itertools.count(1)
+
+# The paths of the segments the rotating files of the process are writing to
+_open_segments: Set[str] = set()
+_open_segments_lock = threading.Lock()
+
+
+class RotatingFile:
+    """
+    A file shared by all connections of a process writing to the same
+    directory, which is rotated to a new segment once it exceeds max_bytes
+    bytes or is older than interval seconds.
+
+    Rotated segments are gzipped in a background thread if compress is True.
+    If backup_count is set, only the most recent backup_count segments in the
+    directory are kept, including the segments of other processes, so the
+    directory doesn't keep growing as processes come and go. The segments
+    the process is writing to are never removed.
+    """
+    def __init__(
+        self,
+        file_path: str,
+        max_bytes: int = 0,
+        interval: int = 0,
+        compress: bool = False,
+        backup_count: int = 0,
+        buffering: int = io.DEFAULT_BUFFER_SIZE
+    ) -> None:
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.compress = compress
+        self.backup_count = backup_count
+        self.buffering = buffering
+        self.lock = threading.RLock()
+        self.stream: Optional[BinaryIO] = None
+        self.name: Optional[str] = None
+        self.size: int = 0
+        self.opened_at: float = 0
+        self.segment: int = 0
+
+    def should_rotate(self, size: int) -> bool:
+        if self.stream is None:
+            return True
+        if self.max_bytes and self.size and (
+            self.size + size > self.max_bytes
+        ):
+            return True
+        if self.interval and time.time() - self.opened_at >= self.interval:
+            return True
+        return False
+
+    def rotate(self) -> None:
+        """Close the current segment and start writing to a new one."""
+        if self.stream is not None:
+            self.stream.close()
+            with _open_segments_lock:
+                _open_segments.discard(self.name)
+            if self.compress:
+                threading.Thread(
+                    target=self.compress_segment,
+                    args=(self.name,),
+                    name='sms-filebased-compress'
+                ).start()
+        self.opened_at = time.time()
+        self.segment = next(_segment_numbers)
+        timestamp = datetime.datetime.fromtimestamp(self.opened_at).strftime(
+            "%Y%m%d-%H%M%S"
+        )
+        fname = "%s-%s-%06d.log" % (timestamp, os.getpid(), self.segment)
+        self.name = os.path.join(self.file_path, fname)
+        self.stream = open(self.name, 'ab', self.buffering)
+        with _open_segments_lock:
+            _open_segments.add(self.name)
+        self.size = 0
+        self.prune()
+
+    def compress_segment(self, name: str) -> None:
+        with open(name, 'rb') as src, gzip.open(name + '.gz', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.unlink(name)
+        self.prune()
+
+    def prune(self) -> None:
+        """Remove the oldest segments exceeding backup_count."""
+        if not self.backup_count:
+            return
+        with _open_segments_lock:
+            open_segments = set(_open_segments)
+        with self.lock:
+            segments = sorted(
+                entry.path for entry in os.scandir(self.file_path)
+                if segment_RE.match(entry.name)
+                and entry.path not in open_segments
+                # Skip segments that are being compressed
+                and not os.path.exists(entry.path + '.gz')
+                and not (
+                    entry.name.endswith('.gz')
+                    and os.path.exists(entry.path[:-3])
+                )
+            )
+            for path in segments[:max(len(segments) - self.backup_count, 0)]:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def write(self, data: bytes) -> int:
+        with self.lock:
+            if self.should_rotate(len(data)):
+                self.rotate()
+            self.size += len(data)
+            return self.stream.write(data)  # type: ignore
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.stream is not None:
+                self.stream.flush()
+
+    def fileno(self) -> int:
+        return self.stream.fileno()  # type: ignore
+
+    def close(self) -> None:
+        with self.lock:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+                with _open_segments_lock:
+                    _open_segments.discard(self.name)
+
+
+_rotating_files: Dict[Tuple[str, int, int, bool, int, int], RotatingFile] = {}
+_rotating_files_lock = threading.Lock()
+
+
+def get_rotating_file(*args) -> RotatingFile:
+    """Return the process-wide rotating file for the given configuration."""
+    with _rotating_files_lock:
+        try:
+            return _rotating_files[args]
+        except KeyError:
+            rotating_file = _rotating_files[args] = RotatingFile(*args)
+            return rotating_file
+
+
+@atexit.register
+def close_rotating_files() -> None:
+    with _rotating_files_lock:
+        for rotating_file in _rotating_files.values():
+            rotating_file.close()
+        _rotating_files.clear()
+
+
 class SmsBackend(BaseSmsBackend):
+    """
+    Write text messages to a file.
+
+    The flush policy decides when written text messages are flushed to the
+    file: after each text message ('message', the default), after each call
+    to send_messages() ('batch'), once flush_bytes bytes are pending
+    ('bytes') or once flush_interval milliseconds have passed since the last
+    flush ('interval'). With the 'interval' policy, text messages still
+    pending once the interval has passed are flushed by a timer thread, so
+    they're written to the file even if nothing else is sent. If fsync is
+    True, each flush is followed by an fsync to make sure the text messages
+    are written to disk.
+
+    Except for the 'message' policy, all text messages passed to
+    send_messages() are written using a single write.
+
+    By default, each connection writes to its own file. If max_bytes or
+    rotate_interval is set, all connections of the process share a file that
+    is rotated once it exceeds max_bytes bytes or is older than
+    rotate_interval seconds. See RotatingFile.
+    """
     file_path: str
 
     def __init__(
         self,
         *args,
         file_path: Optional[str] = None,
+        flush_policy: Optional[str] = None,
+        flush_bytes: Optional[int] = None,
+        flush_interval: Optional[int] = None,
+        fsync: Optional[bool] = None,
+        max_bytes: Optional[int] = None,
+        rotate_interval: Optional[int] = None,
+        compress: Optional[bool] = None,
+        backup_count: Optional[int] = None,
         **kwargs
     ) -> None:
         self._fname: Optional[str] = None
+        if not flush_policy:
+            flush_policy = getattr(
+                settings, 'SMS_FILE_FLUSH_POLICY', 'message'
+            )
+        self.flush_policy: str = flush_policy
+        if self.flush_policy not in FLUSH_POLICIES:
+            raise ImproperlyConfigured(
+                f"Invalid flush policy {self.flush_policy!r}, expected one "
+                f"of: {', '.join(FLUSH_POLICIES)}"
+            )
+        if not flush_bytes:
+            flush_bytes = getattr(settings, 'SMS_FILE_FLUSH_BYTES', 64 * 1024)
+        self.flush_bytes: int = flush_bytes
+        if not flush_interval:
+            flush_interval = getattr(settings, 'SMS_FILE_FLUSH_INTERVAL', 1000)
+        self.flush_interval: int = flush_interval
+        self.fsync: bool = fsync if fsync is not None else getattr(
+            settings, 'SMS_FILE_FSYNC', False
+        )
+        if not max_bytes:
+            max_bytes = getattr(settings, 'SMS_FILE_MAX_BYTES', 0)
+        self.max_bytes: int = max_bytes
+        if not rotate_interval:
+            rotate_interval = getattr(settings, 'SMS_FILE_ROTATE_INTERVAL', 0)
+        self.rotate_interval: int = rotate_interval
+        self.compress: bool = compress if compress is not None else getattr(
+            settings, 'SMS_FILE_COMPRESS', False
+        )
+        if not backup_count:
+            backup_count = getattr(settings, 'SMS_FILE_BACKUP_COUNT', 0)
+        self.backup_count: int = backup_count
+        self._pending: int = 0
+        self._flushed_at: float = time.monotonic()
+        self._flush_timer: Optional[threading.Timer] = None
         if not file_path:
             file_path = getattr(settings, 'SMS_FILE_PATH', None)
         if not file_path:
@@ -54,18 +287,110 @@ class SmsBackend(BaseSmsBackend):
         kwargs['stream'] = None
         super().__init__(*args, **kwargs)
 
-    def write_message(self, message: Message) -> int:
-        msg_count = 0
+    def format_message(self, message: Message) -> Tuple[bytes, int]:
+        """
+        Return the text message formatted for each of its recipients, and the
+        number of recipients.
+        """
+        chunks: List[str] = []
         for recipient in message.recipients:
-            msg_data = (
+            chunks.append(
                 f"from: {message.originator}\n"
                 f"to: {recipient}\n"
-                f"{message.body}"
+                f"{message.body}\n"
+                f"{'-' * 79}\n"
             )
-            self.stream.write(f'{msg_data}\n'.encode())
-            self.stream.write(b'-' * 79)
-            self.stream.write(b'\n')
-            msg_count += 1
+        return ''.join(chunks).encode(), len(chunks)
+
+    def write_message(self, message: Message) -> int:
+        data, msg_count = self.format_message(message)
+        self.stream.write(data)
+        self._pending += len(data)
+        return msg_count
+
+    def flush_stream(self) -> None:
+        """Flush the pending text messages to the file."""
+        self.stream.flush()
+        if self.fsync:
+            os.fsync(self.stream.fileno())
+        self._pending = 0
+        self._flushed_at = time.monotonic()
+
+    def schedule_flush(self) -> None:
+        """
+        Flush the pending text messages once flush_interval milliseconds
+        have passed since the last flush, unless a flush is scheduled already.
+        """
+        if self._flush_timer is not None:
+            return
+        delay = self.flush_interval / 1000 - (
+            time.monotonic() - self._flushed_at
+        )
+        self._flush_timer = threading.Timer(
+            max(delay, 0), self.flush_pending
+        )
+        self._flush_timer.name = 'sms-filebased-flush'
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def flush_pending(self) -> None:
+        with self._lock:
+            self._flush_timer = None
+            if self.stream is not None and self._pending:
+                self.flush_stream()
+
+    def send_messages(self, messages: List[Message]) -> int:
+        """Write all text messages to the file in a thread-safe way."""
+        msg_count: int = 0
+        if not messages:
+            return msg_count
+        written = 0
+        with self._lock:
+            try:
+                stream_created = self.open()
+                if self.flush_policy == 'message':
+                    for message in messages:
+                        msg_count += self.write_message(message)
+                        self.flush_stream()
+                        written += 1
+                else:
+                    chunks: List[bytes] = []
+                    for message in messages:
+                        data, count = self.format_message(message)
+                        chunks.append(data)
+                        msg_count += count
+                    data = b''.join(chunks)
+                    self.stream.write(data)
+                    self._pending += len(data)
+                    if (
+                        self.flush_policy == 'batch'
+                        or (
+                            self.flush_policy == 'bytes'
+                            and self._pending >= self.flush_bytes
+                        )
+                        or (
+                            self.flush_policy == 'interval'
+                            and (time.monotonic() - self._flushed_at) * 1000
+                            >= self.flush_interval
+                        )
+                    ):
+                        self.flush_stream()
+                    elif (
+                        self.flush_policy == 'interval' and not stream_created
+                    ):
+                        self.schedule_flush()
+                    written = len(messages)
+                if stream_created:
+                    self.close()
+            except Exception as exc:
+                # Report the recipients of the unwritten text messages
+                self.errors = [
+                    (message, recipient, exc)
+                    for message in messages[written:]
+                    for recipient in message.recipients
+                ]
+                if not self.fail_silently:
+                    raise
         return msg_count
 
     def _get_filename(self) -> str:
@@ -76,15 +401,48 @@ class SmsBackend(BaseSmsBackend):
             self._fname = os.path.join(self.file_path, fname)
         return self._fname
 
+    @property
+    def rotating(self) -> bool:
+        return bool(self.max_bytes or self.rotate_interval)
+
     def open(self) -> bool:
         if self.stream is None:
-            self.stream = open(self._get_filename(), 'ab')
+            buffering = io.DEFAULT_BUFFER_SIZE
+            if self.flush_policy == 'bytes':
+                # Buffer the pending text messages until they're flushed
+                buffering = max(buffering, self.flush_bytes)
+            if self.rotating:
+                self.stream = get_rotating_file(
+                    self.file_path, self.max_bytes, self.rotate_interval,
+                    self.compress, self.backup_count, buffering
+                )
+            else:
+                self.stream = open(self._get_filename(), 'ab', buffering)
+            self._pending = 0
+            self._flushed_at = time.monotonic()
             return True
         return False
 
+    # Opening, writing, flushing and syncing files block on disk I/O, so the
+    # asynchronous methods use the default implementations running in a
+    # thread instead of the ones of the console backend.
+    aopen = base.BaseSmsBackend.aopen
+    aclose = base.BaseSmsBackend.aclose
+    asend_messages = base.BaseSmsBackend.asend_messages
+
     def close(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
         try:
             if self.stream is not None:
-                self.stream.close()
+                if self.fsync and self._pending:
+                    self.flush_stream()
+                if self.rotating:
+                    # The file is shared with other connections, so only
+                    # flush the text messages written by this connection.
+                    self.stream.flush()
+                else:
+                    self.stream.close()
         finally:
             self.stream = None
@@ -0,0 +1,267 @@
+"""
+SMS backends for sending text messages using an HTTP API, without any
+provider SDK.
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings  # type: ignore
+from django.core.exceptions import ImproperlyConfigured  # type: ignore
+
+from sms.backends.base import BaseSmsBackend, send_concurrently
+from sms.message import Message
+from sms.pool import ConnectionPool, get_connection_pool
+
+
+class HttpError(Exception):
+    """Raised when the API responds with an unsuccessful status code."""
+    def __init__(self, status: int, body: bytes) -> None:
+        super().__init__(
+            f'{status}: {body.decode("utf-8", errors="replace")[:200]}'
+        )
+        self.status = status
+        self.body = body
+
+
+class SmsBackend(BaseSmsBackend):
+    """
+    Send text messages by posting them to an HTTP API.
+
+    Text messages with the same originator and body are merged, and their
+    recipients are sent in chunks of at most max_recipients recipients per
+    request. Each request posts a JSON object with the originator, recipients
+    and body keys to the url. Subclasses adapt the requests to the API of a
+    provider by overriding get_request().
+
+    Requests are sent over persistent connections, using a pool of
+    max_workers threads to keep that many requests in flight. The
+    connections are kept alive in a pool of pool_size connections shared by
+    all connections of the process.
+
+    Like the provider backends, a failing request doesn't abort the remaining
+    requests, its recipients are collected in the errors attribute, and
+    transient errors are retried according to the retry policy configured for
+    the backend, if any.
+    """
+    setting_prefix = 'SMS_HTTP'
+    default_max_recipients = 1
+
+    def __init__(
+        self,
+        fail_silently: bool = False,
+        url: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        max_recipients: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        pool_size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> None:
+        super().__init__(fail_silently=fail_silently, **kwargs)
+
+        if not url:
+            url = self.get_setting('URL')
+        if not url:
+            raise ImproperlyConfigured(
+                f"You're using the SMS backend '{self.backend_name}' without "
+                f"having the setting '{self.setting_prefix}_URL' set."
+            )
+        self.url: str = url
+        parts = urlsplit(self.url)
+        self.path = parts.path or '/'
+        if parts.query:
+            self.path += '?' + parts.query
+        self.headers: Dict[str, str] = {
+            **(self.get_setting('HEADERS') or {}), **(headers or {})
+        }
+
+        if max_recipients is None:
+            max_recipients = self.get_setting(
+                'MAX_RECIPIENTS', self.default_max_recipients
+            )
+        if max_workers is None:
+            max_workers = self.get_setting('MAX_WORKERS', 1)
+        if pool_size is None:
+            pool_size = self.get_setting(
+                'POOL_SIZE', max(max_workers or 1, 10)
+            )
+        for name, value in (
+            ('recipients', max_recipients),
+            ('workers', max_workers),
+            ('pooled connections', pool_size),
+        ):
+            if not isinstance(value, int) or value < 1:
+                raise ImproperlyConfigured(
+                    f"The maximum number of {name} of the SMS backend "
+                    f"'{self.backend_name}' must be a positive integer."
+                )
+        self.max_recipients: int = max_recipients
+        self.max_workers: int = max_workers
+        self.pool_size: int = pool_size
+        self.timeout: float = timeout or self.get_setting('TIMEOUT', 10)
+        self.pool: Optional[ConnectionPool] = None
+
+    @property
+    def backend_name(self) -> str:
+        return f'{type(self).__module__}.{type(self).__qualname__}'
+
+    def get_setting(self, name: str, default: Any = None) -> Any:
+        return getattr(settings, f'{self.setting_prefix}_{name}', default)
+
+    def open(self) -> bool:
+        if self.pool is not None:
+            return False
+        self.pool = get_connection_pool(
+            self.url, self.pool_size, self.timeout
+        )
+        return True
+
+    def close(self) -> None:
+        self.pool = None
+
+    def get_request(
+        self,
+        originator: str,
+        body: str,
+        recipients: List[str]
+    ) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Return the body and headers of the request sending the text message
+        to the recipients.
+        """
+        data = json.dumps({
+            'originator': originator,
+            'recipients': recipients,
+            'body': body,
+        })
+        return data.encode(), {'Content-Type': 'application/json'}
+
+    def _send(
+        self,
+        originator: str,
+        body: str,
+        recipients: List[Tuple[Message, str]]
+    ) -> None:
+        data, headers = self.get_request(
+            originator, body, [recipient for _, recipient in recipients]
+        )
+        status, response = self.pool.request(  # type: ignore
+            'POST', self.path, data, {**self.headers, **headers}
+        )
+        if not 200 <= status < 300:
+            raise HttpError(status, response)
+
+    def send_messages(self, messages: List[Message]) -> int:
+        # Merge the recipients of text messages with the same originator and
+        # body, keeping track of the text message of each recipient.
+        groups: Dict[Tuple[str, str], List[Tuple[Message, str]]] = {}
+        for message in messages:
+            groups.setdefault((message.originator, message.body), []).extend(
+                (message, recipient) for recipient in message.recipients
+            )
+        tasks = [
+            (originator, body, recipients[i:i + self.max_recipients])
+            for (originator, body), recipients in groups.items()
+            for i in range(0, len(recipients), self.max_recipients)
+        ]
+
+        new_conn_created = self.open()
+        try:
+            self.errors = [
+                (message, recipient, exc)
+                for (_, _, recipients), exc in send_concurrently(
+                    self._send, tasks, self.max_workers, self.retry_policy
+                )
+                for message, recipient in recipients
+            ]
+        finally:
+            if new_conn_created:
+                self.close()
+        if self.errors and not self.fail_silently:
+            raise self.errors[0][2]
+        return sum(len(task[2]) for task in tasks) - len(self.errors)
+
+
+class TwilioSmsBackend(SmsBackend):
+    """
+    Send text messages using the Twilio REST API, configured using the same
+    settings as the sms.backends.twilio.SmsBackend.
+    """
+    setting_prefix = 'TWILIO'
+
+    def __init__(self, fail_silently: bool = False, **kwargs) -> None:
+        account_sid: Optional[str] = getattr(
+            settings, 'TWILIO_ACCOUNT_SID', None
+        )
+        auth_token: Optional[str] = getattr(
+            settings, 'TWILIO_AUTH_TOKEN', None
+        )
+        for name, value in (
+            ('TWILIO_ACCOUNT_SID', account_sid),
+            ('TWILIO_AUTH_TOKEN', auth_token),
+        ):
+            if not value and not fail_silently:
+                raise ImproperlyConfigured(
+                    "You're using the SMS backend "
+                    f"'{self.backend_name}' without having the setting "
+                    f"'{name}' set."
+                )
+        credentials = base64.b64encode(
+            f'{account_sid}:{auth_token}'.encode()
+        ).decode()
+        kwargs.setdefault('url', self.get_setting(
+            'URL',
+            'https://api.twilio.com/2010-04-01/Accounts/'
+            f'{account_sid}/Messages.json'
+        ))
+        kwargs['headers'] = {
+            'Authorization': f'Basic {credentials}',
+            **(kwargs.get('headers') or {}),
+        }
+        # Twilio accepts a single recipient per request
+        kwargs['max_recipients'] = 1
+        super().__init__(fail_silently=fail_silently, **kwargs)
+
+    def get_request(
+        self,
+        originator: str,
+        body: str,
+        recipients: List[str]
+    ) -> Tuple[bytes, Dict[str, str]]:
+        data = urlencode({
+            'To': recipients[0], 'From': originator, 'Body': body
+        })
+        return data.encode(), {
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+
+
+class MessageBirdSmsBackend(SmsBackend):
+    """
+    Send text messages using the MessageBird REST API, configured using the
+    same settings as the sms.backends.messagebird.SmsBackend.
+    """
+    setting_prefix = 'MESSAGEBIRD'
+    default_max_recipients = 50
+
+    def __init__(self, fail_silently: bool = False, **kwargs) -> None:
+        access_key: Optional[str] = getattr(
+            settings, 'MESSAGEBIRD_ACCESS_KEY', None
+        )
+        if not access_key and not fail_silently:
+            raise ImproperlyConfigured(
+                "You're using the SMS backend "
+                f"'{self.backend_name}' without having the setting "
+                "'MESSAGEBIRD_ACCESS_KEY' set."
+            )
+        kwargs.setdefault('url', self.get_setting(
+            'URL', 'https://rest.messagebird.com/messages'
+        ))
+        kwargs['headers'] = {
+            'Authorization': f'AccessKey {access_key}',
+            'Accept': 'application/json',
+            **(kwargs.get('headers') or {}),
+        }
+        super().__init__(fail_silently=fail_silently, **kwargs)
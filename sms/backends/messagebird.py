@@ -1,25 +1,139 @@
 """
 SMS backend for sending text messages using MessageBird.
 """
-from typing import List, Optional
+from importlib.util import find_spec
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
 
 from django.conf import settings  # type: ignore
 from django.core.exceptions import ImproperlyConfigured  # type: ignore
 
-from sms.backends.base import BaseSmsBackend
+from sms.backends.base import BaseSmsBackend, send_concurrently
 from sms.message import Message
+from sms.pool import get_session
 
-try:
-    import messagebird  # type: ignore
-    HAS_MESSAGEBIRD = True
-except ImportError:
-    HAS_MESSAGEBIRD = False
+# The SDK is only imported when creating a client, as importing it is slow
+HAS_MESSAGEBIRD = find_spec('messagebird') is not None
+
+
+class HttpClient:
+    """
+    A drop-in replacement for the HTTP client of the MessageBird SDK, sending
+    its requests using a requests session with a timeout instead of opening
+    a new connection for every request.
+    """
+    supported_status_codes = (200, 201, 204, 401, 404, 405, 422)
+
+    def __init__(self, access_key: str, timeout: float) -> None:
+        self.access_key = access_key
+        self.timeout = timeout
+        self.session: Any = None
+
+    def request(
+        self,
+        path: str,
+        method: str = 'GET',
+        params: Optional[Dict[str, Any]] = None,
+        format: Any = None
+    ) -> Any:
+        import requests  # type: ignore
+        from messagebird.client import ENDPOINT, USER_AGENT  # type: ignore
+        from messagebird.http_client import ResponseFormat  # type: ignore
+        from messagebird.serde import json_serialize  # type: ignore
+
+        if method not in ('DELETE', 'GET', 'PATCH', 'POST', 'PUT'):
+            raise ValueError(str(method) + ' is not a supported HTTP method')
+        if params is None:
+            params = {}
+        kwargs: Dict[str, Any] = {
+            'headers': {
+                'Accept': 'application/json',
+                'Authorization': 'AccessKey ' + self.access_key,
+                'User-Agent': USER_AGENT,
+                'Content-Type': 'application/json; charset=UTF-8'
+            },
+            'timeout': self.timeout,
+        }
+        if method == 'GET':
+            kwargs['params'] = params
+        else:
+            kwargs['data'] = json_serialize(params)
+
+        response = (self.session or requests).request(
+            method, urljoin(ENDPOINT, path), **kwargs
+        )
+        if response.status_code not in self.supported_status_codes:
+            response.raise_for_status()
+        if format == ResponseFormat.binary:
+            return response.content
+        return response.text
 
 
 class SmsBackend(BaseSmsBackend):
-    def __init__(self, fail_silently: bool = False, **kwargs) -> None:
+    """
+    Send text messages using the MessageBird REST API.
+
+    Text messages with the same originator and body are merged, and their
+    recipients are sent in chunks of at most max_recipients (the
+    MESSAGEBIRD_MAX_RECIPIENTS setting, which defaults to the API limit of 50)
+    recipients per request. The requests are sent concurrently using a pool
+    of max_workers threads (the MESSAGEBIRD_MAX_WORKERS setting, which
+    defaults to 1).
+
+    A failing request doesn't abort the remaining requests. The errors of the
+    last call to send_messages() are collected in the errors attribute as
+    (message, recipient, exception) tuples. Unless fail_silently is set, the
+    first error is raised once all requests have been handled.
+
+    Transient errors are retried according to the retry policy configured
+    for the backend, if any.
+
+    Requests are sent over persistent connections shared by all connections
+    of the process, keeping up to pool_size (the MESSAGEBIRD_POOL_SIZE
+    setting) connections alive. Requests time out after timeout seconds (the
+    MESSAGEBIRD_TIMEOUT setting, which defaults to 10). An opened connection
+    holds on to the pool until it's closed; otherwise each call to
+    send_messages() takes the pool for its duration.
+    """
+    def __init__(
+        self,
+        fail_silently: bool = False,
+        max_recipients: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        pool_size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> None:
         super().__init__(fail_silently=fail_silently, **kwargs)
 
+        if max_recipients is None:
+            max_recipients = getattr(
+                settings, 'MESSAGEBIRD_MAX_RECIPIENTS', 50
+            )
+        if max_workers is None:
+            max_workers = getattr(settings, 'MESSAGEBIRD_MAX_WORKERS', 1)
+        if pool_size is None:
+            pool_size = getattr(
+                settings, 'MESSAGEBIRD_POOL_SIZE', max(max_workers or 1, 10)
+            )
+        for name, value in (
+            ('recipients', max_recipients),
+            ('workers', max_workers),
+            ('pooled connections', pool_size),
+        ):
+            if not isinstance(value, int) or value < 1:
+                raise ImproperlyConfigured(
+                    f"The maximum number of {name} of the SMS backend "
+                    "'sms.backends.messagebird.SmsBackend' must be a positive "
+                    "integer."
+                )
+        self.max_recipients: int = max_recipients
+        self.max_workers: int = max_workers
+        self.pool_size: int = pool_size
+        if not timeout:
+            timeout = getattr(settings, 'MESSAGEBIRD_TIMEOUT', 10)
+        self.timeout: float = timeout
+
         if not HAS_MESSAGEBIRD and not self.fail_silently:
             raise ImproperlyConfigured(
                 "You're using the SMS backend "
@@ -38,22 +152,68 @@ class SmsBackend(BaseSmsBackend):
 
         self.client = None
         if HAS_MESSAGEBIRD:
-            self.client = messagebird.Client(access_key)
+            import messagebird  # type: ignore
+
+            # The session of the HTTP client is set when opening the
+            # connection
+            self.http_client = HttpClient(access_key or '', self.timeout)
+            self.client = messagebird.Client(
+                access_key, http_client=self.http_client
+            )
+
+    def open(self) -> bool:
+        if self.client is None or self.http_client.session:
+            return False
+        self.http_client.session = get_session(
+            'messagebird', self.pool_size
+        )
+        return True
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.http_client.session = None
+
+    def _send(
+        self,
+        originator: str,
+        body: str,
+        recipients: List[Tuple[Message, str]]
+    ) -> None:
+        self.client.message_create(  # type: ignore
+            originator,
+            [recipient for _, recipient in recipients],
+            body
+        )
 
     def send_messages(self, messages: List[Message]) -> int:
         if not self.client:
             return 0
 
-        msg_count: int = 0
+        # Merge the recipients of text messages with the same originator and
+        # body, keeping track of the text message of each recipient.
+        groups: Dict[Tuple[str, str], List[Tuple[Message, str]]] = {}
         for message in messages:
-            try:
-                self.client.message_create(
-                    message.originator,
-                    message.recipients,
-                    message.body
+            groups.setdefault((message.originator, message.body), []).extend(
+                (message, recipient) for recipient in message.recipients
+            )
+        tasks = [
+            (originator, body, recipients[i:i + self.max_recipients])
+            for (originator, body), recipients in groups.items()
+            for i in range(0, len(recipients), self.max_recipients)
+        ]
+
+        new_conn_created = self.open()
+        try:
+            self.errors = [
+                (message, recipient, exc)
+                for (_, _, recipients), exc in send_concurrently(
+                    self._send, tasks, self.max_workers, self.retry_policy
                 )
-            except Exception as exc:
-                if not self.fail_silently:
-                    raise exc
-            msg_count += 1
-        return msg_count
+                for message, recipient in recipients
+            ]
+        finally:
+            if new_conn_created:
+                self.close()
+        if self.errors and not self.fail_silently:
+            raise self.errors[0][2]
+        return sum(len(task[2]) for task in tasks) - len(self.errors)
@@ -0,0 +1,84 @@
+"""
+SMS backend that stores text messages in the database, to be sent by the
+sms_dispatch management command.
+"""
+import itertools
+from typing import Iterator, List, Optional
+
+from django.apps import apps  # type: ignore
+from django.conf import settings  # type: ignore
+from django.core.exceptions import ImproperlyConfigured  # type: ignore
+from django.db import transaction  # type: ignore
+from django.utils import timezone  # type: ignore
+
+from sms.backends.base import BaseSmsBackend
+from sms.message import Message
+
+
+class SmsBackend(BaseSmsBackend):
+    """
+    Store text messages in the outbox of the sms.contrib.outbox app, one row
+    per recipient, using bulk inserts of batch_size rows in a single
+    transaction.
+
+    send_messages() returns once the text messages are stored. They survive
+    crashes and restarts, and are sent by one or more sms_dispatch commands
+    using the backend of the SMS_OUTBOX_BACKEND setting, which sends the
+    signals and metrics.
+    """
+    deferred = True
+
+    def __init__(
+        self,
+        fail_silently: bool = False,
+        batch_size: Optional[int] = None,
+        using: Optional[str] = None,
+        **kwargs
+    ) -> None:
+        super().__init__(fail_silently=fail_silently, **kwargs)
+
+        if not apps.is_installed('sms.contrib.outbox'):
+            raise ImproperlyConfigured(
+                "You're using the SMS backend "
+                "'sms.backends.outbox.SmsBackend' without having "
+                "'sms.contrib.outbox' in INSTALLED_APPS."
+            )
+        if not batch_size:
+            batch_size = getattr(settings, 'SMS_OUTBOX_BATCH_SIZE', 1000)
+        self.batch_size: int = batch_size
+        self.using: Optional[str] = using
+
+    def send_messages(self, messages: List[Message]) -> int:
+        from sms.contrib.outbox.models import OutboxMessage
+
+        now = timezone.now()
+
+        def rows() -> Iterator[OutboxMessage]:
+            for message in messages:
+                for recipient in message.recipients:
+                    yield OutboxMessage(
+                        originator=message.originator,
+                        recipient=recipient,
+                        body=message.body,
+                        scheduled_at=now,
+                        created_at=now
+                    )
+
+        manager = OutboxMessage.objects.db_manager(self.using)
+        msg_count: int = 0
+        iterator = rows()
+        try:
+            with transaction.atomic(using=manager.db):
+                while True:
+                    batch = list(
+                        itertools.islice(iterator, self.batch_size)
+                    )
+                    if not batch:
+                        break
+                    manager.bulk_create(batch)
+                    msg_count += len(batch)
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return 0
+        return msg_count
@@ -0,0 +1,240 @@
+"""
+SMS backend that queues text messages and sends them in background threads.
+"""
+import atexit
+import logging
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings  # type: ignore
+from django.core.exceptions import ImproperlyConfigured  # type: ignore
+
+from sms.backends.base import BaseSmsBackend
+from sms.message import Message
+
+logger = logging.getLogger('sms.backends.queued')
+
+POLICIES = ('block', 'drop', 'raise')
+
+
+class Dispatcher:
+    """
+    A bounded queue of text messages drained by a pool of worker threads.
+
+    Each worker thread keeps its own connection to the wrapped backend open
+    and sends the queued text messages in batches of at most batch_size. The
+    connections are created up front, so a misconfigured backend raises
+    before anything is queued.
+    """
+    def __init__(
+        self,
+        backend: str,
+        queue_size: int,
+        workers: int,
+        batch_size: int
+    ) -> None:
+        from sms import get_connection
+
+        self.backend = backend
+        self.batch_size = batch_size
+        self.queue: 'queue.Queue[Optional[Message]]' = queue.Queue(queue_size)
+        connections = [get_connection(backend) for _ in range(workers)]
+        self.threads = [
+            threading.Thread(
+                target=self.run,
+                args=(connection,),
+                name=f'sms-queued-{i}',
+                daemon=True
+            )
+            for i, connection in enumerate(connections)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def run(self, connection: BaseSmsBackend) -> None:
+        # Keep draining the queue when the connection fails to open, sending
+        # the text messages is attempted (and logged when failing) anyway
+        try:
+            connection.open()
+        except Exception:
+            logger.exception(
+                'Failed to open a connection using %s', self.backend
+            )
+        try:
+            while True:
+                message = self.queue.get()
+                if message is None:
+                    self.queue.task_done()
+                    return
+                batch = [message]
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        message = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if message is None:
+                        stop = True
+                        break
+                    batch.append(message)
+                self.deliver(connection, batch)
+                for _ in range(len(batch) + stop):
+                    self.queue.task_done()
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+    def deliver(
+        self,
+        connection: BaseSmsBackend,
+        messages: List[Message]
+    ) -> None:
+        try:
+            connection.send_messages(messages)
+        except Exception:
+            logger.exception(
+                'Failed to send %d queued text message(s) using %s',
+                len(messages), self.backend
+            )
+
+    def put(self, message: Message, policy: str) -> bool:
+        if policy == 'block':
+            self.queue.put(message)
+        elif policy == 'drop':
+            try:
+                self.queue.put_nowait(message)
+            except queue.Full:
+                return False
+        else:
+            self.queue.put_nowait(message)
+        return True
+
+    def flush(self) -> None:
+        """Block until all queued text messages have been handled."""
+        self.queue.join()
+
+    def stop(self) -> None:
+        """Send all queued text messages and stop the worker threads."""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+_dispatchers: Dict[Tuple[str, int, int, int], Dispatcher] = {}
+_dispatchers_lock = threading.Lock()
+
+
+def get_dispatcher(
+    backend: str,
+    queue_size: int,
+    workers: int,
+    batch_size: int
+) -> Dispatcher:
+    """
+    Return the process-wide dispatcher for the given configuration, starting
+    it on first use.
+    """
+    key = (backend, queue_size, workers, batch_size)
+    with _dispatchers_lock:
+        try:
+            return _dispatchers[key]
+        except KeyError:
+            dispatcher = _dispatchers[key] = Dispatcher(*key)
+            return dispatcher
+
+
+@atexit.register
+def shutdown() -> None:
+    """Send all queued text messages before the interpreter exits."""
+    with _dispatchers_lock:
+        dispatchers = list(_dispatchers.values())
+        _dispatchers.clear()
+    for dispatcher in dispatchers:
+        dispatcher.stop()
+
+
+class SmsBackend(BaseSmsBackend):
+    """
+    Queue text messages in memory and send them in background threads using
+    another backend.
+
+    send_messages() returns as soon as the text messages are queued. The
+    pre_send and post_send signals are sent by the wrapped backend once it
+    sends the text messages.
+
+    When the queue is full, the policy decides whether send_messages() blocks
+    until there's room ('block'), silently drops the text message ('drop') or
+    raises queue.Full ('raise').
+    """
+    deferred = True
+
+    def __init__(
+        self,
+        fail_silently: bool = False,
+        backend: Optional[str] = None,
+        queue_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        policy: Optional[str] = None,
+        **kwargs
+    ) -> None:
+        from sms import get_backend_class
+
+        super().__init__(fail_silently=fail_silently, **kwargs)
+
+        backend = backend or getattr(settings, 'SMS_QUEUED_BACKEND', None)
+        if not backend:
+            raise ImproperlyConfigured(
+                "You're using the SMS backend "
+                "'sms.backends.queued.SmsBackend' without having the "
+                "setting 'SMS_QUEUED_BACKEND' set."
+            )
+        self.backend: str = backend
+        # Raise right away for a backend that can't be imported
+        get_backend_class(backend)
+        if not queue_size:
+            queue_size = getattr(settings, 'SMS_QUEUE_SIZE', 1000)
+        self.queue_size: int = queue_size
+        if not workers:
+            workers = getattr(settings, 'SMS_QUEUE_WORKERS', 1)
+        self.workers: int = workers
+        if not batch_size:
+            batch_size = getattr(settings, 'SMS_QUEUE_BATCH_SIZE', 100)
+        self.batch_size: int = batch_size
+        if not policy:
+            policy = getattr(settings, 'SMS_QUEUE_POLICY', 'block')
+        self.policy: str = policy
+        if self.policy not in POLICIES:
+            raise ImproperlyConfigured(
+                f"Invalid queue policy {self.policy!r}, expected one of: "
+                f"{', '.join(POLICIES)}"
+            )
+
+    @property
+    def key(self) -> Tuple[str, int, int, int]:
+        return (self.backend, self.queue_size, self.workers, self.batch_size)
+
+    @property
+    def dispatcher(self) -> Dispatcher:
+        return get_dispatcher(*self.key)
+
+    def close(self) -> None:
+        """Block until all queued text messages have been handled."""
+        dispatcher = _dispatchers.get(self.key)
+        if dispatcher is not None:
+            dispatcher.flush()
+
+    def send_messages(self, messages: List[Message]) -> int:
+        dispatcher = self.dispatcher
+        msg_count: int = 0
+        for message in messages:
+            try:
+                if dispatcher.put(message, self.policy):
+                    msg_count += 1
+            except queue.Full:
+                if not self.fail_silently:
+                    raise
+        return msg_count
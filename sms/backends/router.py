@@ -0,0 +1,289 @@
+"""
+SMS backend that distributes text messages over several other backends.
+"""
+import copy
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings  # type: ignore
+from django.core.exceptions import ImproperlyConfigured  # type: ignore
+
+from sms.backends.base import BaseSmsBackend
+from sms.circuitbreaker import CircuitBreaker, get_circuit_breaker
+from sms.message import Message
+
+STRATEGIES = ('weighted', 'latency')
+
+
+class RouteState:
+    """The latency of a route, shared by all connections of a process."""
+    def __init__(self) -> None:
+        self.latency: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def record_success(self, duration: float) -> None:
+        with self.lock:
+            # Exponentially weighted moving average of the latency
+            if self.latency is None:
+                self.latency = duration
+            else:
+                self.latency = 0.8 * self.latency + 0.2 * duration
+
+
+_route_states: Dict[str, RouteState] = {}
+_route_states_lock = threading.Lock()
+
+
+def get_route_state(name: str) -> RouteState:
+    with _route_states_lock:
+        try:
+            return _route_states[name]
+        except KeyError:
+            state = _route_states[name] = RouteState()
+            return state
+
+
+class Route:
+    """
+    A backend the router can send text messages with.
+
+    The countries argument is a list of country calling codes, e.g. ['31'],
+    routed to the backend in addition to the prefixes.
+
+    By default, the circuit of a route opens on its first failure and stays
+    open for cooldown seconds. The circuit_breaker argument configures the
+    circuit breaker of the route instead.
+    """
+    def __init__(
+        self,
+        backend: str,
+        name: Optional[str] = None,
+        weight: float = 1,
+        prefixes: Sequence[str] = (),
+        countries: Sequence[str] = (),
+        options: Optional[Dict[str, Any]] = None,
+        circuit_breaker: Optional[Dict[str, Any]] = None,
+        cooldown: float = 30
+    ) -> None:
+        from sms import get_connection
+
+        self.name = name or backend
+        self.weight = weight
+        # Country calling codes are prefix-free, so they're matched as the
+        # prefixes of phone numbers in the E.164 format
+        self.prefixes = tuple(prefixes) + tuple(
+            '+' + code.lstrip('+') for code in countries
+        )
+        self.connection: BaseSmsBackend = get_connection(
+            backend, **(options or {})
+        )
+        self.state = get_route_state(self.name)
+        self.breaker: CircuitBreaker = get_circuit_breaker(
+            f'sms.backends.router:{self.name}',
+            circuit_breaker or {'min_calls': 1, 'cooldown': cooldown}
+        )
+
+    def match(self, recipient: str) -> int:
+        """
+        Return the length of the longest prefix matching the recipient, 0 if
+        the route has no prefixes or -1 if no prefix matches.
+        """
+        if not self.prefixes:
+            return 0
+        return max(
+            (
+                len(prefix) for prefix in self.prefixes
+                if recipient.startswith(prefix)
+            ),
+            default=-1
+        )
+
+
+class SmsBackend(BaseSmsBackend):
+    """
+    Send text messages using one of several backends.
+
+    Each recipient is routed to the routes with the longest prefix matching
+    the recipient, or to the routes without prefixes if none match. Among
+    these, a route is picked at random according to the route weights
+    ('weighted' strategy) or the route with the lowest average latency
+    ('latency' strategy).
+
+    If a backend fails, the circuit of its route opens: the route is skipped
+    for cooldown seconds and its recipients are sent using the next route.
+    Errors that don't count as failures of the circuit breaker of the route,
+    like an invalid phone number, are reported without trying another route.
+    Backends reporting the failed recipients in an errors attribute, like the
+    MessageBird and Twilio backends, only have their failed recipients sent
+    again.
+
+    The connections of the routes are opened and closed together with the
+    router connection.
+    """
+    def __init__(
+        self,
+        fail_silently: bool = False,
+        backends: Optional[List[Dict[str, Any]]] = None,
+        strategy: Optional[str] = None,
+        cooldown: Optional[float] = None,
+        **kwargs
+    ) -> None:
+        super().__init__(fail_silently=fail_silently, **kwargs)
+
+        if backends is None:
+            backends = getattr(settings, 'SMS_ROUTER_BACKENDS', None)
+        if not backends:
+            raise ImproperlyConfigured(
+                "You're using the SMS backend "
+                "'sms.backends.router.SmsBackend' without having the "
+                "setting 'SMS_ROUTER_BACKENDS' set."
+            )
+        if not strategy:
+            strategy = getattr(settings, 'SMS_ROUTER_STRATEGY', 'weighted')
+        self.strategy: str = strategy
+        if self.strategy not in STRATEGIES:
+            raise ImproperlyConfigured(
+                f"Invalid routing strategy {self.strategy!r}, expected one "
+                f"of: {', '.join(STRATEGIES)}"
+            )
+        self.cooldown: float = cooldown if cooldown is not None else getattr(
+            settings, 'SMS_ROUTER_COOLDOWN', 30
+        )
+        self.routes = [
+            Route(**{'cooldown': self.cooldown, **config})
+            for config in backends
+        ]
+
+    def open(self) -> bool:
+        for route in self.routes:
+            route.connection.open()
+        return True
+
+    def close(self) -> None:
+        for route in self.routes:
+            route.connection.close()
+
+    def get_candidates(self, recipient: str) -> List[Route]:
+        """Return the routes the recipient can be sent with."""
+        matches = [(route.match(recipient), route) for route in self.routes]
+        longest = max(length for length, _ in matches)
+        if longest < 0:
+            # Without any matching route, try them all
+            return list(self.routes)
+        return [route for length, route in matches if length == longest]
+
+    def choose(self, candidates: List[Route]) -> Route:
+        """
+        Return the route to send with, preferring routes whose circuit allows
+        a call. Only the chosen route claims a trial call of a half-open
+        circuit.
+        """
+        available = [
+            route for route in candidates if route.breaker.available()
+        ]
+        while available:
+            route = self.pick(available)
+            if route.breaker.allow():
+                return route
+            # Another thread claimed the trial call of the route
+            available.remove(route)
+        return self.pick(candidates)
+
+    def pick(self, available: List[Route]) -> Route:
+        if self.strategy == 'latency':
+            # Routes without a measured latency are tried first
+            return min(
+                available,
+                key=lambda route: route.state.latency or 0
+            )
+        return random.choices(
+            available, weights=[route.weight for route in available]
+        )[0]
+
+    def send_route(
+        self,
+        route: Route,
+        recipients: List[Tuple[Message, str]]
+    ) -> Tuple[int, List[Tuple[Message, str, Exception]]]:
+        """
+        Send the recipients using the route and return the number of text
+        messages sent and the (message, recipient, exception) tuples of the
+        failed recipients.
+        """
+        messages: Dict[int, Message] = {}
+        numbers: Dict[int, List[str]] = {}
+        for message, recipient in recipients:
+            if id(message) not in messages:
+                messages[id(message)] = copy.copy(message)
+                messages[id(message)].recipients = numbers[id(message)] = []
+            numbers[id(message)].append(recipient)
+
+        connection = route.connection
+        connection.errors = []
+        started = time.monotonic()
+        try:
+            count = connection.send_messages(list(messages.values()))
+        except Exception as exc:
+            route.breaker.record_exception(exc)
+            errors = connection.errors
+            if not errors:
+                return 0, [
+                    (message, recipient, exc)
+                    for message, recipient in recipients
+                ]
+            # Map the errors back to the original text messages
+            originals = {
+                id(messages[id(message)]): message
+                for message, _ in recipients
+            }
+            return len(recipients) - len(errors), [
+                (originals[id(message)], recipient, error)
+                for message, recipient, error in errors
+            ]
+        route.state.record_success(time.monotonic() - started)
+        route.breaker.record_success()
+        return count, []
+
+    def send_messages(self, messages: List[Message]) -> int:
+        # The routes that were tried for each recipient
+        tried: Dict[Tuple[int, str], List[Route]] = {}
+        pending: List[Tuple[Message, str]] = [
+            (message, recipient)
+            for message in messages
+            for recipient in message.recipients
+        ]
+        msg_count: int = 0
+        errors: List[Tuple[Message, str, Exception]] = []
+        while pending:
+            routes: Dict[int, Tuple[Route, List[Tuple[Message, str]]]] = {}
+            for message, recipient in pending:
+                key = (id(message), recipient)
+                candidates = [
+                    route for route in self.get_candidates(recipient)
+                    if route not in tried.get(key, [])
+                ]
+                route = self.choose(candidates)
+                tried.setdefault(key, []).append(route)
+                routes.setdefault(id(route), (route, []))[1].append(
+                    (message, recipient)
+                )
+            pending = []
+            for route, recipients in routes.values():
+                count, failed = self.send_route(route, recipients)
+                msg_count += count
+                for message, recipient, exc in failed:
+                    key = (id(message), recipient)
+                    # Errors caused by the text message itself, like an
+                    # invalid phone number, would fail using any route
+                    if route.breaker.is_failure(exc) and (
+                        len(tried[key]) < len(self.get_candidates(recipient))
+                    ):
+                        pending.append((message, recipient))
+                    else:
+                        errors.append((message, recipient, exc))
+        self.errors = errors
+        if errors and not self.fail_silently:
+            raise errors[0][2]
+        return msg_count
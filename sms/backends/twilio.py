@@ -1,25 +1,77 @@
 """
 SMS backend for sending text messages using Twilio.
 """
+from importlib.util import find_spec
 from typing import List, Optional
 
 from django.conf import settings  # type: ignore
 from django.core.exceptions import ImproperlyConfigured  # type: ignore
 
-from sms.backends.base import BaseSmsBackend
+from sms.backends.base import BaseSmsBackend, send_concurrently
 from sms.message import Message
+from sms.pool import get_session
 
-try:
-    from twilio.rest import Client  # type: ignore
-    HAS_TWILIO = True
-except ImportError:
-    HAS_TWILIO = False
+# The SDK is only imported when creating a client, as importing it is slow
+HAS_TWILIO = find_spec('twilio') is not None
 
 
 class SmsBackend(BaseSmsBackend):
-    def __init__(self, fail_silently: bool = False, **kwargs) -> None:
+    """
+    Send text messages using the Twilio REST API.
+
+    Twilio accepts a single recipient per request, so each recipient of a
+    message results in a separate request. The requests are sent concurrently
+    using a pool of max_workers threads (the TWILIO_MAX_WORKERS setting, which
+    defaults to 1).
+
+    A failing recipient doesn't abort the remaining recipients. The errors of
+    the last call to send_messages() are collected in the errors attribute as
+    (message, recipient, exception) tuples. Unless fail_silently is set, the
+    first error is raised once all recipients have been handled.
+
+    Transient errors are retried according to the retry policy configured
+    for the backend, if any.
+
+    Requests are sent over persistent connections shared by all connections
+    of the process, keeping up to pool_size (the TWILIO_POOL_SIZE setting)
+    connections alive. Requests time out after timeout seconds (the
+    TWILIO_TIMEOUT setting, which defaults to 10). An opened connection holds
+    on to the pool until it's closed; otherwise each call to send_messages()
+    takes the pool for its duration.
+    """
+    def __init__(
+        self,
+        fail_silently: bool = False,
+        max_workers: Optional[int] = None,
+        pool_size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> None:
         super().__init__(fail_silently=fail_silently, **kwargs)
 
+        if max_workers is None:
+            max_workers = getattr(settings, 'TWILIO_MAX_WORKERS', 1)
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise ImproperlyConfigured(
+                "The number of workers of the SMS backend "
+                "'sms.backends.twilio.SmsBackend' must be a positive integer."
+            )
+        self.max_workers: int = max_workers
+
+        if pool_size is None:
+            pool_size = getattr(
+                settings, 'TWILIO_POOL_SIZE', max(max_workers, 10)
+            )
+        if not isinstance(pool_size, int) or pool_size < 1:
+            raise ImproperlyConfigured(
+                "The pool size of the SMS backend "
+                "'sms.backends.twilio.SmsBackend' must be a positive integer."
+            )
+        self.pool_size: int = pool_size
+        if not timeout:
+            timeout = getattr(settings, 'TWILIO_TIMEOUT', 10)
+        self.timeout: float = timeout
+
         if not HAS_TWILIO and not self.fail_silently:
             raise ImproperlyConfigured(
                 "You're using the SMS backend "
@@ -46,23 +98,60 @@ class SmsBackend(BaseSmsBackend):
 
         self.client = None
         if HAS_TWILIO:
-            self.client = Client(account_sid, auth_token)
+            from twilio.http.http_client import (  # type: ignore
+                TwilioHttpClient
+            )
+            from twilio.rest import Client  # type: ignore
+
+            # The session of the HTTP client is set when opening the
+            # connection
+            self.client = Client(
+                account_sid,
+                auth_token,
+                http_client=TwilioHttpClient(
+                    pool_connections=False, timeout=self.timeout
+                )
+            )
+
+    def open(self) -> bool:
+        if self.client is None or self.client.http_client.session:
+            return False
+        self.client.http_client.session = get_session(
+            'twilio', self.pool_size
+        )
+        return True
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.http_client.session = None
+
+    def _send(self, message: Message, recipient: str) -> None:
+        self.client.messages.create(  # type: ignore
+            to=recipient,
+            from_=message.originator,
+            body=message.body
+        )
 
     def send_messages(self, messages: List[Message]) -> int:
         if not self.client:
             return 0
 
-        msg_count: int = 0
-        for message in messages:
-            for recipient in message.recipients:
-                try:
-                    self.client.messages.create(
-                        to=recipient,
-                        from_=message.originator,
-                        body=message.body
-                    )
-                except Exception as exc:
-                    if not self.fail_silently:
-                        raise exc
-                msg_count += 1
-        return msg_count
+        tasks = [
+            (message, recipient)
+            for message in messages
+            for recipient in message.recipients
+        ]
+        new_conn_created = self.open()
+        try:
+            self.errors = [
+                (message, recipient, exc)
+                for (message, recipient), exc in send_concurrently(
+                    self._send, tasks, self.max_workers, self.retry_policy
+                )
+            ]
+        finally:
+            if new_conn_created:
+                self.close()
+        if self.errors and not self.fail_silently:
+            raise self.errors[0][2]
+        return len(tasks) - len(self.errors)
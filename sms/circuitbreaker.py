@@ -0,0 +1,175 @@
+"""
+Circuit breakers to stop sending text messages using a failing backend.
+"""
+import collections
+import json
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from django.core.exceptions import ImproperlyConfigured  # type: ignore
+from django.utils.module_loading import import_string  # type: ignore
+
+from sms.retry import is_retryable
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    """Raised when sending text messages while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Track the outcome of the calls to a backend and open the circuit when too
+    many of them fail.
+
+    The circuit opens once at least min_calls calls were made in the last
+    window seconds, of which at least failure_rate failed. While open, calls
+    are refused. After cooldown seconds the circuit becomes half-open: up to
+    half_open_calls trial calls are allowed at a time, and the outcome of the
+    first one to finish decides whether the circuit closes or opens again.
+    Other calls are refused until then, so callers don't all hit a backend
+    that may still be failing. A trial call whose outcome isn't recorded
+    within cooldown seconds no longer counts.
+
+    The is_failure argument is a callable, or the Python import path of one,
+    deciding whether an exception counts as a failure. Defaults to
+    sms.retry.is_retryable(), so errors caused by the text message itself,
+    like an invalid phone number, don't open the circuit.
+    """
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        min_calls: int = 10,
+        window: float = 60,
+        cooldown: float = 30,
+        is_failure: Optional[Any] = None,
+        half_open_calls: int = 1
+    ) -> None:
+        if not 0 < failure_rate <= 1:
+            raise ImproperlyConfigured(
+                'The failure rate of a circuit breaker must be between 0 '
+                'and 1.'
+            )
+        self.failure_rate = failure_rate
+        self.min_calls = max(min_calls, 1)
+        self.window = window
+        self.cooldown = cooldown
+        self.half_open_calls = max(half_open_calls, 1)
+        if isinstance(is_failure, str):
+            is_failure = import_string(is_failure)
+        self.is_failure: Callable[[BaseException], bool] = (
+            is_failure or is_retryable
+        )
+        # The (time, failed) tuples of the calls in the window
+        self.calls: Deque[Tuple[float, bool]] = collections.deque()
+        self.failures: int = 0
+        self._state: str = CLOSED
+        self.opened_at: float = 0
+        # The number of trial calls in flight while half-open, and when the
+        # last one started
+        self.trials: int = 0
+        self.trial_at: float = 0
+        self.lock = threading.Lock()
+
+    def _update_state(self, now: float) -> str:
+        if self._state == OPEN and now - self.opened_at >= self.cooldown:
+            self._state = HALF_OPEN
+            self.trials = 0
+        if (
+            self._state == HALF_OPEN
+            and self.trials
+            and now - self.trial_at >= self.cooldown
+        ):
+            # The trial calls never recorded their outcome
+            self.trials = 0
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            return self._update_state(time.monotonic())
+
+    def available(self) -> bool:
+        """
+        Return whether a call would be allowed, without claiming a trial call
+        while half-open.
+        """
+        with self.lock:
+            state = self._update_state(time.monotonic())
+            if state == HALF_OPEN:
+                return self.trials < self.half_open_calls
+            return state == CLOSED
+
+    def allow(self) -> bool:
+        """
+        Return whether a call may be made. While half-open, an allowed call is
+        a trial call, and its outcome must be recorded.
+        """
+        with self.lock:
+            now = time.monotonic()
+            state = self._update_state(now)
+            if state == HALF_OPEN:
+                if self.trials >= self.half_open_calls:
+                    return False
+                self.trials += 1
+                self.trial_at = now
+                return True
+            return state == CLOSED
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self.opened_at = time.monotonic()
+        self.calls.clear()
+        self.failures = 0
+        self.trials = 0
+
+    def record(self, failed: bool) -> None:
+        """Record the outcome of a call."""
+        with self.lock:
+            if self._state == HALF_OPEN:
+                if failed:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self.trials = 0
+                return
+            if self._state == OPEN:
+                return
+            now = time.monotonic()
+            self.calls.append((now, failed))
+            self.failures += failed
+            while self.calls and self.calls[0][0] <= now - self.window:
+                self.failures -= self.calls.popleft()[1]
+            if (
+                len(self.calls) >= self.min_calls
+                and self.failures >= self.failure_rate * len(self.calls)
+            ):
+                self._open()
+
+    def record_success(self) -> None:
+        self.record(False)
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.record(self.is_failure(exc))
+
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str, config: Dict[str, Any]) -> CircuitBreaker:
+    """
+    Return the process-wide circuit breaker with the given name and
+    configuration, so all connections of a backend share the same circuit.
+    """
+    key = json.dumps([name, config], sort_keys=True, default=str)
+    with _circuit_breakers_lock:
+        try:
+            return _circuit_breakers[key]
+        except KeyError:
+            breaker = _circuit_breakers[key] = CircuitBreaker(**config)
+            return breaker
@@ -0,0 +1,4 @@
+"""
+A durable outbox of text messages stored in the database, sent by the
+sms_dispatch management command.
+"""
@@ -0,0 +1,7 @@
+from django.apps import AppConfig  # type: ignore
+
+
+class OutboxConfig(AppConfig):
+    name = 'sms.contrib.outbox'
+    label = 'sms_outbox'
+    verbose_name = 'SMS outbox'
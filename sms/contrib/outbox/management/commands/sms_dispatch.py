@@ -0,0 +1,258 @@
+"""
+Send the text messages stored in the outbox by the outbox backend.
+"""
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings  # type: ignore
+from django.core.management.base import (  # type: ignore
+    BaseCommand, CommandError
+)
+from django.db import connections, transaction  # type: ignore
+from django.db.models import F, Q  # type: ignore
+from django.utils import timezone  # type: ignore
+
+from sms.backends.base import BaseSmsBackend
+from sms.circuitbreaker import CircuitOpenError
+from sms.contrib.outbox.models import OutboxMessage
+from sms.message import Message
+from sms.retry import is_retryable
+
+Status = OutboxMessage.Status
+
+
+class Command(BaseCommand):
+    help = (
+        'Send the text messages stored in the outbox using the backend of '
+        'the SMS_OUTBOX_BACKEND setting. Several dispatchers can run at the '
+        'same time without sending a text message twice.'
+    )
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--backend',
+            help='The Python import path of the backend sending the text '
+                 'messages. Defaults to the SMS_OUTBOX_BACKEND setting.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='The number of text messages claimed at once.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1,
+            help='The number of seconds to wait when the outbox is empty.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once the outbox is empty instead of waiting for new '
+                 'text messages.'
+        )
+        parser.add_argument(
+            '--max-attempts', type=int, default=3,
+            help='The number of times a text message failing because of a '
+                 'transient error is sent before giving up.'
+        )
+        parser.add_argument(
+            '--lease', type=float, default=600,
+            help='The number of seconds after which text messages claimed by '
+                 'a dispatcher that stopped are claimed again.'
+        )
+        parser.add_argument(
+            '--database', default=None,
+            help='The database the outbox is stored in.'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        backend = options['backend'] or getattr(
+            settings, 'SMS_OUTBOX_BACKEND', None
+        )
+        if not backend:
+            raise CommandError(
+                'Set the SMS_OUTBOX_BACKEND setting or the --backend option.'
+            )
+        if backend == 'sms.backends.outbox.SmsBackend':
+            raise CommandError(
+                'The outbox backend cannot dispatch its own text messages.'
+            )
+        if options['batch_size'] < 1:
+            raise CommandError('The batch size must be a positive integer.')
+
+        from sms import get_connection
+
+        self.using: Optional[str] = options['database']
+        self.manager = OutboxMessage.objects.db_manager(self.using)
+        self.batch_size: int = options['batch_size']
+        self.max_attempts: int = options['max_attempts']
+        self.lease = timedelta(seconds=options['lease'])
+        # Identifies the text messages claimed by this dispatcher
+        self.token = uuid.uuid4().hex
+        sent = failed = 0
+
+        connection: BaseSmsBackend = get_connection(backend)
+        connection.open()
+        try:
+            while True:
+                self.release_expired()
+                rows = self.claim()
+                if not rows:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+                batch_sent, batch_failed = self.dispatch(connection, rows)
+                sent += batch_sent
+                failed += batch_failed
+                if options['verbosity'] >= 2:
+                    self.stdout.write(
+                        f'Sent {batch_sent} and failed {batch_failed} of '
+                        f'{len(rows)} text message(s).'
+                    )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+        if options['verbosity'] >= 1:
+            self.stdout.write(
+                f'Sent {sent} text message(s), {failed} failed.'
+            )
+
+    def release_expired(self) -> None:
+        """
+        Release the text messages claimed longer than the lease ago, e.g. by
+        a dispatcher that crashed, so they're claimed again.
+        """
+        self.manager.filter(
+            status=Status.SENDING,
+            claimed_at__lt=timezone.now() - self.lease
+        ).update(status=Status.PENDING, claimed_by='')
+
+    def claim(self) -> List[OutboxMessage]:
+        """
+        Claim up to batch_size pending text messages and return them.
+
+        The rows are locked using SELECT ... FOR UPDATE SKIP LOCKED where the
+        database supports it, so concurrent dispatchers claim different rows
+        instead of waiting for each other. The update is conditional on the
+        status, so even without row locks, like on SQLite, a row is claimed
+        by a single dispatcher.
+        """
+        now = timezone.now()
+        database = self.manager.db
+        with transaction.atomic(using=database):
+            pending = self.manager.filter(
+                status=Status.PENDING, scheduled_at__lte=now
+            ).order_by('scheduled_at', 'id')
+            features = connections[database].features
+            if features.has_select_for_update_skip_locked:
+                pending = pending.select_for_update(skip_locked=True)
+            ids = list(
+                pending.values_list('id', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return []
+            self.manager.filter(id__in=ids, status=Status.PENDING).update(
+                status=Status.SENDING,
+                claimed_by=self.token,
+                claimed_at=now,
+                attempts=F('attempts') + 1
+            )
+        return list(
+            self.manager.filter(
+                id__in=ids, status=Status.SENDING, claimed_by=self.token
+            )
+        )
+
+    def dispatch(
+        self,
+        connection: BaseSmsBackend,
+        rows: List[OutboxMessage]
+    ) -> Tuple[int, int]:
+        """
+        Send the claimed text messages and store their status, returning the
+        number of sent and failed text messages.
+        """
+        # The row of each text message, grouped by originator and body
+        messages: Dict[int, OutboxMessage] = {}
+        groups: Dict[Tuple[str, str], List[OutboxMessage]] = {}
+        for row in rows:
+            groups.setdefault((row.originator, row.body), []).append(row)
+        batch: List[Message] = []
+        for (originator, body), group in groups.items():
+            bulk = Message.bulk(
+                body, originator, [row.recipient for row in group]
+            )
+            for message, row in zip(bulk, group):
+                messages[id(message)] = row
+            batch.extend(bulk)
+
+        errors: Dict[int, BaseException] = {}
+        try:
+            connection.send_messages(batch)
+        except Exception as exc:
+            if not connection.errors:
+                errors = {id(message): exc for message in batch}
+        for message, _, error in connection.errors:
+            errors.setdefault(id(message), error)
+
+        now = timezone.now()
+        sent_ids: List[int] = []
+        # The IDs of the failed rows, grouped by their status, the time of
+        # their next attempt (if any), the error and whether the attempt
+        # counts
+        failed_ids: Dict[
+            Tuple[Any, Optional[datetime], str, bool], List[int]
+        ] = {}
+        for key, row in messages.items():
+            failure = errors.get(key)
+            if failure is None:
+                sent_ids.append(row.id)
+                continue
+            scheduled_at: Optional[datetime] = None
+            counts = True
+            if isinstance(failure, CircuitOpenError):
+                # The backend wasn't called, so the text message is sent
+                # again once the circuit may have closed, without using up
+                # an attempt
+                status = Status.PENDING
+                breaker = getattr(connection, 'circuit_breaker', None)
+                scheduled_at = now + timedelta(
+                    seconds=breaker.cooldown if breaker is not None else 1
+                )
+                counts = False
+            elif is_retryable(failure) and row.attempts < self.max_attempts:
+                status = Status.PENDING
+                # Back off exponentially before the next attempt
+                scheduled_at = now + timedelta(seconds=2 ** row.attempts)
+            else:
+                status = Status.FAILED
+            reason = str(failure) or type(failure).__name__
+            failed_ids.setdefault(
+                (status, scheduled_at, reason, counts), []
+            ).append(row.id)
+
+        failed = 0
+        with transaction.atomic(using=self.manager.db):
+            # Rows released after the lease expired may have been claimed by
+            # another dispatcher, so only rows still claimed are updated
+            claimed = Q(status=Status.SENDING, claimed_by=self.token)
+            self.manager.filter(claimed, id__in=sent_ids).update(
+                status=Status.SENT, sent_at=now, claimed_by='', error=''
+            )
+            for (status, scheduled_at, reason, counts), ids in (
+                failed_ids.items()
+            ):
+                fields: Dict[str, Any] = {
+                    'status': status, 'claimed_by': '', 'error': reason
+                }
+                if scheduled_at is not None:
+                    fields['scheduled_at'] = scheduled_at
+                if not counts:
+                    fields['attempts'] = F('attempts') - 1
+                updated = self.manager.filter(claimed, id__in=ids).update(
+                    **fields
+                )
+                if status == Status.FAILED:
+                    failed += updated
+        return len(sent_ids), failed
@@ -0,0 +1,52 @@
+from typing import List, Tuple
+
+import django.utils.timezone  # type: ignore
+from django.db import migrations, models  # type: ignore
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies: List[Tuple[str, str]] = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('originator', models.CharField(blank=True, max_length=64)),
+                ('recipient', models.CharField(max_length=64)),
+                ('body', models.TextField(blank=True)),
+                ('status', models.PositiveSmallIntegerField(
+                    choices=[
+                        (0, 'pending'),
+                        (1, 'sending'),
+                        (2, 'sent'),
+                        (3, 'failed'),
+                    ],
+                    default=0
+                )),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('scheduled_at', models.DateTimeField(
+                    default=django.utils.timezone.now
+                )),
+                ('created_at', models.DateTimeField(
+                    default=django.utils.timezone.now
+                )),
+                ('claimed_by', models.CharField(blank=True, max_length=32)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(
+                        fields=['status', 'scheduled_at'],
+                        name='sms_outbox_status_idx'
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import models  # type: ignore
+from django.utils import timezone  # type: ignore
+
+
+class OutboxMessage(models.Model):
+    """A text message to a single recipient, waiting to be sent."""
+    class Status(models.IntegerChoices):
+        PENDING = 0, 'pending'
+        SENDING = 1, 'sending'
+        SENT = 2, 'sent'
+        FAILED = 3, 'failed'
+
+    id = models.BigAutoField(primary_key=True)
+    originator = models.CharField(max_length=64, blank=True)
+    recipient = models.CharField(max_length=64)
+    body = models.TextField(blank=True)
+    status = models.PositiveSmallIntegerField(
+        choices=Status.choices, default=Status.PENDING
+    )
+    # The number of times the dispatcher tried to send the text message
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # The text message isn't sent before this time
+    scheduled_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    # The dispatcher that claimed the text message, and when
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'scheduled_at'],
+                name='sms_outbox_status_idx'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.recipient} ({self.get_status_display()})'
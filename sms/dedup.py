@@ -0,0 +1,220 @@
+"""
+Deduplication of the recipients of text messages sent by SMS backends.
+"""
+import collections
+import copy
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.core.exceptions import ImproperlyConfigured  # type: ignore
+from django.utils.module_loading import import_string  # type: ignore
+
+from sms.message import Message
+from sms.phonenumbers import clean
+
+
+def normalize(recipient: str) -> str:
+    """
+    Return the phone number without formatting characters, replacing the
+    international call prefix 00 by a plus sign. Unlike the validation of
+    recipients, this accepts any recipient. See sms.phonenumbers.clean().
+    """
+    return clean(recipient)
+
+
+class LocMemStore:
+    """
+    Remember keys for ttl seconds in memory, keeping at most max_size keys.
+
+    The keys are kept in the order they were added, so both expired keys and,
+    when the store is full, the least recently added keys are evicted from
+    the front in constant time.
+    """
+    def __init__(self, max_size: int = 10000) -> None:
+        self.max_size = max_size
+        # Mapping of the keys to the time they expire
+        self.keys: 'collections.OrderedDict[str, float]' = (
+            collections.OrderedDict()
+        )
+        self.lock = threading.Lock()
+
+    def add_many(self, keys: Iterable[str], ttl: float) -> List[bool]:
+        """
+        Add the keys and return for each key whether it was added, i.e. it
+        wasn't seen in the last ttl seconds.
+        """
+        now = time.monotonic()
+        added = []
+        with self.lock:
+            stored = self.keys
+            while stored:
+                key, expires = next(iter(stored.items()))
+                if expires > now:
+                    break
+                del stored[key]
+            for key in keys:
+                if key in stored:
+                    added.append(False)
+                    continue
+                stored[key] = now + ttl
+                added.append(True)
+            while len(stored) > self.max_size:
+                stored.popitem(last=False)
+        return added
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        with self.lock:
+            for key in keys:
+                self.keys.pop(key, None)
+
+
+class CacheStore:
+    """
+    Remember keys for ttl seconds in a Django cache, shared by all processes
+    using the same cache.
+    """
+    def __init__(self, cache: str = 'default', prefix: str = '') -> None:
+        from django.core.cache import caches  # type: ignore
+
+        self.cache = caches[cache]
+        self.prefix = f'sms:dedup:{prefix}:'
+
+    def add_many(self, keys: Iterable[str], ttl: float) -> List[bool]:
+        prefix = self.prefix
+        return [
+            self.cache.add(prefix + key, 1, timeout=ttl) for key in keys
+        ]
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        self.cache.delete_many([self.prefix + key for key in keys])
+
+
+class Deduplicator:
+    """
+    Drop duplicate recipients from text messages.
+
+    The configuration is a dictionary with the following optional keys:
+
+    - ttl: The number of seconds a text message with the same originator,
+      recipient and body is suppressed after it was sent. Defaults to 300.
+      With a ttl of 0, only duplicate recipients within a text message are
+      dropped.
+    - normalize: Whether the phone numbers are normalized before comparing
+      them, or a callable, or the Python import path of one, normalizing a
+      phone number. Defaults to True, using normalize().
+    - max_size: The maximum number of text messages remembered in memory.
+      Defaults to 10000.
+    - cache: The alias of a Django cache to remember the text messages sent
+      by all processes. By default, they're remembered in memory.
+    """
+    def __init__(self, config: Dict[str, Any], name: str = '') -> None:
+        unknown = set(config) - {'ttl', 'normalize', 'max_size', 'cache'}
+        if unknown:
+            raise ImproperlyConfigured(
+                'Unknown deduplication option(s): '
+                f"{', '.join(sorted(unknown))}"
+            )
+        self.ttl: float = config.get('ttl', 300)
+        if self.ttl < 0:
+            raise ImproperlyConfigured(
+                'The deduplication ttl must not be negative.'
+            )
+        normalizer = config.get('normalize', True)
+        if isinstance(normalizer, str):
+            normalizer = import_string(normalizer)
+        elif normalizer is True:
+            normalizer = normalize
+        self.normalize: Optional[Callable[[str], str]] = normalizer or None
+        self.store: Any = None
+        if self.ttl and config.get('cache'):
+            self.store = CacheStore(config['cache'], name)
+        elif self.ttl:
+            self.store = LocMemStore(config.get('max_size', 10000))
+
+    @staticmethod
+    def get_key(message: Message) -> str:
+        """Return the key of the originator and body of the text message."""
+        return hashlib.blake2b(
+            f'{message.originator}\0{message.body}'.encode(), digest_size=16
+        ).hexdigest()
+
+    def deduplicate(
+        self,
+        messages: List[Message]
+    ) -> Tuple[List[Tuple[Message, Message]], List[Tuple[Message, str]]]:
+        """
+        Return the (message, deduplicated) tuples of the text messages with
+        any recipients left, and the (message, recipient) tuples of the
+        recipients that were dropped.
+
+        The deduplicated text message is the original text message if none
+        of its recipients changed, otherwise a copy with the remaining
+        recipients.
+        """
+        normalizer = self.normalize
+        result: List[Tuple[Message, Message]] = []
+        duplicates: List[Tuple[Message, str]] = []
+        for message in messages:
+            # Mapping of the normalized phone numbers to the recipients
+            seen: Dict[str, str] = {}
+            for recipient in message.recipients:
+                number = normalizer(recipient) if normalizer else recipient
+                if number in seen:
+                    duplicates.append((message, recipient))
+                else:
+                    seen[number] = recipient
+            recipients = list(seen)
+            if self.store is not None and recipients:
+                digest = self.get_key(message)
+                added = self.store.add_many(
+                    [f'{digest}:{number}' for number in recipients], self.ttl
+                )
+                duplicates.extend(
+                    (message, seen[number])
+                    for number, new in zip(recipients, added) if not new
+                )
+                recipients = [
+                    number for number, new in zip(recipients, added) if new
+                ]
+            if not recipients:
+                continue
+            if recipients == list(message.recipients):
+                result.append((message, message))
+            else:
+                deduplicated = copy.copy(message)
+                deduplicated.recipients = recipients
+                result.append((message, deduplicated))
+        return result, duplicates
+
+    def forget(self, messages: Iterable[Tuple[Message, str]]) -> None:
+        """
+        Forget that the text messages were sent to the recipients, e.g.
+        because sending them failed, so they can be sent again.
+        """
+        if self.store is not None:
+            self.store.delete_many(
+                f'{self.get_key(message)}:{recipient}'
+                for message, recipient in messages
+            )
+
+
+_deduplicators: Dict[str, Deduplicator] = {}
+_deduplicators_lock = threading.Lock()
+
+
+def get_deduplicator(name: str, config: Dict[str, Any]) -> Deduplicator:
+    """
+    Return the process-wide deduplicator with the given name and
+    configuration, so all connections of a backend remember the same text
+    messages.
+    """
+    key = json.dumps([name, config], sort_keys=True, default=str)
+    with _deduplicators_lock:
+        try:
+            return _deduplicators[key]
+        except KeyError:
+            deduplicator = _deduplicators[key] = Deduplicator(config, name)
+            return deduplicator
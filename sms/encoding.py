@@ -0,0 +1,91 @@
+"""
+Encoding of text message bodies and splitting them in SMS segments.
+
+A body consisting of characters of the GSM 03.38 alphabet is sent using the
+7-bit GSM-7 encoding, fitting 160 characters in a single segment. Characters
+of the extension table, like '€' or '{', take two septets. Any other
+character, like an emoji, causes the whole body to be sent using UCS-2,
+fitting only 70 UTF-16 code units in a single segment. Bodies that don't fit
+in a single segment are split in segments of 153 septets or 67 code units,
+leaving room for the concatenation header.
+"""
+import functools
+from typing import Tuple
+
+GSM7 = 'GSM-7'
+UCS2 = 'UCS-2'
+
+# The GSM 03.38 basic character set, without the escape character
+GSM7_BASIC = (
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+)
+# The characters of the GSM 03.38 extension table, taking two septets each
+GSM7_EXTENSION = '\f^{}\\[~]|€'
+
+# The number of septets (GSM-7) or code units (UCS-2) of a single segment and
+# of each segment of a concatenated text message
+SEGMENT_SIZES = {GSM7: (160, 153), UCS2: (70, 67)}
+
+# Translation table deleting the basic characters, so whatever remains of a
+# body is either extension characters or not encodable using GSM-7
+_basic_table = dict.fromkeys(map(ord, GSM7_BASIC))
+_extension = frozenset(GSM7_EXTENSION)
+
+
+def _split(body: str, size: int, wide: frozenset) -> Tuple[str, ...]:
+    """
+    Split the body in segments of at most size units, where the characters
+    in wide take two units and are never split across segments.
+    """
+    segments = []
+    start = units = 0
+    for index, char in enumerate(body):
+        width = 2 if char in wide else 1
+        if units + width > size:
+            segments.append(body[start:index])
+            start, units = index, 0
+        units += width
+    segments.append(body[start:])
+    return tuple(segments)
+
+
+@functools.lru_cache(maxsize=1024)
+def segment(body: str) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Return the encoding of the body and the segments it's split in.
+
+    The result is cached, so sending the same body to many recipients
+    segments it only once.
+    """
+    rest = body.translate(_basic_table)
+    if not rest or _extension.issuperset(rest):
+        encoding, length, wide = GSM7, len(body) + len(rest), _extension
+    else:
+        encoding = UCS2
+        length = len(body.encode('utf-16-le')) // 2
+        # Characters outside the BMP take a surrogate pair
+        wide = frozenset(char for char in rest if char > '\uffff')
+    single, multiple = SEGMENT_SIZES[encoding]
+    if length <= single:
+        return encoding, (body,)
+    if length == len(body):
+        return encoding, tuple(
+            body[i:i + multiple] for i in range(0, len(body), multiple)
+        )
+    return encoding, _split(body, multiple, wide)
+
+
+def get_encoding(body: str) -> str:
+    """Return the encoding of the body, either GSM7 or UCS2."""
+    return segment(body)[0]
+
+
+def split(body: str) -> Tuple[str, ...]:
+    """Return the segments of the body. An empty body takes one segment."""
+    return segment(body)[1]
+
+
+def count_segments(body: str) -> int:
+    """Return the number of segments of the body."""
+    return len(segment(body)[1])
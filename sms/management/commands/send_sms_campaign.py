@@ -0,0 +1,371 @@
+"""
+Send a text message to each recipient of a CSV file using a pool of worker
+processes.
+"""
+import csv
+import itertools
+import json
+import multiprocessing.util
+import os
+import sys
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+)
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from django.core.management.base import (  # type: ignore
+    BaseCommand, CommandError
+)
+from django.db import connections  # type: ignore
+
+from sms import phonenumbers
+from sms.message import TemplateMessage
+from sms.template import compile_template
+
+# The (row number, row) tuples of a chunk of the CSV file
+Chunk = List[Tuple[int, Dict[str, str]]]
+# The numbers of the first and the last row of a chunk
+Span = Tuple[int, int]
+# The (row number, recipient, error) tuples of the failed rows of a chunk
+Failures = List[Tuple[int, str, str]]
+
+# The state of a worker process, set by init_worker()
+_worker: Dict[str, Any] = {}
+
+
+def init_worker(
+    backend: Optional[str],
+    template: Optional[str],
+    originator: Optional[str],
+    recipient_column: str
+) -> None:
+    """
+    Prepare a worker process to send chunks, opening a connection to the
+    backend that's used for all chunks sent by the process and closed when
+    the process exits.
+    """
+    import django  # type: ignore
+    from django.apps import apps  # type: ignore
+
+    # Processes that weren't forked need to set up Django themselves, using
+    # the DJANGO_SETTINGS_MODULE environment variable
+    if not apps.ready:
+        django.setup()
+
+    from sms import get_connection
+
+    connection = get_connection(backend)
+    connection.open()
+    if multiprocessing.parent_process() is not None:
+        multiprocessing.util.Finalize(
+            None, connection.close, exitpriority=10
+        )
+    _worker.update(
+        connection=connection,
+        template=compile_template(template or '{body}'),
+        originator=originator,
+        recipient_column=recipient_column
+    )
+
+
+def send_chunk(chunk: Chunk) -> Tuple[int, int, Failures]:
+    """
+    Send a text message to the recipient of each row of the chunk, rendered
+    using the columns of the row, returning the number of rows, the number
+    of text messages sent and the failed rows.
+    """
+    connection = _worker['connection']
+    column: str = _worker['recipient_column']
+    validate: bool = getattr(connection, 'validate_recipients', False)
+    failures: Failures = []
+    # The (row number, recipient) tuples of each recipient. Validated
+    # recipients are reported in the E.164 format, so they're looked up by
+    # that format as well.
+    numbers: Dict[str, List[Tuple[int, str]]] = {}
+    # The (recipient, context) tuples of each originator
+    contexts: Dict[Optional[str], List[Tuple[str, Dict[str, str]]]] = {}
+    for number, row in chunk:
+        recipient = row.get(column) or ''
+        if not recipient:
+            failures.append(
+                (number, '', f'Missing recipient column {column!r}')
+            )
+            continue
+        found = numbers.setdefault(recipient, [])
+        if validate:
+            try:
+                e164 = phonenumbers.normalize(
+                    recipient, connection.default_country_code
+                )
+            except phonenumbers.InvalidPhoneNumber:
+                pass
+            else:
+                found = numbers[recipient] = numbers.setdefault(e164, found)
+        found.append((number, recipient))
+        originator = _worker['originator'] or row.get('originator')
+        contexts.setdefault(originator, []).append((recipient, row))
+    messages = [
+        TemplateMessage(_worker['template'], originator, rows)
+        for originator, rows in contexts.items()
+    ]
+
+    errors: List[Tuple[str, Exception]] = []
+    if messages:
+        try:
+            connection.send_messages(messages)
+        except Exception as exc:
+            if not connection.errors:
+                errors = [
+                    (recipient, exc)
+                    for message in messages
+                    for recipient in message.recipients
+                ]
+        errors.extend(
+            (recipient, error) for _, recipient, error in connection.errors
+        )
+    for recipient, error in errors:
+        # Row 0 stands for a recipient the backend reported in a format
+        # that can't be traced back to its row
+        number = 0
+        if numbers.get(recipient):
+            number, recipient = numbers[recipient].pop(0)
+        failures.append(
+            (number, recipient, f'{type(error).__name__}: {error}')
+        )
+    sent = sum(map(len, contexts.values())) - len(errors)
+    return len(chunk), sent, sorted(failures)
+
+
+class Command(BaseCommand):
+    help = (
+        'Send a text message to each recipient of a CSV file, rendering the '
+        'body of each text message using the columns of its row.'
+    )
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            'file', nargs='?', default='-',
+            help='The CSV file, with a header row. Reads from stdin if '
+                 'omitted or "-".'
+        )
+        parser.add_argument(
+            '--body',
+            help='The body template, rendered using the columns of each row, '
+                 'e.g. "Hi {name}". Defaults to the body column.'
+        )
+        parser.add_argument(
+            '--originator',
+            help='The originator. Defaults to the originator column, or the '
+                 'DEFAULT_FROM_SMS setting.'
+        )
+        parser.add_argument(
+            '--recipient-column', default='recipient',
+            help='The column of the recipients. Defaults to "recipient".'
+        )
+        parser.add_argument(
+            '--backend',
+            help='The Python import path of the backend. Defaults to the '
+                 'SMS_BACKEND setting.'
+        )
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='The number of worker processes, each with a connection of '
+                 'its own. Defaults to 1, sending from this process.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='The number of rows sent at once by a worker.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='A file keeping track of the rows sent, to resume after an '
+                 'interruption.'
+        )
+        parser.add_argument(
+            '--failures',
+            help='A CSV file to write the failed rows to.'
+        )
+        parser.add_argument(
+            '--progress', type=float, default=5,
+            help='The number of seconds between progress reports.'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options['processes'] < 1 or options['batch_size'] < 1:
+            raise CommandError(
+                'The number of processes and the batch size must be positive '
+                'integers.'
+            )
+        if options['body']:
+            try:
+                compile_template(options['body'])
+            except ValueError as exc:
+                raise CommandError(exc)
+        self.options = options
+        self.checkpoint: Optional[str] = options['checkpoint']
+        state = self.load_checkpoint()
+        # The number of rows handled before the first chunk
+        self.done: int = state['rows']
+        self.sent: int = state['sent']
+        self.failed: int = state['failed']
+        # The spans of the chunks handled after self.done, which completed
+        # before the chunks preceding them. Their rows are skipped when
+        # resuming.
+        self.finished: List[Span] = [
+            (first, last) for first, last in state['finished']
+        ]
+        self.advance()
+        if self.done and options['verbosity'] >= 1:
+            self.stdout.write(f'Resuming after row {self.done}.')
+
+        if options['file'] == '-':
+            self.send(sys.stdin)
+        else:
+            try:
+                with open(options['file'], newline='') as file:
+                    self.send(file)
+            except OSError as exc:
+                raise CommandError(exc)
+
+    def load_checkpoint(self) -> Dict[str, Any]:
+        state: Dict[str, Any] = {
+            'rows': 0, 'sent': 0, 'failed': 0, 'finished': []
+        }
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as file:
+                state.update(json.load(file))
+        return state
+
+    def save_checkpoint(self) -> None:
+        """Replace the checkpoint file atomically."""
+        if not self.checkpoint:
+            return
+        tmp = f'{self.checkpoint}.tmp'
+        with open(tmp, 'w') as file:
+            json.dump({
+                'rows': self.done,
+                'sent': self.sent,
+                'failed': self.failed,
+                'finished': self.finished,
+            }, file)
+        os.replace(tmp, self.checkpoint)
+
+    def chunks(self, file: Any) -> Iterator[Tuple[Span, Chunk]]:
+        """Yield the (span, chunk) tuples of the rows not sent yet."""
+        finished = list(self.finished)
+        rows = (
+            (number, row)
+            for number, row in itertools.islice(
+                enumerate(csv.DictReader(file), start=1), self.done, None
+            )
+            if not any(first <= number <= last for first, last in finished)
+        )
+        while True:
+            chunk = list(itertools.islice(rows, self.options['batch_size']))
+            if not chunk:
+                return
+            yield (chunk[0][0], chunk[-1][0]), chunk
+
+    def send(self, file: Any) -> None:
+        options = self.options
+        initargs = (
+            options['backend'],
+            options['body'],
+            options['originator'],
+            options['recipient_column'],
+        )
+        self.failures_file = None
+        if options['failures']:
+            self.failures_file = open(options['failures'], 'a', newline='')
+            self.failures_writer = csv.writer(self.failures_file)
+        self.started = self.reported = time.monotonic()
+        self.sent_before = self.sent
+        try:
+            if options['processes'] == 1:
+                init_worker(*initargs)
+                try:
+                    for span, chunk in self.chunks(file):
+                        self.handle_result(span, send_chunk(chunk))
+                finally:
+                    _worker.pop('connection').close()
+            else:
+                self.send_concurrently(file, initargs)
+        finally:
+            if self.failures_file is not None:
+                self.failures_file.close()
+            self.report(final=True)
+
+    def send_concurrently(self, file: Any, initargs: Tuple[Any, ...]) -> None:
+        """
+        Send the chunks using a pool of worker processes, keeping at most two
+        chunks per process in flight so the file is read as it's sent.
+        """
+        processes: int = self.options['processes']
+        in_flight: Dict[Future, Span] = {}
+        # Forked worker processes mustn't share the database connections of
+        # this process
+        connections.close_all()
+        with ProcessPoolExecutor(
+            processes, initializer=init_worker, initargs=initargs
+        ) as executor:
+            try:
+                for span, chunk in self.chunks(file):
+                    if len(in_flight) >= 2 * processes:
+                        self.collect(in_flight)
+                    in_flight[executor.submit(send_chunk, chunk)] = span
+                while in_flight:
+                    self.collect(in_flight)
+            except BaseException:
+                for future in in_flight:
+                    future.cancel()
+                raise
+
+    def collect(self, in_flight: Dict[Future, Span]) -> None:
+        done: Set[Future]
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            self.handle_result(in_flight.pop(future), future.result())
+
+    def handle_result(
+        self,
+        span: Span,
+        result: Tuple[int, int, Failures]
+    ) -> None:
+        _, sent, failures = result
+        self.sent += sent
+        self.failed += len(failures)
+        if self.failures_file is not None:
+            self.failures_writer.writerows(failures)
+            self.failures_file.flush()
+        for number, recipient, error in failures:
+            if self.options['verbosity'] >= 2:
+                self.stderr.write(f'Row {number} ({recipient}): {error}')
+        self.finished.append(span)
+        self.advance()
+        self.save_checkpoint()
+        if time.monotonic() - self.reported >= self.options['progress']:
+            self.report()
+
+    def advance(self) -> None:
+        """
+        Move the number of rows handled past the finished chunks following
+        it. The checkpoint only moves past chunks once all rows before them
+        have been handled too. The rows between the first and the last row
+        of a chunk that aren't part of it were handled before resuming.
+        """
+        self.finished.sort()
+        while self.finished and self.finished[0][0] <= self.done + 1:
+            self.done = max(self.done, self.finished.pop(0)[1])
+
+    def report(self, final: bool = False) -> None:
+        self.reported = time.monotonic()
+        if self.options['verbosity'] < 1:
+            return
+        elapsed = self.reported - self.started
+        rate = (self.sent - self.sent_before) / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{'Sent' if final else 'Sending'}: {self.sent} sent, "
+            f'{self.failed} failed, {self.done} rows done '
+            f'({rate:.0f} text messages/s).'
+        )
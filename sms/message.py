@@ -1,21 +1,56 @@
-from typing import Type, Optional, List, TYPE_CHECKING
+from typing import (
+    Any, Dict, Iterable, Mapping, Optional, List, Sequence, Tuple, Union,
+    TYPE_CHECKING
+)
 
 from django.conf import settings  # type: ignore
+from django.core.signals import setting_changed  # type: ignore
+from django.dispatch import receiver  # type: ignore
 
-from sms.signals import post_send
+from sms.encoding import segment
+from sms.phonenumbers import normalize_many
+from sms.template import UNCACHEABLE, Template, compile_template
 
 if TYPE_CHECKING:
     from sms.backends.base import BaseSmsBackend
 
+# The DEFAULT_FROM_SMS setting, looked up once instead of for every message
+_default_originator: Optional[str] = None
+
+
+@receiver(setting_changed)
+def clear_default_originator(*, setting: str, **kwargs) -> None:
+    """Clear the default originator when the DEFAULT_FROM_SMS changes."""
+    global _default_originator
+    if setting == 'DEFAULT_FROM_SMS':
+        _default_originator = None
+
+
+def get_default_originator() -> str:
+    """Return the DEFAULT_FROM_SMS setting."""
+    global _default_originator
+    if _default_originator is None:
+        _default_originator = getattr(settings, 'DEFAULT_FROM_SMS', '')
+    return _default_originator  # type: ignore
+
 
 class Message:
-    """A container for text message information."""
+    """
+    A container for text message information.
+
+    Messages don't have a __dict__, to keep them small when building many of
+    them. Subclasses adding attributes should define __slots__ as well.
+    """
+    __slots__ = ('body', 'originator', 'recipients', 'connection')
+
+    recipients: Sequence[str]
+
     def __init__(
         self,
         body: str = '',
         originator: Optional[str] = None,
         recipients: Optional[List[str]] = None,
-        connection: Optional[Type['BaseSmsBackend']] = None
+        connection: Optional['BaseSmsBackend'] = None
     ) -> None:
         """
         Initialize a single text message (which can be sent to multiple
@@ -29,16 +64,91 @@ class Message:
             self.recipients = recipients
         else:
             self.recipients = []
-        self.originator = originator or getattr(
-            settings, 'DEFAULT_FROM_SMS', ''
-        )
+        self.originator = originator or get_default_originator()
         self.body = body or ''
         self.connection = connection
 
+    @classmethod
+    def bulk(
+        cls,
+        body: str = '',
+        originator: Optional[str] = None,
+        recipients: Iterable[str] = (),
+        connection: Optional['BaseSmsBackend'] = None,
+        size: int = 1
+    ) -> List['Message']:
+        """
+        Return text messages with the same body and originator to each of the
+        recipients, with up to size recipients per text message.
+
+        The text messages share the body and originator, and their recipients
+        are stored as tuples. The recipients may be any iterable, including a
+        generator. __init__() isn't called for the text messages.
+        """
+        if isinstance(recipients, str):
+            raise TypeError('"recipients" argument must be an iterable')
+        if size < 1:
+            raise ValueError('"size" argument must be a positive integer')
+        body = body or ''
+        originator = originator or get_default_originator()
+        new = object.__new__
+        messages: List[Message] = []
+        append = messages.append
+        if size == 1:
+            chunks: Iterable[Tuple[str, ...]] = (
+                (recipient,) for recipient in recipients
+            )
+        else:
+            numbers = tuple(recipients)
+            chunks = (
+                numbers[i:i + size] for i in range(0, len(numbers), size)
+            )
+        for chunk in chunks:
+            message = new(cls)
+            message.body = body
+            message.originator = originator
+            message.recipients = chunk
+            message.connection = connection
+            append(message)
+        return messages
+
+    @property
+    def encoding(self) -> str:
+        """The encoding of the body, either 'GSM-7' or 'UCS-2'."""
+        return segment(self.body)[0]
+
+    @property
+    def segments(self) -> Tuple[str, ...]:
+        """The SMS segments the body is split in."""
+        return segment(self.body)[1]
+
+    @property
+    def segment_count(self) -> int:
+        """The number of SMS segments sent to each recipient."""
+        return len(segment(self.body)[1])
+
+    def validate(self, default_country_code: Optional[str] = None) -> None:
+        """
+        Normalize the recipients to the E.164 format, raising
+        sms.phonenumbers.InvalidPhoneNumber for the first invalid one.
+
+        National numbers are taken to be in the country of the given calling
+        code, defaulting to the SMS_DEFAULT_COUNTRY_CODE setting.
+        """
+        valid, invalid = normalize_many(
+            self.recipients,
+            default_country_code or getattr(
+                settings, 'SMS_DEFAULT_COUNTRY_CODE', None
+            )
+        )
+        if invalid:
+            raise invalid[0][1]
+        self.recipients = valid
+
     def get_connection(
         self,
         fail_silently: bool = False
-    ) -> Type['BaseSmsBackend']:
+    ) -> 'BaseSmsBackend':
         from sms import get_connection
         if not self.connection:
             self.connection = get_connection(fail_silently=fail_silently)
@@ -52,9 +162,87 @@ class Message:
             # Don't brother creating the network connection if there's nobody
             # to send the text message to
             return 0
-        connection: Type['BaseSmsBackend'] = self.get_connection(fail_silently)
-        count = connection.send_messages([self])  # type: ignore
+        connection: 'BaseSmsBackend' = self.get_connection(fail_silently)
+        return connection.send_messages([self])
+
+    async def asend(self, fail_silently: bool = False) -> int:
+        """
+        Send the text messages from asynchronous code and return the number of
+        messages sent.
+        """
+        if not self.recipients:
+            # Don't brother creating the network connection if there's nobody
+            # to send the text message to
+            return 0
+        connection: 'BaseSmsBackend' = self.get_connection(fail_silently)
+        return await connection.asend_messages([self])
+
+
+class TemplateMessage(Message):
+    """
+    A text message with a body template, rendered with the context of each
+    recipient when it's sent.
 
-        post_send.send(sender=self.__class__, instance=self)
+    The body is the source of the template. Backends render the text message
+    using render(), sending a single text message to all recipients whose
+    bodies render identically.
+    """
+    __slots__ = ('template', 'contexts')
 
-        return count
+    def __init__(
+        self,
+        template: Union[str, Template] = '',
+        originator: Optional[str] = None,
+        contexts: Iterable[Tuple[str, Mapping[str, Any]]] = (),
+        connection: Optional['BaseSmsBackend'] = None
+    ) -> None:
+        """
+        Initialize a text message from a template and the (recipient,
+        context) tuples of its recipients, which may be any iterable,
+        including a generator.
+        """
+        if isinstance(template, str):
+            template = compile_template(template)
+        recipients: List[str] = []
+        self.contexts: List[Mapping[str, Any]] = []
+        for recipient, context in contexts:
+            recipients.append(recipient)
+            self.contexts.append(context)
+        super().__init__(template.source, originator, recipients, connection)
+        self.template = template
+
+    def render(self) -> Tuple[List[Message], List[Tuple[str, Exception]]]:
+        """
+        Render the body of each recipient, returning the rendered text
+        messages and the (recipient, exception) tuples of the recipients
+        whose body failed to render.
+
+        Recipients with identical bodies share a rendered text message. The
+        body of contexts with the same values for the variables used by the
+        template is only rendered once.
+        """
+        template = self.template
+        # The rendered body of each context key
+        cache: Dict[Any, str] = {}
+        # The recipients of each body, in the order they're first rendered
+        groups: Dict[str, List[str]] = {}
+        failures: List[Tuple[str, Exception]] = []
+        for recipient, context in zip(self.recipients, self.contexts):
+            key = template.get_key(context)
+            body = cache.get(key) if key is not UNCACHEABLE else None
+            if body is None:
+                try:
+                    body = template.render(context)
+                except (
+                    AttributeError, LookupError, TypeError, ValueError
+                ) as exc:
+                    failures.append((recipient, exc))
+                    continue
+                if key is not UNCACHEABLE:
+                    cache[key] = body
+            groups.setdefault(body, []).append(recipient)
+        messages = [
+            Message(body, self.originator, recipients, self.connection)
+            for body, recipients in groups.items()
+        ]
+        return messages, failures
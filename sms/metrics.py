@@ -0,0 +1,271 @@
+"""
+Metrics of the text messages sent by SMS backends.
+
+Each call to send_messages() is reported to the sinks configured in the
+SMS_METRICS setting, with the Python import path of the backend, the duration
+of the call and the number of recipients sent and failed.
+"""
+import bisect
+import socket
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings  # type: ignore
+from django.core.signals import setting_changed  # type: ignore
+from django.dispatch import receiver  # type: ignore
+from django.utils.module_loading import import_string  # type: ignore
+
+# The upper bounds in seconds of the buckets of the duration histograms
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf')
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum: float = 0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """
+    An in-memory registry of counters and histograms, rendered in the
+    Prometheus text exposition format.
+    """
+    def __init__(self) -> None:
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.help: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def inc(
+        self,
+        name: str,
+        value: float = 1,
+        labels: Labels = (),
+        help: str = ''
+    ) -> None:
+        with self.lock:
+            counter = self.counters.setdefault(name, {})
+            counter[labels] = counter.get(labels, 0) + value
+            self.help.setdefault(name, help)
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        labels: Labels = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        help: str = ''
+    ) -> None:
+        with self.lock:
+            histograms = self.histograms.setdefault(name, {})
+            if labels not in histograms:
+                histograms[labels] = Histogram(buckets)
+            histograms[labels].observe(value)
+            self.help.setdefault(name, help)
+
+    def get(self, name: str, labels: Labels = ()) -> Any:
+        """Return the value of a counter or the histogram with the labels."""
+        with self.lock:
+            if name in self.counters:
+                return self.counters[name].get(labels, 0)
+            return self.histograms.get(name, {}).get(labels)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        def format_labels(labels: Labels) -> str:
+            if not labels:
+                return ''
+            return '{%s}' % ','.join(
+                '%s="%s"' % (key, value.replace('\\', '\\\\').replace(
+                    '"', '\\"'
+                ))
+                for key, value in labels
+            )
+
+        lines: List[str] = []
+        with self.lock:
+            for name, values in sorted(self.counters.items()):
+                lines.append(f'# HELP {name} {self.help.get(name, "")}')
+                lines.append(f'# TYPE {name} counter')
+                for labels, value in values.items():
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+            for name, histograms in sorted(self.histograms.items()):
+                lines.append(f'# HELP {name} {self.help.get(name, "")}')
+                lines.append(f'# TYPE {name} histogram')
+                for labels, histogram in histograms.items():
+                    cumulative = 0
+                    for bound, count in zip(
+                        histogram.buckets, histogram.counts
+                    ):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        bucket_labels = format_labels(labels + (('le', le),))
+                        lines.append(
+                            f'{name}_bucket{bucket_labels} {cumulative}'
+                        )
+                    lines.append(
+                        f'{name}_sum{format_labels(labels)} {histogram.sum}'
+                    )
+                    lines.append(
+                        f'{name}_count{format_labels(labels)} '
+                        f'{histogram.count}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+# The registry the PrometheusSink records to by default
+default_registry = Registry()
+
+
+class BaseSink:
+    """Base class for metrics sinks."""
+    def record_send(
+        self,
+        backend: str,
+        duration: float,
+        sent: int,
+        failed: int
+    ) -> None:
+        """Record a call to send_messages() of the backend."""
+        raise NotImplementedError
+
+
+class PrometheusSink(BaseSink):
+    """
+    Record the metrics in an in-memory Registry, by default the
+    default_registry of this module, which is exposed by metrics_view().
+    """
+    def __init__(
+        self,
+        registry: Optional[Registry] = None,
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        self.registry = registry or default_registry
+        self.buckets = tuple(sorted(buckets))
+        if self.buckets[-1] != float('inf'):
+            self.buckets += (float('inf'),)
+
+    def record_send(
+        self,
+        backend: str,
+        duration: float,
+        sent: int,
+        failed: int
+    ) -> None:
+        labels = (('backend', backend),)
+        self.registry.inc(
+            'sms_messages_sent_total', sent, labels,
+            help='Number of recipients text messages were sent to.'
+        )
+        self.registry.inc(
+            'sms_messages_failed_total', failed, labels,
+            help='Number of recipients text messages failed to send to.'
+        )
+        self.registry.observe(
+            'sms_send_duration_seconds', duration, labels, self.buckets,
+            help='Duration of the calls to send_messages().'
+        )
+
+
+class StatsdSink(BaseSink):
+    """
+    Send the metrics to a StatsD server over UDP.
+
+    The backend is added to the metric names, e.g.
+    'sms.messages_sent.sms_backends_twilio_SmsBackend', unless tags is True,
+    in which case it's sent as a DogStatsD tag.
+    """
+    def __init__(
+        self,
+        host: str = 'localhost',
+        port: int = 8125,
+        prefix: str = 'sms',
+        tags: bool = False
+    ) -> None:
+        self.address = (host, port)
+        self.prefix = prefix
+        self.tags = tags
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def record_send(
+        self,
+        backend: str,
+        duration: float,
+        sent: int,
+        failed: int
+    ) -> None:
+        if self.tags:
+            suffix, tags = '', f'|#backend:{backend}'
+        else:
+            suffix, tags = '.' + backend.replace('.', '_'), ''
+        metrics = [
+            f'{self.prefix}.messages_sent{suffix}:{sent}|c{tags}',
+            f'{self.prefix}.messages_failed{suffix}:{failed}|c{tags}',
+            f'{self.prefix}.send_duration{suffix}:'
+            f'{duration * 1000:.3f}|ms{tags}',
+        ]
+        try:
+            self.socket.sendto('\n'.join(metrics).encode(), self.address)
+        except OSError:
+            # Metrics must never break sending text messages
+            pass
+
+
+_sinks: Optional[List[BaseSink]] = None
+
+
+@receiver(setting_changed)
+def clear_sinks(*, setting: str, **kwargs) -> None:
+    global _sinks
+    if setting == 'SMS_METRICS':
+        _sinks = None
+
+
+def get_sinks() -> List[BaseSink]:
+    """
+    Return the sinks configured in the SMS_METRICS setting, a list of Python
+    import paths of sinks or dictionaries with the sink and its options, e.g.:
+
+        SMS_METRICS = [
+            'sms.metrics.PrometheusSink',
+            {'sink': 'sms.metrics.StatsdSink', 'options': {'port': 8125}},
+        ]
+    """
+    global _sinks
+    if _sinks is None:
+        sinks = []
+        for config in getattr(settings, 'SMS_METRICS', None) or []:
+            if isinstance(config, str):
+                config = {'sink': config}
+            sinks.append(
+                import_string(config['sink'])(**config.get('options', {}))
+            )
+        _sinks = sinks
+    return _sinks
+
+
+def metrics_view(request: Any) -> Any:
+    """A Django view exposing the metrics of the default registry."""
+    from django.http import HttpResponse  # type: ignore
+
+    return HttpResponse(
+        default_registry.render(), content_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,193 @@
+"""
+Normalization and validation of phone numbers in the E.164 format.
+
+Country calling codes are looked up in a trie of the ITU-T E.164 assigned
+codes, built once at import time, together with the range of lengths of the
+national significant numbers of the numbering plan. This doesn't validate
+whether a number is actually assigned, but rejects numbers that can't be
+valid without sending them to a provider.
+"""
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# The lengths of the national significant numbers of numbering plans, by
+# country calling code. Codes missing here allow any length from 4 digits up
+# to the 15 digits of an E.164 number.
+NUMBER_LENGTHS: Dict[str, Tuple[int, int]] = {
+    '1': (10, 10), '7': (10, 10), '20': (8, 10), '27': (9, 9),
+    '30': (10, 10), '31': (9, 9), '32': (8, 9), '33': (9, 9), '34': (9, 9),
+    '36': (8, 9), '39': (6, 11), '40': (9, 9), '41': (9, 9), '43': (4, 13),
+    '44': (7, 10), '45': (8, 8), '46': (7, 10), '47': (5, 8), '48': (9, 9),
+    '49': (5, 13), '51': (8, 9), '52': (10, 10), '53': (6, 8),
+    '54': (10, 11), '55': (10, 11), '56': (9, 9), '57': (8, 10),
+    '58': (10, 10), '60': (8, 10), '61': (9, 9), '62': (7, 12),
+    '63': (8, 10), '64': (8, 10), '65': (8, 8), '66': (8, 9), '81': (9, 10),
+    '82': (8, 11), '84': (9, 10), '86': (9, 11), '90': (10, 10),
+    '91': (10, 10), '92': (9, 10), '93': (9, 9), '94': (9, 9),
+    '95': (7, 10), '98': (10, 10), '212': (9, 9), '213': (8, 9),
+    '216': (8, 8), '234': (8, 10), '254': (9, 9), '351': (9, 9),
+    '353': (7, 9), '358': (5, 12), '380': (9, 9), '420': (9, 9),
+    '966': (9, 9), '971': (8, 9), '972': (8, 9),
+}
+
+# All assigned country calling codes
+CALLING_CODES = frozenset(NUMBER_LENGTHS) | frozenset((
+    '211 218 220 221 222 223 224 225 226 227 228 229 230 231 232 233 235 '
+    '236 237 238 239 240 241 242 243 244 245 246 247 248 249 250 251 252 '
+    '253 255 256 257 258 260 261 262 263 264 265 266 267 268 269 290 291 '
+    '297 298 299 350 352 354 355 356 357 359 370 371 372 373 374 375 376 '
+    '377 378 379 381 382 383 385 386 387 389 421 423 500 501 502 503 504 '
+    '505 506 507 508 509 590 591 592 593 594 595 596 597 598 599 670 672 '
+    '673 674 675 676 677 678 679 680 681 682 683 685 686 687 688 689 690 '
+    '691 692 800 808 850 852 853 855 856 870 878 880 881 882 883 886 888 '
+    '960 961 962 963 964 965 967 968 970 973 974 975 976 977 979 992 993 '
+    '994 995 996 998'
+).split())
+
+# Countries where the leading zero of national numbers is part of the number
+# rather than a trunk prefix
+KEEP_LEADING_ZERO = frozenset(('39', '378'))
+
+# Characters commonly used to format phone numbers
+_formatting = str.maketrans('', '', ' \t-.()/')
+
+
+def _build_trie() -> Dict[str, Any]:
+    """
+    Return a trie of the calling codes, where the '' key of the node of a
+    calling code holds the code and the lengths of its numbers.
+    """
+    trie: Dict[str, Any] = {}
+    for code in CALLING_CODES:
+        node = trie
+        for digit in code:
+            node = node.setdefault(digit, {})
+        node[''] = (code, *NUMBER_LENGTHS.get(code, (4, 15 - len(code))))
+    return trie
+
+
+_trie = _build_trie()
+
+
+def clean(number: str) -> str:
+    """
+    Return the phone number without formatting characters, replacing the
+    international call prefix 00 by a plus sign, e.g. '0031 (6) 1234-5678'
+    becomes '+31612345678'. The number isn't validated.
+    """
+    number = number.translate(_formatting)
+    if number.startswith('00'):
+        number = '+' + number[2:]
+    return number
+
+
+class InvalidPhoneNumber(ValueError):
+    """Raised for phone numbers that can't be valid."""
+    def __init__(self, number: str, reason: str) -> None:
+        super().__init__(f'Invalid phone number {number!r}: {reason}')
+        self.number = number
+        self.reason = reason
+
+
+class PhoneNumber(NamedTuple):
+    e164: str
+    country_code: str
+    national_number: str
+
+
+def _lookup(digits: str) -> Optional[Tuple[str, int, int]]:
+    """Return the calling code prefixing the digits and its lengths."""
+    node = _trie
+    for digit in digits[:3]:
+        if digit not in node:
+            return None
+        node = node[digit]
+        if '' in node:
+            return node['']
+    return None
+
+
+def parse(
+    number: str,
+    default_country_code: Optional[str] = None
+) -> PhoneNumber:
+    """
+    Parse a phone number in the international format, e.g. '+31 6 12345678'
+    or '0031612345678', or a national number if a default country calling
+    code is given, and raise InvalidPhoneNumber if it can't be valid.
+    """
+    # The trunk prefix written as e.g. '+31 (0)6 12345678'
+    digits = clean(number.replace('(0)', ''))
+    if digits.startswith('+'):
+        digits = digits[1:]
+    elif default_country_code:
+        if (
+            digits.startswith('0')
+            and default_country_code not in KEEP_LEADING_ZERO
+        ):
+            digits = digits[1:]
+        digits = default_country_code + digits
+    else:
+        raise InvalidPhoneNumber(number, 'missing country calling code')
+    if not digits.isdigit() or not digits.isascii():
+        raise InvalidPhoneNumber(number, 'not a number')
+    if len(digits) > 15:
+        raise InvalidPhoneNumber(number, 'too long')
+    found = _lookup(digits)
+    if found is None:
+        raise InvalidPhoneNumber(number, 'unknown country calling code')
+    code, min_length, max_length = found
+    national_number = digits[len(code):]
+    if not min_length <= len(national_number) <= max_length:
+        raise InvalidPhoneNumber(
+            number, f'invalid length for country calling code +{code}'
+        )
+    return PhoneNumber('+' + digits, code, national_number)
+
+
+def normalize(number: str, default_country_code: Optional[str] = None) -> str:
+    """Return the phone number in the E.164 format, e.g. '+31612345678'."""
+    return parse(number, default_country_code).e164
+
+
+def normalize_many(
+    numbers: Iterable[str],
+    default_country_code: Optional[str] = None
+) -> Tuple[List[str], List[Tuple[str, InvalidPhoneNumber]]]:
+    """
+    Return the valid phone numbers in the E.164 format, and the
+    (number, exception) tuples of the invalid ones.
+    """
+    valid: List[str] = []
+    invalid: List[Tuple[str, InvalidPhoneNumber]] = []
+    append = valid.append
+    lookup = _lookup
+    for number in numbers:
+        # Fast path for numbers that are in the E.164 format already
+        digits = number[1:]
+        if (
+            number[:1] == '+' and digits.isdigit() and digits.isascii()
+            and len(digits) <= 15
+        ):
+            found = lookup(digits)
+            if (
+                found is not None
+                and found[1] <= len(digits) - len(found[0]) <= found[2]
+            ):
+                append(number)
+                continue
+        try:
+            append(parse(number, default_country_code).e164)
+        except InvalidPhoneNumber as exc:
+            invalid.append((number, exc))
+    return valid, invalid
+
+
+def country_code(number: str) -> Optional[str]:
+    """
+    Return the country calling code of a phone number in the E.164 format,
+    or None if it has none.
+    """
+    if not number.startswith('+'):
+        return None
+    found = _lookup(number[1:])
+    return found[0] if found else None
@@ -0,0 +1,167 @@
+"""
+Persistent HTTP connections shared by the SMS backends of a process.
+"""
+import atexit
+import collections
+import http.client
+import ssl
+import threading
+from typing import Any, Deque, Dict, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+_sessions: Dict[Tuple[str, int], Any] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(name: str, pool_size: int = 10) -> Any:
+    """
+    Return the process-wide requests session with the given name, keeping up
+    to pool_size connections per host alive between requests.
+
+    The session is shared by all threads and connections of the process, so
+    repeated requests reuse warm connections instead of setting up a new TCP
+    and TLS connection for each of them. When more than pool_size requests to
+    the same host are in flight, the extra connections are closed afterwards.
+    """
+    from requests import Session  # type: ignore
+    from requests.adapters import HTTPAdapter  # type: ignore
+
+    key = (name, pool_size)
+    with _sessions_lock:
+        try:
+            return _sessions[key]
+        except KeyError:
+            pass
+        session = Session()
+        adapter = HTTPAdapter(pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _sessions[key] = session
+        return session
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of persistent http.client connections to a single
+    host, keeping up to size idle connections alive between requests.
+
+    A request on an idle connection that was closed by the server in the
+    meantime is sent again using a new connection, but only if sending it
+    failed or the server closed the connection without responding. Other
+    errors are raised, as the request may have been handled.
+    """
+    def __init__(self, url: str, size: int = 10, timeout: float = 10) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f'Invalid URL: {url!r}')
+        self.scheme = parts.scheme
+        self.host: str = parts.hostname
+        self.port: Optional[int] = parts.port
+        self.size = size
+        self.timeout = timeout
+        self.idle: Deque[http.client.HTTPConnection] = collections.deque()
+        self.lock = threading.Lock()
+
+    def connect(self) -> http.client.HTTPConnection:
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(
+                self.host,
+                self.port,
+                timeout=self.timeout,
+                context=ssl.create_default_context()
+            )
+        return http.client.HTTPConnection(
+            self.host, self.port, timeout=self.timeout
+        )
+
+    def release(self, connection: http.client.HTTPConnection) -> None:
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(connection)
+                return
+        connection.close()
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None
+    ) -> Tuple[int, bytes]:
+        """Send a request and return the status code and the response body."""
+        while True:
+            try:
+                connection = self.idle.pop()
+                reused = True
+            except IndexError:
+                connection = self.connect()
+                reused = False
+            try:
+                connection.request(method, path, body, dict(headers or {}))
+            except ConnectionError:
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            try:
+                response = connection.getresponse()
+                data = response.read()
+            except http.client.RemoteDisconnected:
+                # The server closed the idle connection without responding,
+                # so it didn't handle the request
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except Exception:
+                # The request may have been handled, so sending it again is
+                # left to the retry policy
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self.release(connection)
+            return response.status, data
+
+    def close(self) -> None:
+        with self.lock:
+            while self.idle:
+                self.idle.pop().close()
+
+
+_connection_pools: Dict[Tuple[str, str, int, float], ConnectionPool] = {}
+
+
+def get_connection_pool(
+    url: str,
+    size: int = 10,
+    timeout: float = 10
+) -> ConnectionPool:
+    """
+    Return the process-wide connection pool to the host of the URL, keeping up
+    to size connections alive.
+    """
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc, size, timeout)
+    with _sessions_lock:
+        try:
+            return _connection_pools[key]
+        except KeyError:
+            pool = _connection_pools[key] = ConnectionPool(url, size, timeout)
+            return pool
+
+
+@atexit.register
+def close_sessions() -> None:
+    """Close the connections of all sessions and connection pools."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        for pool in _connection_pools.values():
+            pool.close()
+        _connection_pools.clear()
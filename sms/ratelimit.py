@@ -0,0 +1,245 @@
+"""
+Rate limiting of text messages sent by SMS backends.
+"""
+import json
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from django.core.exceptions import ImproperlyConfigured  # type: ignore
+
+from sms.phonenumbers import country_code
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate: Union[str, int, float]) -> float:
+    """
+    Return the number of tokens per second for a rate in the form of
+    '<count>/<period>', where period is one of 's', 'm', 'h' or 'd' (e.g.
+    '10/s' or '1000/hour'). A number is taken as tokens per second.
+    """
+    if isinstance(rate, (int, float)):
+        count, seconds = float(rate), 1
+    else:
+        try:
+            num, period = rate.split('/')
+            count, seconds = float(num), PERIODS[period.strip()[0]]
+        except (ValueError, KeyError, IndexError):
+            raise ImproperlyConfigured(f'Invalid rate: {rate!r}')
+    if count <= 0:
+        raise ImproperlyConfigured(f'Invalid rate: {rate!r}')
+    return count / seconds
+
+
+class TokenBucket:
+    """
+    A token bucket shared by all threads of a process.
+
+    Tokens are reserved ahead of time, so concurrent callers are paced one
+    after another instead of all waking up at the same time.
+    """
+    def __init__(self, rate: float, burst: float = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Reserve the given number of tokens and return the number of seconds
+        to wait before using them.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+
+class CacheTokenBucket:
+    """
+    A token bucket shared by all processes using the same Django cache.
+
+    Time is divided in windows of at least one second. Tokens are handed out
+    evenly spread over each window, using the atomic incr() of the cache to
+    count the tokens reserved in a window. Once a window is full, tokens are
+    reserved in the next one.
+    """
+    def __init__(
+        self,
+        rate: float,
+        cache: str = 'default',
+        key: str = ''
+    ) -> None:
+        from django.core.cache import caches  # type: ignore
+
+        self.rate = rate
+        self.cache = caches[cache]
+        self.key = f'sms:ratelimit:{key}'
+        self.window = max(math.ceil(1 / rate), 1)
+        self.capacity = rate * self.window
+
+    def reserve(self, tokens: float = 1) -> float:
+        tokens = math.ceil(tokens)
+        now = time.time()
+        start = now // self.window * self.window
+        while True:
+            key = f'{self.key}:{int(start)}'
+            self.cache.add(key, 0, timeout=self.window * 2 + 1)
+            try:
+                count = self.cache.incr(key, tokens)
+            except ValueError:
+                # The key expired in the meantime
+                continue
+            # Reservations larger than a window get a window of their own
+            if count <= self.capacity or count == tokens:
+                return max(start + (count - tokens) / self.rate - now, 0)
+            start += self.window
+
+
+class RateLimiter:
+    """
+    Pace the recipients of text messages according to a global rate, a rate
+    per originator and rates per destination prefix.
+
+    The configuration is a dictionary with the following optional keys:
+
+    - rate: The global rate, e.g. '30/s'.
+    - per_originator: The rate of each originator.
+    - per_prefix: A dictionary mapping phone number prefixes to their rate,
+      e.g. {'+1': '1/s'}. Each recipient is limited by the longest matching
+      prefix only.
+    - per_country: The rate of each country calling code, for recipients in
+      the E.164 format.
+    - burst: The number of recipients that may be sent at once. Defaults to
+      1, pacing each recipient individually.
+    - per_segment: Whether each SMS segment of a text message costs a token,
+      rather than each text message. Defaults to False.
+    - cache: The alias of a Django cache to share the rate limits between
+      processes. By default, the rate limits are tracked in memory.
+    """
+    def __init__(self, config: Dict[str, Any], name: str = '') -> None:
+        unknown = set(config) - {
+            'rate', 'per_originator', 'per_prefix', 'per_country', 'burst',
+            'per_segment', 'cache'
+        }
+        if unknown:
+            raise ImproperlyConfigured(
+                f"Unknown rate limit option(s): {', '.join(sorted(unknown))}"
+            )
+        self.name = name
+        self.burst: int = max(int(config.get('burst', 1)), 1)
+        self.per_segment: bool = bool(config.get('per_segment', False))
+        self.cache: Optional[str] = config.get('cache')
+        self.rate: Optional[float] = None
+        if config.get('rate'):
+            self.rate = parse_rate(config['rate'])
+        self.per_originator: Optional[float] = None
+        if config.get('per_originator'):
+            self.per_originator = parse_rate(config['per_originator'])
+        self.per_country: Optional[float] = None
+        if config.get('per_country'):
+            self.per_country = parse_rate(config['per_country'])
+        # Longest prefixes first, so the first match is the longest one
+        self.per_prefix: List[Tuple[str, float]] = sorted(
+            (
+                (prefix, parse_rate(rate))
+                for prefix, rate in config.get('per_prefix', {}).items()
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+        self.buckets: Dict[str, Union[TokenBucket, CacheTokenBucket]] = {}
+        self.lock = threading.Lock()
+
+    def get_bucket(
+        self,
+        key: str,
+        rate: float
+    ) -> Union[TokenBucket, CacheTokenBucket]:
+        try:
+            return self.buckets[key]
+        except KeyError:
+            pass
+        with self.lock:
+            if key not in self.buckets:
+                if self.cache:
+                    self.buckets[key] = CacheTokenBucket(
+                        rate, self.cache, f'{self.name}:{key}'
+                    )
+                else:
+                    self.buckets[key] = TokenBucket(rate, self.burst)
+            return self.buckets[key]
+
+    def reserve(
+        self,
+        originator: str,
+        recipients: List[str],
+        cost: float = 1
+    ) -> float:
+        """
+        Reserve tokens for sending a text message from the originator to the
+        recipients, each costing the given number of tokens. Return the number
+        of seconds to wait before sending.
+        """
+        tokens: Dict[Tuple[str, float], float] = {}
+        if self.rate:
+            tokens[('', self.rate)] = cost * len(recipients)
+        if self.per_originator:
+            key = (f'originator:{originator}', self.per_originator)
+            tokens[key] = cost * len(recipients)
+        for recipient in recipients:
+            if self.per_country:
+                code = country_code(recipient)
+                if code is not None:
+                    key = (f'country:{code}', self.per_country)
+                    tokens[key] = tokens.get(key, 0) + cost
+            for prefix, rate in self.per_prefix:
+                if recipient.startswith(prefix):
+                    key = (f'prefix:{prefix}', rate)
+                    tokens[key] = tokens.get(key, 0) + cost
+                    break
+        return max(
+            (
+                self.get_bucket(key, rate).reserve(count)
+                for (key, rate), count in tokens.items()
+            ),
+            default=0
+        )
+
+    def acquire(
+        self,
+        originator: str,
+        recipients: List[str],
+        cost: float = 1
+    ) -> None:
+        """Block until the text message may be sent."""
+        delay = self.reserve(originator, recipients, cost)
+        if delay > 0:
+            time.sleep(delay)
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(config: Dict[str, Any], name: str = '') -> RateLimiter:
+    """
+    Return the process-wide rate limiter for the given configuration, so all
+    connections of a backend share the same token buckets.
+    """
+    key = json.dumps([name, config], sort_keys=True, default=str)
+    with _rate_limiters_lock:
+        try:
+            return _rate_limiters[key]
+        except KeyError:
+            limiter = _rate_limiters[key] = RateLimiter(config, name)
+            return limiter
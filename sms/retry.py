@@ -0,0 +1,103 @@
+"""
+Retrying text messages that failed to send because of transient errors.
+"""
+import random
+import socket
+import time
+from typing import Any, Callable, Optional
+
+from django.core.exceptions import ImproperlyConfigured  # type: ignore
+from django.utils.module_loading import import_string  # type: ignore
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Return whether the exception raised while sending a text message is
+    likely to be transient.
+
+    Connection errors, timeouts and HTTP responses with a 408, 429 or 5xx
+    status code, as raised by the provider SDKs, are considered transient.
+    """
+    status = getattr(exc, 'status', None)
+    if status is None:
+        status = getattr(exc, 'status_code', None)
+    if status is None:
+        response = getattr(exc, 'response', None)
+        status = getattr(response, 'status_code', None)
+    if isinstance(status, int):
+        return status in (408, 429) or status >= 500
+    # Includes the connection errors and timeouts of requests
+    return isinstance(exc, (OSError, socket.timeout, TimeoutError))
+
+
+class RetryPolicy:
+    """
+    Retry transient errors with exponential backoff.
+
+    The n-th retry waits backoff * 2 ** (n - 1) seconds, capped at max_backoff
+    seconds. If jitter is True, a random delay between zero and that number
+    is used instead, so concurrent retries are spread out. A text message is
+    sent at most max_attempts times, and isn't retried once deadline seconds
+    have passed since sending started.
+
+    The retryable argument is a callable, or the Python import path of one,
+    deciding whether an exception is transient. Defaults to is_retryable().
+    """
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30,
+        deadline: Optional[float] = None,
+        jitter: bool = True,
+        retryable: Optional[Any] = None
+    ) -> None:
+        if not isinstance(max_attempts, int) or max_attempts < 1:
+            raise ImproperlyConfigured(
+                'The maximum number of attempts must be a positive integer.'
+            )
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.jitter = jitter
+        if isinstance(retryable, str):
+            retryable = import_string(retryable)
+        self.retryable: Callable[[BaseException], bool] = (
+            retryable or is_retryable
+        )
+
+    def get_delay(
+        self,
+        exc: BaseException,
+        attempt: int,
+        elapsed: float = 0
+    ) -> Optional[float]:
+        """
+        Return the number of seconds to wait before retrying after the given
+        attempt failed with exc, or None if it shouldn't be retried.
+        """
+        if attempt >= self.max_attempts or not self.retryable(exc):
+            return None
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+        return delay
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call func, retrying transient errors."""
+        started = time.monotonic()
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as exc:
+                delay = self.get_delay(
+                    exc, attempt, time.monotonic() - started
+                )
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
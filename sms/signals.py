@@ -1,4 +1,10 @@
 from django.dispatch import Signal  # type: ignore
 
 
+# Sent before a backend sends text messages, with the backend and messages
+# arguments.
+pre_send = Signal()
+
+# Sent for each text message after a backend sent it, with the instance,
+# backend, duration, sent, failed, errors and duplicates arguments.
 post_send = Signal()
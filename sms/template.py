@@ -0,0 +1,67 @@
+"""
+Compiled body templates, rendered with the context of each recipient.
+"""
+import functools
+from string import Formatter
+from typing import Any, Mapping, Tuple
+
+# Returned by Template.get_key() for contexts that can't be cached
+UNCACHEABLE = object()
+
+
+class Template:
+    """
+    A body template using the format string syntax, e.g. 'Hi {name}'.
+
+    The template is parsed once, when it's created. Its fields must be named,
+    and may use attributes, items and format specifications, e.g.
+    '{user.name}' or '{total:.2f}'.
+    """
+    __slots__ = ('source', 'fields')
+
+    def __init__(self, source: str) -> None:
+        fields = []
+        for _, field, _, _ in Formatter().parse(source):
+            if field is None:
+                continue
+            # The name of the context variable, without attributes or items
+            name = field.partition('.')[0].partition('[')[0]
+            if not name or name.isdigit():
+                raise ValueError(
+                    f'Template fields must be named, got {source!r}'
+                )
+            if name not in fields:
+                fields.append(name)
+        self.source = source
+        self.fields: Tuple[str, ...] = tuple(fields)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.source!r})'
+
+    def get_key(self, context: Mapping[str, Any]) -> Any:
+        """
+        Return the values of the context used by the template and their
+        types, identifying the rendered body, or UNCACHEABLE if a value isn't
+        hashable. Equal values of different types, like 1, 1.0 and True, may
+        be rendered differently, so their keys differ.
+        """
+        values = [context.get(name, UNCACHEABLE) for name in self.fields]
+        key = (*values, *map(type, values))
+        try:
+            hash(key)
+        except TypeError:
+            return UNCACHEABLE
+        return key
+
+    def render(self, context: Mapping[str, Any]) -> str:
+        """
+        Return the body for the context, raising KeyError for missing
+        variables.
+        """
+        return self.source.format_map(context)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_template(source: str) -> Template:
+    """Return the template of the source, parsing it only once."""
+    return Template(source)
@@ -1,40 +1,134 @@
+import gzip
+import mmap
 import re
+from typing import BinaryIO, Dict, Iterator, List
 
 from sms.message import Message
 
 
-header_RE = re.compile('^(?:from|to): .*')
-header_from_RE = re.compile('^from: (.*)$', re.MULTILINE)
-header_to_RE = re.compile('^to: (.*)$', re.MULTILINE)
+header_RE = re.compile('^(from|to): (.*)$')
 
+# The line written after each text message by the console and file backends
+SEPARATOR = b'-' * 79
+_separator = SEPARATOR.decode()
 
-def message_from_binary_file(fp) -> Message:
+
+def message_from_binary_file(fp: BinaryIO) -> Message:
     """Parse a binary file into a Message object model."""
     return message_from_bytes(fp.read())
 
 
 def message_from_bytes(s: bytes) -> Message:
     """Parse a bytes string into a Message object model."""
-    text = s.decode('ASCII', errors='surrogateescape')
-
-    body = ''
-    for line in text.splitlines():
-        if not header_RE.match(line):
-            if body is not None:
-                body += '\n' + line
-            else:
-                body = line
-
-    from_result = header_from_RE.search(text)
-    if from_result:
-        from_phone = from_result.group(1)
-    else:
-        raise ValueError
+    return message_from_string(s.decode('ASCII', errors='surrogateescape'))
+
+
+def message_from_string(s: str) -> Message:
+    """Parse a string into a Message object model.
+
+    The string contains a single text message as written by the console and
+    file backends: the 'from' and 'to' header lines followed by the body. A
+    trailing separator line is ignored.
+    """
+    if s.endswith('\n'):
+        s = s[:-1]
+    lines = s.split('\n')
+    if lines[-1] == _separator:
+        lines.pop()
+
+    headers: Dict[str, str] = {}
+    index = 0
+    while index < len(lines) and len(headers) < 2:
+        match = header_RE.match(lines[index])
+        if not match:
+            break
+        headers.setdefault(match.group(1), match.group(2))
+        index += 1
+    if 'from' not in headers or 'to' not in headers:
+        raise ValueError('Missing "from" or "to" header')
+
+    return Message('\n'.join(lines[index:]), headers['from'], [headers['to']])
 
-    to_result = header_to_RE.search(text)
-    if to_result:
-        to = [to_result.group(1)]
+
+def iter_messages_from_binary_file(
+    fp: BinaryIO,
+    use_mmap: bool = False
+) -> Iterator[Message]:
+    """
+    Parse a binary file containing any number of text messages, as written by
+    the file backend, and yield a Message object model for each of them.
+
+    The file is read one text message at a time, so memory usage doesn't
+    depend on the size of the file. If use_mmap is True, the file is memory
+    mapped and scanned for separators instead of being read line by line. This
+    requires fp to be a real file with a file descriptor.
+    """
+    if use_mmap:
+        yield from _iter_messages_from_mmap(fp)
+        return
+
+    lines: List[bytes] = []
+    for line in fp:
+        if line.rstrip(b'\r\n') == SEPARATOR:
+            yield message_from_bytes(b''.join(lines))
+            lines = []
+        else:
+            lines.append(line)
+    if any(line.strip() for line in lines):
+        yield message_from_bytes(b''.join(lines))
+
+
+def iter_messages_from_path(
+    path: str,
+    use_mmap: bool = False
+) -> Iterator[Message]:
+    """
+    Parse the file at the given path, as written by the file backend, and
+    yield a Message object model for each text message.
+
+    Gzipped files, such as rotated segments, are decompressed on the fly. They
+    are never memory mapped.
+    """
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as fp:
+            yield from iter_messages_from_binary_file(fp)  # type: ignore
     else:
-        raise ValueError
+        with open(path, 'rb') as fp:
+            yield from iter_messages_from_binary_file(fp, use_mmap=use_mmap)
+
 
-    return Message(body, from_phone, to)
+def _iter_messages_from_mmap(fp: BinaryIO) -> Iterator[Message]:
+    try:
+        mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # Empty files can't be mapped
+        return
+    with mapped:
+        view = memoryview(mapped)
+        try:
+            start = 0
+            position = 0
+            while True:
+                index = mapped.find(SEPARATOR, position)
+                if index == -1:
+                    break
+                end = index + len(SEPARATOR)
+                # Only a full line of dashes separates two text messages
+                if (
+                    (index == start or mapped[index - 1] == ord('\n'))
+                    and mapped[end:end + 1] in (b'\n', b'\r', b'')
+                ):
+                    yield message_from_string(
+                        str(view[start:index], 'ASCII', 'surrogateescape')
+                    )
+                    start = position = mapped.find(b'\n', end) + 1 or len(
+                        mapped
+                    )
+                else:
+                    position = end
+            if mapped[start:].strip():
+                yield message_from_string(
+                    str(view[start:], 'ASCII', 'surrogateescape')
+                )
+        finally:
+            view.release()
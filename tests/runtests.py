@@ -9,6 +9,7 @@ from django.conf import settings  # type: ignore
 
 settings.configure(
     DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3'}},
+    INSTALLED_APPS=['sms', 'sms.contrib.outbox'],
     SECRET_KEY="it's a secret to everyone",
     SMS_BACKEND='sms.backends.locmem.SmsBackend',
 )
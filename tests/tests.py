@@ -1,23 +1,106 @@
+import asyncio
+import json
 import os
+import queue
 import sys
 import shutil
+import socket
+import subprocess
 import tempfile
+import threading
+import time
 
-from typing import List, Type, Optional
+from contextlib import contextmanager
+from datetime import timedelta
+from http.client import RemoteDisconnected
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Type, Optional
 from io import StringIO
 
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
+from django.core.exceptions import ImproperlyConfigured  # type: ignore
 from django.dispatch import receiver  # type: ignore
-from django.test import SimpleTestCase, override_settings  # type: ignore
+from django.core.management import CommandError, call_command  # type: ignore
+from django.test import (  # type: ignore
+    SimpleTestCase, TestCase, override_settings
+)
+from django.utils import timezone  # type: ignore
 
 import sms
-from sms import send_sms
-from sms.backends import dummy, locmem, filebased
-from sms.backends.base import BaseSmsBackend
-from sms.message import Message
-from sms.signals import post_send
-from sms.utils import message_from_bytes, message_from_binary_file
+from sms import asend_sms, send_mass_sms, send_sms
+from sms import circuitbreaker, dedup, metrics, phonenumbers, pool
+from sms.backends import (
+    dummy, locmem, filebased, http, outbox, queued, router
+)
+from sms.backends.base import BaseSmsBackend, send_concurrently
+from sms.message import Message, TemplateMessage
+from sms.ratelimit import (
+    CacheTokenBucket, RateLimiter, TokenBucket, parse_rate
+)
+from sms.retry import RetryPolicy, is_retryable
+from sms.signals import post_send, pre_send
+from sms.template import Template, compile_template
+from sms.utils import (
+    iter_messages_from_binary_file, iter_messages_from_path,
+    message_from_bytes, message_from_binary_file
+)
+
+
+@contextmanager
+def unblock(event: threading.Event) -> Iterator[None]:
+    """Set the event when leaving the context, even on failure."""
+    try:
+        yield
+    finally:
+        event.set()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Record the requests to a stub HTTP API and respond with the status and
+    body returned by the respond callable of the server.
+    """
+    protocol_version = 'HTTP/1.1'
+    # Send the headers and body without waiting for the client's ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        server: Any = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with server.lock:
+            server.requests.append((self.path, self.headers, body))
+            server.connections.add(self.client_address)
+        time.sleep(server.latency)
+        status, response = server.respond(body)
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+@contextmanager
+def stub_server(respond: Any = None, latency: float = 0) -> Iterator[Any]:
+    """Run a stub HTTP API in a background thread."""
+    server: Any = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.url = f'http://127.0.0.1:{server.server_port}'
+    server.requests = []
+    server.connections = set()
+    server.respond = respond or (lambda body: (201, b'{}'))
+    server.latency = latency
+    server.lock = threading.Lock()
+    threading.Thread(
+        target=server.serve_forever, args=(0.01,), daemon=True
+    ).start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        pool.close_sessions()
 
 
 class BaseSmsBackendTests:
@@ -73,12 +156,52 @@ class SmsTests(SimpleTestCase):
             )
         self.assertIsInstance(sms.get_connection(), locmem.SmsBackend)
 
+    def test_backend_class_cache(self) -> None:
+        """
+        Make sure backend classes are only imported once per dotted path.
+        """
+        with patch('sms.import_string', wraps=sms.import_string) as mock:
+            backend = 'sms.backends.dummy.SmsBackend'
+            with override_settings(SMS_BACKEND=backend):
+                sms.get_connection()
+                sms.get_connection()
+                self.assertIsInstance(sms.get_connection(), dummy.SmsBackend)
+                self.assertEqual(mock.call_count, 1)
+            # Changing the setting clears the cache
+            self.assertIsInstance(sms.get_connection(), locmem.SmsBackend)
+            self.assertEqual(mock.call_count, 2)
+
+    def test_lazy_imports(self) -> None:
+        """
+        Make sure importing sms and the provider backends doesn't import the
+        backend machinery or the provider SDKs.
+        """
+        self.assertIs(sms.Message, Message)
+        self.assertIs(sms.BaseSmsBackend, BaseSmsBackend)
+        self.assertIn('Message', dir(sms))
+        with self.assertRaises(AttributeError):
+            sms.Unknown  # type: ignore
+
+        code = (
+            'import sys, sms; '
+            'print("sms.message" in sys.modules); '
+            'import sms.backends.twilio, sms.backends.messagebird; '
+            'print("twilio" in sys.modules or "messagebird" in sys.modules)'
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', code],
+            check=True,
+            capture_output=True,
+            text=True
+        ).stdout
+        self.assertEqual(output.split(), ['False', 'False'])
+
     def test_custom_backend(self) -> None:
         """Test cutoms backend defined in this suite."""
         connection = sms.get_connection('tests.custombackend.SmsBackend')
         self.assertTrue(hasattr(connection, 'test_outbox'))
         message = Message('Content', '0600000000', ['0600000000'])
-        connection.send_messages([message])  # type: ignore
+        connection.send_messages([message])
         self.assertEqual(len(connection.test_outbox), 1)  # type: ignore
 
     @override_settings(SMS_BACKEND='sms.backends.locmem.SmsBackend')
@@ -91,6 +214,147 @@ class SmsTests(SimpleTestCase):
         self.assertEqual(len(sms.outbox), 1)  # type: ignore
         self.assertIsInstance(sms.outbox[0].recipients, list)  # type: ignore
 
+    def test_message_slots(self) -> None:
+        """Make sure text messages don't have a __dict__."""
+        message = Message('Content', '0600000000', ['0600000001'])
+        self.assertFalse(hasattr(message, '__dict__'))
+        with self.assertRaises(AttributeError):
+            message.subject = 'Subject'  # type: ignore
+
+    def test_default_originator(self) -> None:
+        """Make sure the cached DEFAULT_FROM_SMS follows setting changes."""
+        with override_settings(DEFAULT_FROM_SMS='0600000000'):
+            self.assertEqual(Message().originator, '0600000000')
+            with override_settings(DEFAULT_FROM_SMS='0600000001'):
+                self.assertEqual(Message().originator, '0600000001')
+            self.assertEqual(Message().originator, '0600000000')
+            self.assertEqual(
+                Message(originator='0600000002').originator, '0600000002'
+            )
+
+    def test_message_bulk(self) -> None:
+        """
+        Make sure Message.bulk() creates text messages sharing the body and
+        originator, with tuples of up to size recipients.
+        """
+        numbers = (f'06000000{i:02d}' for i in range(5))
+        messages = Message.bulk('Content', '0600000000', numbers)
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(messages[4].recipients, ('0600000004',))
+        self.assertIs(messages[0].body, messages[4].body)
+        self.assertIs(messages[0].originator, messages[4].originator)
+        self.assertIsNone(messages[0].connection)
+
+        recipients = [f'06000000{i:02d}' for i in range(5)]
+        with override_settings(DEFAULT_FROM_SMS='0600000000'):
+            messages = Message.bulk('Content', recipients=recipients, size=2)
+        self.assertEqual(
+            [message.recipients for message in messages],
+            [
+                tuple(recipients[0:2]),
+                tuple(recipients[2:4]),
+                tuple(recipients[4:])
+            ]
+        )
+        self.assertEqual(messages[0].originator, '0600000000')
+
+        connection = sms.get_connection('tests.custombackend.SmsBackend')
+        self.assertEqual(connection.send_messages(messages), 3)
+        outbox = connection.test_outbox  # type: ignore
+        self.assertEqual(outbox[-1].recipients, (recipients[4],))
+
+        with self.assertRaises(TypeError):
+            Message.bulk('Content', recipients='0600000000')
+        with self.assertRaises(ValueError):
+            Message.bulk('Content', recipients=numbers, size=0)
+
+    def test_segments(self) -> None:
+        """
+        Make sure bodies are split in SMS segments according to their
+        encoding.
+        """
+        message = Message('a' * 160)
+        self.assertEqual(message.encoding, 'GSM-7')
+        self.assertEqual(message.segment_count, 1)
+        message.body = 'a' * 161
+        self.assertEqual(
+            [len(segment) for segment in message.segments], [153, 8]
+        )
+        # Extension characters take two septets and aren't split
+        message.body = '{' * 80
+        self.assertEqual(message.segment_count, 1)
+        message.body = 'a' * 152 + '€' + 'b' * 10
+        self.assertEqual(
+            [len(segment) for segment in message.segments], [152, 11]
+        )
+        # A single emoji switches the whole body to UCS-2
+        message.body = '\U0001F600' + 'a' * 68
+        self.assertEqual(message.encoding, 'UCS-2')
+        self.assertEqual(message.segment_count, 1)
+        message.body = 'a' * 66 + '\U0001F600' + 'b' * 10
+        self.assertEqual(message.segments, (
+            'a' * 66, '\U0001F600' + 'b' * 10
+        ))
+        message.body = '`'
+        self.assertEqual(message.encoding, 'UCS-2')
+        message.body = ''
+        self.assertEqual(message.segments, ('',))
+
+    def test_send_mass_sms(self) -> None:
+        """
+        Make sure send_mass_sms() consumes a generator in batches using a
+        single connection.
+        """
+        connection = sms.get_connection('tests.custombackend.SmsBackend')
+        datatuple = (
+            (f'Message {i}', '0600000000', '0600000001') for i in range(250)
+        )
+        with patch.object(
+            connection, 'send_messages', wraps=connection.send_messages
+        ) as send_messages:
+            count = send_mass_sms(
+                datatuple, connection=connection, batch_size=100
+            )
+        self.assertEqual(count, 250)
+        self.assertEqual(
+            [len(call.args[0]) for call in send_messages.call_args_list],
+            [100, 100, 50]
+        )
+        outbox = connection.test_outbox  # type: ignore
+        self.assertEqual(outbox[-1].body, 'Message 249')
+        self.assertEqual(outbox[-1].recipients, ['0600000001'])
+        self.assertIs(outbox[-1].connection, connection)
+
+    def test_send_mass_sms_file_session(self) -> None:
+        """Make sure send_mass_sms() writes all messages in one session."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            connection = sms.get_connection(
+                'sms.backends.filebased.SmsBackend',
+                file_path=tmp_dir
+            )
+            count = send_mass_sms(
+                [('Content', None, ['0600000000', '0600000001'])] * 3,
+                connection=connection,
+                batch_size=2
+            )
+            self.assertEqual(count, 6)
+            self.assertEqual(len(os.listdir(tmp_dir)), 1)
+            self.assertIsNone(connection.stream)  # type: ignore
+
+    def test_default_asend_messages(self) -> None:
+        """
+        Make sure the default asend_messages() falls back to send_messages().
+        """
+        connection = sms.get_connection('tests.custombackend.SmsBackend')
+        message = Message('Content', '0600000000', ['0600000000'])
+
+        async def send() -> int:
+            async with connection as conn:
+                return await conn.asend_messages([message])
+
+        self.assertEqual(asyncio.run(send()), 1)
+        self.assertEqual(connection.test_outbox, [message])  # type: ignore
+
 
 class LocmemBackendTests(BaseSmsBackendTests, SimpleTestCase):
     sms_backend: str = 'sms.backends.locmem.SmsBackend'
@@ -115,6 +379,15 @@ class LocmemBackendTests(BaseSmsBackendTests, SimpleTestCase):
             connection.send_messages([message])  # type: ignore
         self.assertEqual(len(sms.outbox), 2)  # type: ignore
 
+    async def test_asend_sms(self) -> None:
+        """Make sure many text messages can be sent concurrently."""
+        counts = await asyncio.gather(*(
+            asend_sms(f'Message {i}', '0600000000', '0600000000')
+            for i in range(100)
+        ))
+        self.assertEqual(sum(counts), 100)
+        self.assertEqual(len(sms.outbox), 100)  # type: ignore
+
 
 class ConsoleBackendTests(BaseSmsBackendTests, SimpleTestCase):
     sms_backend: str = 'sms.backends.console.SmsBackend'
@@ -129,10 +402,22 @@ class ConsoleBackendTests(BaseSmsBackendTests, SimpleTestCase):
             stream=stream
         )
         message = Message('Content', '0600000000', ['0600000000'])
-        connection.send_messages([message])  # type: ignore
+        connection.send_messages([message])
         messages = stream.getvalue().split('\n' + ('-' * 79) + '\n')
         self.assertIn('from: ', messages[0])
 
+    async def test_console_asend_messages(self) -> None:
+        stream = StringIO()
+        connection = sms.get_connection(
+            'sms.backends.console.SmsBackend',
+            stream=stream
+        )
+        message = Message('Content', '0600000000', ['0600000000'])
+        async with connection:
+            count = await connection.asend_messages([message])
+        self.assertEqual(count, 1)
+        self.assertIn('Content', stream.getvalue())
+
 
 class FileBasedBackendTests(BaseSmsBackendTests, SimpleTestCase):
     sms_backend = 'sms.backends.filebased.SmsBackend'
@@ -171,15 +456,483 @@ class FileBasedBackendTests(BaseSmsBackendTests, SimpleTestCase):
             ['+441134960000']
         )
         connection = sms.get_connection()
-        connection.send_messages([message])  # type: ignore
+        connection.send_messages([message])
 
         self.assertEqual(len(os.listdir(self.tmp_dir)), 1)
         tmp_file = os.path.join(self.tmp_dir, os.listdir(self.tmp_dir)[0])
         with open(tmp_file, 'rb') as fp:
             message = message_from_binary_file(fp)
+        self.assertEqual(message.body, 'Here is the message')
         self.assertEqual(message.originator, '+12065550100')
         self.assertEqual(message.recipients, ['+441134960000'])
 
+    async def test_asend(self) -> None:
+        message = Message(
+            'Here is the message',
+            '+12065550100',
+            ['+441134960000']
+        )
+        threads = []
+        send_messages = filebased.SmsBackend.send_messages
+
+        def record_thread(self, messages):
+            threads.append(threading.current_thread())
+            return send_messages(self, messages)
+
+        with patch.object(
+            filebased.SmsBackend, 'send_messages', record_thread
+        ):
+            self.assertEqual(await message.asend(), 1)
+        self.assertEqual(len(self.get_mailbox_content()), 1)
+        # Writing to the file doesn't block the event loop
+        self.assertNotEqual(threads, [threading.current_thread()])
+
+    def test_iter_messages_from_binary_file(self) -> None:
+        """Make sure all text messages in a file are parsed in order."""
+        messages = [
+            Message(
+                f'Message {i}\nto: +441134960000\n\n' + '-' * 10,
+                '+12065550100',
+                ['+441134960000', '+441134960999']
+            )
+            for i in range(50)
+        ]
+        connection = sms.get_connection()
+        connection.send_messages(messages)
+        tmp_file = os.path.join(self.tmp_dir, os.listdir(self.tmp_dir)[0])
+
+        for use_mmap in (False, True):
+            with self.subTest(use_mmap=use_mmap):
+                with open(tmp_file, 'rb') as fp:
+                    parsed = list(
+                        iter_messages_from_binary_file(fp, use_mmap=use_mmap)
+                    )
+                self.assertEqual(len(parsed), 100)
+                for i, message in enumerate(parsed):
+                    self.assertEqual(message.body, messages[i // 2].body)
+                    self.assertEqual(message.originator, '+12065550100')
+                    self.assertEqual(
+                        message.recipients,
+                        [messages[i // 2].recipients[i % 2]]
+                    )
+
+    def test_flush_policy(self) -> None:
+        """Make sure text messages are flushed according to the policy."""
+        messages = [
+            Message('Here is the message', '+12065550100', ['+441134960000'])
+            for i in range(3)
+        ]
+        for flush_policy, options, flushed in (
+            ('message', {}, True),
+            ('batch', {}, True),
+            ('bytes', {'flush_bytes': 1024 * 1024}, False),
+            ('bytes', {'flush_bytes': 1}, True),
+            ('interval', {'flush_interval': 60 * 1000}, False),
+        ):
+            with self.subTest(flush_policy=flush_policy, options=options):
+                self.flush_mailbox()
+                connection = sms.get_connection(
+                    flush_policy=flush_policy, **options  # type: ignore
+                )
+                with connection:
+                    connection.stream = MagicMock(  # type: ignore
+                        wraps=connection.stream  # type: ignore
+                    )
+                    connection.send_messages(messages)
+                    writes = connection.stream.write.call_count  # type: ignore
+                    self.assertEqual(
+                        writes, 3 if flush_policy == 'message' else 1
+                    )
+                    self.assertEqual(
+                        len(self.get_mailbox_content()), 3 if flushed else 0
+                    )
+                self.assertEqual(len(self.get_mailbox_content()), 3)
+
+    def test_flush_interval(self) -> None:
+        """
+        Make sure pending text messages are flushed once the interval has
+        passed, even if nothing else is sent.
+        """
+        message = Message('Content', '+12065550100', ['+441134960000'])
+        connection = sms.get_connection(
+            flush_policy='interval', flush_interval=200
+        )
+        with connection:
+            connection.send_messages([message])
+            connection.send_messages([message])
+            self.assertEqual(len(self.get_mailbox_content()), 0)
+            timer = connection._flush_timer  # type: ignore
+            timer.join(5)
+            self.assertEqual(len(self.get_mailbox_content()), 2)
+            self.assertIsNone(connection._flush_timer)  # type: ignore
+
+    def test_fsync(self) -> None:
+        message = Message('Content', '+12065550100', ['+441134960000'])
+        connection = sms.get_connection(flush_policy='batch', fsync=True)
+        with patch('os.fsync') as fsync:
+            connection.send_messages([message, message])
+        self.assertEqual(fsync.call_count, 1)
+
+    def test_rotation_by_size(self) -> None:
+        """
+        Make sure connections share a file that is rotated by size, and that
+        only the most recent segments in the directory are kept.
+        """
+        message = Message('Content', '+12065550100', ['+441134960000'])
+        size = len(filebased.SmsBackend().format_message(message)[0])
+        # The segments of processes that stopped writing to the directory
+        for pid in range(1, 6):
+            open(os.path.join(
+                self.tmp_dir, f'20000101-000000-{pid}-000001.log'
+            ), 'wb').close()
+        for i in range(10):
+            connection = sms.get_connection(
+                max_bytes=size * 3, backup_count=2
+            )
+            connection.send_messages([message])
+        self.addCleanup(filebased.close_rotating_files)
+        # The current segment and two rotated segments
+        filenames = sorted(os.listdir(self.tmp_dir))
+        self.assertEqual(len(filenames), 3)
+        self.assertFalse(filenames[0].startswith('20000101'))
+        self.assertEqual(len(self.get_mailbox_content()), 3 + 3 + 1)
+
+    def test_rotation_with_different_settings(self) -> None:
+        """
+        Make sure rotating files with different settings writing to the same
+        directory use different segments.
+        """
+        message = Message('Content', '+12065550100', ['+441134960000'])
+        self.addCleanup(filebased.close_rotating_files)
+        for flush_policy in ('bytes', 'message'):
+            connection = sms.get_connection(
+                max_bytes=1024 * 1024, flush_policy=flush_policy
+            )
+            with connection:
+                connection.send_messages([message])
+        filenames = os.listdir(self.tmp_dir)
+        self.assertEqual(len(filenames), 2)
+        self.assertEqual(len(self.get_mailbox_content()), 2)
+
+    def test_rotation_by_time(self) -> None:
+        """Make sure rotated segments are compressed."""
+        message = Message('Content', '+12065550100', ['+441134960000'])
+        connection = sms.get_connection(rotate_interval=60, compress=True)
+        self.addCleanup(filebased.close_rotating_files)
+        with patch('time.time', return_value=0):
+            connection.send_messages([message, message])
+        with patch('time.time', return_value=60):
+            connection.send_messages([message])
+        for thread in threading.enumerate():
+            if thread.name == 'sms-filebased-compress':
+                thread.join()
+
+        filenames = sorted(os.listdir(self.tmp_dir))
+        self.assertEqual(len(filenames), 2)
+        self.assertTrue(filenames[0].endswith('.log.gz'))
+        counts = [
+            len(list(iter_messages_from_path(
+                os.path.join(self.tmp_dir, filename)
+            )))
+            for filename in filenames
+        ]
+        self.assertEqual(counts, [2, 1])
+
+    def test_invalid_flush_policy(self) -> None:
+        with self.assertRaises(ImproperlyConfigured):
+            sms.get_connection(flush_policy='never')
+
+    def test_iter_messages_from_empty_file(self) -> None:
+        tmp_file = os.path.join(self.tmp_dir, 'empty.log')
+        open(tmp_file, 'wb').close()
+        for use_mmap in (False, True):
+            with open(tmp_file, 'rb') as fp:
+                self.assertEqual(
+                    list(iter_messages_from_binary_file(fp, use_mmap)), []
+                )
+
+
+class QueuedBackendTests(BaseSmsBackendTests, SimpleTestCase):
+    sms_backend = 'sms.backends.queued.SmsBackend'
+
+    def setUp(self) -> None:
+        super().setUp()
+        self._settings_override = override_settings(
+            SMS_QUEUED_BACKEND='sms.backends.locmem.SmsBackend'
+        )
+        self._settings_override.enable()
+
+    def tearDown(self) -> None:
+        queued.shutdown()
+        sms.outbox = []  # type: ignore
+        self._settings_override.disable()
+        super().tearDown()
+
+    def test_send_messages(self) -> None:
+        """Make sure queued text messages are sent by the wrapped backend."""
+        sent: List[Message] = []
+
+        def on_post_send(instance: Message, **kwargs) -> None:
+            sent.append(instance)
+
+        post_send.connect(on_post_send)
+        self.addCleanup(post_send.disconnect, on_post_send)
+
+        messages = [
+            Message(f'Message {i}', '+12065550100', ['+441134960000'])
+            for i in range(10)
+        ]
+        with sms.get_connection(workers=2, batch_size=3) as connection:
+            for message in messages:
+                message.connection = connection
+                self.assertEqual(message.send(), 1)
+        # Closing the connection flushes the queue
+        self.assertCountEqual(sms.outbox, messages)  # type: ignore
+        self.assertCountEqual(sent, messages)
+
+    def test_queue_policy(self) -> None:
+        """Make sure the queue policy is applied when the queue is full."""
+        event = threading.Event()
+        send_messages = locmem.SmsBackend.send_messages
+
+        def blocking_send_messages(self, messages):
+            event.wait()
+            return send_messages(self, messages)
+
+        message = Message('Content', '+12065550100', ['+441134960000'])
+        with patch.object(
+            locmem.SmsBackend, 'send_messages', blocking_send_messages
+        ), unblock(event):
+            connection = sms.get_connection(queue_size=1, policy='drop')
+            # The first message is taken by the worker, the second one is
+            # queued and the third one is dropped.
+            self.assertEqual(connection.send_messages([message]), 1)
+            while not connection.dispatcher.queue.empty():  # type: ignore
+                time.sleep(0.001)
+            self.assertEqual(
+                connection.send_messages([message, message]), 1
+            )
+            # The queue is shared by connections with the same configuration
+            connection = sms.get_connection(queue_size=1, policy='raise')
+            with self.assertRaises(queue.Full):
+                connection.send_messages([message])
+            connection.fail_silently = True
+            self.assertEqual(connection.send_messages([message]), 0)
+        queued.shutdown()
+        self.assertEqual(len(sms.outbox), 2)  # type: ignore
+
+    def test_invalid_configuration(self) -> None:
+        with self.assertRaises(ImproperlyConfigured):
+            sms.get_connection(policy='wait')
+        with override_settings(SMS_QUEUED_BACKEND=None):
+            with self.assertRaises(ImproperlyConfigured):
+                sms.get_connection()
+        with override_settings(SMS_QUEUED_BACKEND='sms.backends.unknown'):
+            with self.assertRaises(ImportError):
+                sms.get_connection()
+
+    def test_failing_open(self) -> None:
+        """
+        Make sure the workers keep draining the queue when opening their
+        connection fails.
+        """
+        message = Message('Content', '+12065550100', ['+441134960000'])
+        with patch.object(
+            locmem.SmsBackend, 'open', side_effect=OSError('Unreachable')
+        ), self.assertLogs('sms.backends.queued', 'ERROR'):
+            connection = sms.get_connection()
+            self.assertEqual(connection.send_messages([message]), 1)
+            connection.close()
+        self.assertEqual(sms.outbox, [message])  # type: ignore
+
+
+class RouterBackendTests(BaseSmsBackendTests, SimpleTestCase):
+    sms_backend = 'sms.backends.router.SmsBackend'
+
+    def setUp(self) -> None:
+        super().setUp()
+        self._settings_override = override_settings(SMS_ROUTER_BACKENDS=[
+            {
+                'name': 'us',
+                'backend': 'tests.custombackend.SmsBackend',
+                'prefixes': ['+1'],
+            },
+            {
+                'name': 'uk',
+                'backend': 'tests.custombackend.SmsBackend',
+                'prefixes': ['+44', '+441'],
+            },
+            {
+                'name': 'uk-leeds',
+                'backend': 'tests.custombackend.SmsBackend',
+                'prefixes': ['+44113'],
+            },
+            {
+                'name': 'default',
+                'backend': 'tests.custombackend.SmsBackend',
+            },
+        ])
+        self._settings_override.enable()
+
+    def tearDown(self) -> None:
+        router._route_states.clear()
+        circuitbreaker._circuit_breakers.clear()
+        self._settings_override.disable()
+        super().tearDown()
+
+    def get_outboxes(self, connection: BaseSmsBackend) -> Dict[str, Any]:
+        return {
+            route.name: [
+                recipient
+                for message in route.connection.test_outbox
+                for recipient in message.recipients
+            ]
+            for route in connection.routes  # type: ignore
+        }
+
+    def test_prefix_routing(self) -> None:
+        """Make sure recipients are routed by their longest prefix."""
+        message = Message('Content', '+12065550100', [
+            '+12065550101', '+442079460000', '+441134960000', '+31612345678'
+        ])
+        connection = sms.get_connection()
+        self.assertEqual(connection.send_messages([message]), 4)
+        self.assertEqual(self.get_outboxes(connection), {
+            'us': ['+12065550101'],
+            'uk': ['+442079460000'],
+            'uk-leeds': ['+441134960000'],
+            'default': ['+31612345678'],
+        })
+
+    @override_settings(SMS_ROUTER_BACKENDS=[
+        {
+            'name': 'benelux',
+            'backend': 'tests.custombackend.SmsBackend',
+            'countries': ['31', '32', '352'],
+        },
+        {'name': 'default', 'backend': 'tests.custombackend.SmsBackend'},
+    ])
+    def test_country_routing(self) -> None:
+        """Make sure recipients are routed by their country calling code."""
+        message = Message('Content', '+12065550100', [
+            '+31612345678', '+352621123456', '+35312345678'
+        ])
+        connection = sms.get_connection()
+        self.assertEqual(connection.send_messages([message]), 2)
+        self.assertEqual(self.get_outboxes(connection), {
+            'benelux': ['+31612345678', '+352621123456'],
+            'default': ['+35312345678'],
+        })
+
+    @override_settings(SMS_ROUTER_BACKENDS=[
+        {'name': 'a', 'backend': 'tests.custombackend.SmsBackend'},
+        {'name': 'b', 'backend': 'tests.custombackend.SmsBackend'},
+    ])
+    def test_failover(self) -> None:
+        """
+        Make sure recipients are sent using the next backend when a backend
+        fails, and that the failing backend is skipped afterwards.
+        """
+        message = Message('Content', '+12065550100', ['+12065550101'])
+        connection = sms.get_connection(strategy='latency')
+        route_a, route_b = connection.routes  # type: ignore
+        route_a.connection.send_messages = MagicMock(
+            side_effect=ConnectionError('Provider is down')
+        )
+        route_b.state.latency = 1
+        self.assertEqual(connection.send_messages([message]), 1)
+        self.assertEqual(route_a.connection.send_messages.call_count, 1)
+        self.assertEqual(self.get_outboxes(connection)['b'], ['+12065550101'])
+        self.assertFalse(route_a.breaker.allow())
+
+        # The failing route is skipped while cooling down
+        self.assertEqual(connection.send_messages([message]), 1)
+        self.assertEqual(route_a.connection.send_messages.call_count, 1)
+
+        # All routes failing
+        route_b.connection.send_messages = MagicMock(
+            side_effect=ConnectionError('Provider is down')
+        )
+        with self.assertRaisesMessage(ConnectionError, 'Provider is down'):
+            connection.send_messages([message])
+        connection.fail_silently = True
+        self.assertEqual(connection.send_messages([message]), 0)
+        self.assertEqual(len(connection.errors), 1)
+
+    @override_settings(SMS_ROUTER_BACKENDS=[
+        {'name': 'a', 'backend': 'tests.custombackend.SmsBackend'},
+        {'name': 'b', 'backend': 'tests.custombackend.SmsBackend'},
+    ])
+    def test_failover_failed_recipients(self) -> None:
+        """
+        Make sure only the failed recipients are sent again when the backend
+        reports them.
+        """
+        message = Message('Content', '+12065550100', ['+1', '+2', '+3'])
+        connection = sms.get_connection(strategy='latency')
+        route_a, route_b = connection.routes  # type: ignore
+        route_b.state.latency = 1
+        error = ConnectionError('Provider is down')
+
+        def send_messages(messages: List[Message]) -> int:
+            route_a.connection.errors = [(messages[0], '+2', error)]
+            raise error
+
+        route_a.connection.send_messages = send_messages
+        self.assertEqual(connection.send_messages([message]), 3)
+        self.assertEqual(self.get_outboxes(connection)['b'], ['+2'])
+
+    @override_settings(SMS_ROUTER_BACKENDS=[
+        {'name': 'a', 'backend': 'tests.custombackend.SmsBackend'},
+        {'name': 'b', 'backend': 'tests.custombackend.SmsBackend'},
+    ])
+    def test_no_failover_for_invalid_messages(self) -> None:
+        """
+        Make sure errors caused by the text message are reported without
+        trying the other routes.
+        """
+        message = Message('Content', '+12065550100', ['+1'])
+        connection = sms.get_connection(strategy='latency')
+        route_a, route_b = connection.routes  # type: ignore
+        route_b.state.latency = 1
+        for route in (route_a, route_b):
+            route.connection.send_messages = MagicMock(
+                side_effect=HttpError(400)
+            )
+        with self.assertRaises(HttpError):
+            connection.send_messages([message])
+        self.assertEqual(route_a.connection.send_messages.call_count, 1)
+        route_b.connection.send_messages.assert_not_called()
+        self.assertEqual(
+            [(m, recipient) for m, recipient, _ in connection.errors],
+            [(message, '+1')]
+        )
+        self.assertTrue(route_a.breaker.allow())
+
+    @override_settings(SMS_ROUTER_BACKENDS=[
+        {'name': 'a', 'backend': 'tests.custombackend.SmsBackend'},
+        {
+            'name': 'b',
+            'backend': 'tests.custombackend.SmsBackend',
+            'weight': 0,
+        },
+    ])
+    def test_weighted_strategy(self) -> None:
+        message = Message('Content', '+12065550100', ['+1', '+2', '+3'])
+        connection = sms.get_connection()
+        self.assertEqual(connection.send_messages([message]), 1)
+        self.assertEqual(
+            self.get_outboxes(connection),  # type: ignore
+            {'a': ['+1', '+2', '+3'], 'b': []}
+        )
+
+    def test_invalid_configuration(self) -> None:
+        with self.assertRaises(ImproperlyConfigured):
+            sms.get_connection(strategy='random')
+        with override_settings(SMS_ROUTER_BACKENDS=[]):
+            with self.assertRaises(ImproperlyConfigured):
+                sms.get_connection()
+
 
 class MessageBirdBackendTests(BaseSmsBackendTests, SimpleTestCase):
     sms_backend = 'sms.backends.messagebird.SmsBackend'
@@ -205,13 +958,92 @@ class MessageBirdBackendTests(BaseSmsBackendTests, SimpleTestCase):
 
         connection = sms.get_connection()
         connection.client.message_create = MagicMock()  # type: ignore
-        connection.send_messages([message])  # type: ignore
+        connection.send_messages([message])
         connection.client.message_create.assert_called_with(  # type: ignore
             '+12065550100',
             ['+441134960000'],
             'Here is the message'
         )
 
+    def test_send_messages_in_chunks(self) -> None:
+        """
+        Make sure text messages with the same originator and body are merged
+        and sent in chunks.
+        """
+        recipients = [f'+4411349600{i:02d}' for i in range(60)]
+        messages = [
+            Message('Here is the message', '+12065550100', recipients[:30]),
+            Message('Another message', '+12065550100', ['+441134960999']),
+            Message('Here is the message', '+12065550100', recipients[30:]),
+        ]
+
+        connection = sms.get_connection(max_recipients=25, max_workers=2)
+        connection.client.message_create = MagicMock()  # type: ignore
+        count = connection.send_messages(messages)
+        self.assertEqual(count, 61)
+        calls = connection.client.message_create.call_args_list  # type: ignore
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(
+            sorted(len(call.args[1]) for call in calls), [1, 10, 25, 25]
+        )
+        self.assertCountEqual(
+            [
+                recipient for call in calls
+                if call.args[2] == 'Here is the message'
+                for recipient in call.args[1]
+            ],
+            recipients
+        )
+
+    def test_send_messages_collects_errors(self) -> None:
+        """
+        Make sure a failing chunk doesn't abort the other chunks and that its
+        recipients aren't counted.
+        """
+        messages = [
+            Message('Here is the message', '+12065550100', ['+441134960000']),
+            Message('Invalid', '+12065550100', ['+1', '+2']),
+        ]
+        error = ValueError('Invalid message')
+
+        def message_create(originator, recipients, body):
+            if body == 'Invalid':
+                raise error
+
+        connection = sms.get_connection(fail_silently=True)
+        connection.client.message_create = MagicMock(  # type: ignore
+            side_effect=message_create
+        )
+        self.assertEqual(connection.send_messages(messages), 1)
+        self.assertEqual(
+            connection.errors,
+            [(messages[1], '+1', error), (messages[1], '+2', error)]
+        )
+        connection.fail_silently = False
+        with self.assertRaisesMessage(ValueError, 'Invalid message'):
+            connection.send_messages(messages)
+
+    def test_persistent_connections(self) -> None:
+        """
+        Make sure requests reuse the connections of the process-wide pool.
+        """
+        message = Message('Here is the message', '+12065550100', ['+1'])
+        response = b'{"id": "1", "recipients": {"items": []}}'
+        with stub_server(lambda body: (201, response)) as server, patch(
+            'messagebird.client.ENDPOINT', server.url
+        ):
+            for i in range(3):
+                sms.get_connection().send_messages([message])
+            with sms.get_connection() as connection:
+                self.assertIs(
+                    connection.http_client.session,  # type: ignore
+                    pool.get_session('messagebird', 10)
+                )
+                connection.send_messages([message, message])
+            self.assertIsNone(connection.http_client.session)  # type: ignore
+        self.assertEqual(len(server.requests), 4)
+        self.assertEqual(len(server.connections), 1)
+
 
 class TwilioBackendTests(BaseSmsBackendTests, SimpleTestCase):
     sms_backend = 'sms.backends.twilio.SmsBackend'
@@ -238,22 +1070,1503 @@ class TwilioBackendTests(BaseSmsBackendTests, SimpleTestCase):
 
         connection = sms.get_connection()
         connection.client.messages.create = MagicMock()  # type: ignore
-        connection.send_messages([message])  # type: ignore
+        connection.send_messages([message])
         connection.client.messages.create.assert_called_with(  # type: ignore
             to='+441134960000',
             from_='+12065550100',
             body='Here is the message'
         )
 
+    def test_send_messages_concurrently(self) -> None:
+        """Make sure recipients are sent using a pool of workers."""
+        recipients = [f'+4411349600{i:02d}' for i in range(20)]
+        message = Message('Here is the message', '+12065550100', recipients)
 
-class SignalTests(SimpleTestCase):
+        connection = sms.get_connection(max_workers=4)
+        self.assertEqual(connection.max_workers, 4)  # type: ignore
+        connection.client.messages.create = MagicMock()  # type: ignore
+        count = connection.send_messages([message])
+        self.assertEqual(count, 20)
+        create = connection.client.messages.create  # type: ignore
+        self.assertCountEqual(
+            [call.kwargs['to'] for call in create.call_args_list],
+            recipients
+        )
 
-    def flush_mailbox(self) -> None:
-        sms.outbox = []  # type: ignore
+    @override_settings(TWILIO_MAX_WORKERS=4)
+    def test_send_messages_collects_errors(self) -> None:
+        """
+        Make sure a failing recipient doesn't abort the other recipients.
+        """
+        recipients = ['+441134960000', '+441134960001', '+441134960002']
+        message = Message('Here is the message', '+12065550100', recipients)
+        error = ValueError('Invalid recipient')
 
-    def tearDown(self) -> None:
-        super().tearDown()
-        self.flush_mailbox()
+        def create(to, **kwargs):
+            if to == '+441134960001':
+                raise error
+
+        connection = sms.get_connection()
+        connection.client.messages.create = MagicMock(  # type: ignore
+            side_effect=create
+        )
+        with self.assertRaisesMessage(ValueError, 'Invalid recipient'):
+            connection.send_messages([message])
+        self.assertEqual(
+            connection.client.messages.create.call_count, 3  # type: ignore
+        )
+
+        connection.fail_silently = True
+        count = connection.send_messages([message])
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            connection.errors,
+            [(message, '+441134960001', error)]
+        )
+
+    def test_pooled_session(self) -> None:
+        """
+        Make sure an opened connection holds on to the process-wide session
+        until it's closed.
+        """
+        self.addCleanup(pool.close_sessions)
+        connection = sms.get_connection(pool_size=4, timeout=5)
+        http_client = connection.client.http_client  # type: ignore
+        self.assertEqual(http_client.timeout, 5)
+        self.assertIsNone(http_client.session)
+        with connection:
+            session = http_client.session
+            self.assertIs(session, pool.get_session('twilio', 4))
+            self.assertIs(
+                session.get_adapter('https://api.twilio.com')._pool_maxsize, 4
+            )
+        self.assertIsNone(http_client.session)
+        with sms.get_connection(pool_size=4) as other:
+            self.assertIs(
+                other.client.http_client.session, session  # type: ignore
+            )
+
+    def test_invalid_max_workers(self) -> None:
+        with self.assertRaises(ImproperlyConfigured):
+            sms.get_connection(max_workers=0)
+
+
+class HttpBackendTests(BaseSmsBackendTests, SimpleTestCase):
+    sms_backend = 'sms.backends.http.SmsBackend'
+
+    def test_send_messages(self) -> None:
+        """
+        Make sure recipients are merged, chunked and sent over a single
+        persistent connection.
+        """
+        messages = [
+            Message('Here is the message', '+12065550100', ['+1', '+2']),
+            Message('Another message', '+12065550100', ['+3']),
+            Message('Here is the message', '+12065550100', ['+4']),
+        ]
+        with stub_server() as server:
+            connection = sms.get_connection(
+                url=f'{server.url}/messages?version=1', max_recipients=2
+            )
+            self.assertEqual(connection.send_messages(messages), 4)
+            self.assertEqual(connection.send_messages(messages[1:2]), 1)
+        self.assertEqual(len(server.connections), 1)
+        self.assertEqual(
+            [
+                (path, json.loads(body)['recipients'])
+                for path, _, body in server.requests
+            ],
+            [
+                ('/messages?version=1', ['+1', '+2']),
+                ('/messages?version=1', ['+4']),
+                ('/messages?version=1', ['+3']),
+                ('/messages?version=1', ['+3']),
+            ]
+        )
+
+    def test_send_messages_concurrently(self) -> None:
+        recipients = [f'+4411349600{i:02d}' for i in range(8)]
+        message = Message('Here is the message', '+12065550100', recipients)
+        with stub_server(latency=0.05) as server:
+            connection = sms.get_connection(url=server.url, max_workers=8)
+            started = time.monotonic()
+            self.assertEqual(connection.send_messages([message]), 8)
+            self.assertLess(time.monotonic() - started, 0.3)
+        self.assertGreater(len(server.connections), 1)
+
+    def test_send_messages_collects_errors(self) -> None:
+        messages = [
+            Message('Here is the message', '+12065550100', ['+1']),
+            Message('Invalid', '+12065550100', ['+2']),
+        ]
+
+        def respond(body: bytes) -> Any:
+            if json.loads(body)['body'] == 'Invalid':
+                return 400, b'{"error": "Invalid message"}'
+            return 201, b'{}'
+
+        with stub_server(respond) as server:
+            connection = sms.get_connection(url=server.url)
+            with self.assertRaisesMessage(http.HttpError, 'Invalid message'):
+                connection.send_messages(messages)
+            connection.fail_silently = True
+            self.assertEqual(connection.send_messages(messages), 1)
+        self.assertEqual(connection.errors[0][:2], (messages[1], '+2'))
+        self.assertEqual(connection.errors[0][2].status, 400)  # type: ignore
+
+    def test_missing_url(self) -> None:
+        with self.assertRaises(ImproperlyConfigured):
+            sms.get_connection()
+
+    def test_stale_connection(self) -> None:
+        """
+        Make sure a request on an idle connection closed by the server is
+        only sent again if the server didn't handle it.
+        """
+        connection_pool = pool.ConnectionPool('http://localhost')
+        for exc in (BrokenPipeError(), RemoteDisconnected('')):
+            stale, fresh = MagicMock(), MagicMock()
+            if isinstance(exc, BrokenPipeError):
+                stale.request.side_effect = exc
+            else:
+                stale.getresponse.side_effect = exc
+            fresh.getresponse.return_value.status = 201
+            fresh.getresponse.return_value.read.return_value = b'{}'
+            connection_pool.idle.append(stale)
+            with patch.object(connection_pool, 'connect', return_value=fresh):
+                self.assertEqual(
+                    connection_pool.request('POST', '/', b'{}'), (201, b'{}')
+                )
+            stale.close.assert_called_once_with()
+            fresh.request.assert_called_once_with('POST', '/', b'{}', {})
+
+        stale = MagicMock()
+        stale.getresponse.side_effect = ConnectionResetError()
+        connection_pool.idle.clear()
+        connection_pool.idle.append(stale)
+        with patch.object(connection_pool, 'connect') as connect:
+            with self.assertRaises(ConnectionResetError):
+                connection_pool.request('POST', '/', b'{}')
+        connect.assert_not_called()
+        stale.close.assert_called_once_with()
+
+    @override_settings(
+        TWILIO_ACCOUNT_SID='fake_account_sid',
+        TWILIO_AUTH_TOKEN='fake_auth_token',
+    )
+    def test_twilio(self) -> None:
+        message = Message('Here is the message', '+12065550100', ['+1', '+2'])
+        connection = sms.get_connection('sms.backends.http.TwilioSmsBackend')
+        self.assertEqual(
+            connection.url,  # type: ignore
+            'https://api.twilio.com/2010-04-01/Accounts/fake_account_sid/'
+            'Messages.json'
+        )
+        with stub_server() as server, override_settings(
+            TWILIO_URL=f'{server.url}/Messages.json'
+        ):
+            connection = sms.get_connection(
+                'sms.backends.http.TwilioSmsBackend'
+            )
+            self.assertEqual(connection.send_messages([message]), 2)
+        path, headers, body = server.requests[0]
+        self.assertEqual(path, '/Messages.json')
+        self.assertEqual(
+            headers['Authorization'],
+            'Basic ZmFrZV9hY2NvdW50X3NpZDpmYWtlX2F1dGhfdG9rZW4='
+        )
+        self.assertEqual(
+            sorted(body for _, _, body in server.requests),
+            [
+                b'To=%2B1&From=%2B12065550100&Body=Here+is+the+message',
+                b'To=%2B2&From=%2B12065550100&Body=Here+is+the+message',
+            ]
+        )
+
+    @override_settings(MESSAGEBIRD_ACCESS_KEY='fake_access_key')
+    def test_messagebird(self) -> None:
+        recipients = [f'+4411349600{i:02d}' for i in range(60)]
+        message = Message('Here is the message', '+12065550100', recipients)
+        with stub_server() as server:
+            connection = sms.get_connection(
+                'sms.backends.http.MessageBirdSmsBackend', url=server.url
+            )
+            self.assertEqual(connection.send_messages([message]), 60)
+        self.assertEqual(
+            [len(json.loads(body)['recipients'])
+             for _, _, body in server.requests],
+            [50, 10]
+        )
+        headers = server.requests[0][1]
+        self.assertEqual(headers['Authorization'], 'AccessKey fake_access_key')
+
+
+class RateLimitTests(SimpleTestCase):
+
+    def test_parse_rate(self) -> None:
+        self.assertEqual(parse_rate('10/s'), 10)
+        self.assertEqual(parse_rate('120/minute'), 2)
+        self.assertEqual(parse_rate('3600/h'), 1)
+        self.assertEqual(parse_rate(5), 5)
+        for rate in ('10', '10/week', '0/s', 'ten/s'):
+            with self.assertRaises(ImproperlyConfigured):
+                parse_rate(rate)
+
+    def test_token_bucket(self) -> None:
+        """Make sure reservations are paced one after another."""
+        bucket = TokenBucket(10, burst=2)
+        with patch('time.monotonic', return_value=bucket.updated):
+            delays = [bucket.reserve() for i in range(4)]
+        self.assertEqual(delays, [0, 0, 0.1, 0.2])
+
+    def test_cache_token_bucket(self) -> None:
+        """
+        Make sure reservations are spread over the window and move to the next
+        window once it is full.
+        """
+        bucket = CacheTokenBucket(4, key='test_cache_token_bucket')
+        with patch('time.time', return_value=1000.0):
+            delays = [bucket.reserve() for i in range(6)]
+        self.assertEqual(delays, [0, 0.25, 0.5, 0.75, 1, 1.25])
+
+    def test_rate_limiter(self) -> None:
+        """
+        Make sure the global, originator and prefix rates are all applied.
+        """
+        limiter = RateLimiter({
+            'rate': '1000/s',
+            'per_originator': '10/s',
+            'per_prefix': {'+44': '2/s', '+441134': '1/s'},
+        })
+        self.assertEqual(limiter.reserve('A', ['+441134960000']), 0)
+        # Limited by the '+441134' prefix rate
+        self.assertAlmostEqual(
+            limiter.reserve('B', ['+441134960001']), 1, places=2
+        )
+        self.assertAlmostEqual(
+            limiter.reserve('C', ['+442079460000']), 0, places=2
+        )
+        # Limited by the originator rate
+        self.assertAlmostEqual(
+            limiter.reserve('B', ['+12065550100', '+12065550101']),
+            0.2,
+            places=2
+        )
+
+    def test_per_country(self) -> None:
+        """Make sure each country calling code has a rate of its own."""
+        limiter = RateLimiter({'per_country': '1/s'})
+        self.assertEqual(limiter.reserve('A', ['+31612345678']), 0)
+        self.assertEqual(limiter.reserve('A', ['+32470123456']), 0)
+        self.assertAlmostEqual(
+            limiter.reserve('A', ['+31612345679']), 1, places=2
+        )
+
+    def test_unknown_option(self) -> None:
+        with self.assertRaises(ImproperlyConfigured):
+            RateLimiter({'rates': '10/s'})
+
+    def test_backend_rate_limit(self) -> None:
+        """
+        Make sure backends apply the rate limit configured for them, sending
+        the recipients in chunks of the burst size.
+        """
+        message = Message('Content', '0600000000', ['1', '2', '3', '4', '5'])
+        with override_settings(SMS_RATE_LIMITS={
+            'tests.custombackend.SmsBackend': {'rate': '1/s', 'burst': 2},
+        }):
+            connection = sms.get_connection('tests.custombackend.SmsBackend')
+            other = sms.get_connection('sms.backends.dummy.SmsBackend')
+        self.assertIsNotNone(connection.rate_limiter)
+        self.assertIsNone(other.rate_limiter)  # type: ignore
+
+        with patch('time.sleep') as sleep:
+            self.assertEqual(connection.send_messages([message]), 3)
+        outbox = connection.test_outbox  # type: ignore
+        self.assertEqual(
+            [chunk.recipients for chunk in outbox],
+            [['1', '2'], ['3', '4'], ['5']]
+        )
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(message.recipients, ['1', '2', '3', '4', '5'])
+
+    def test_rate_limit_per_segment(self) -> None:
+        """Make sure rate limits per segment charge each SMS segment."""
+        connection = sms.get_connection(
+            'tests.custombackend.SmsBackend',
+            rate_limit={'rate': '10/s', 'burst': 2, 'per_segment': True}
+        )
+        message = Message('a' * 161, '0600000000', ['1', '2'])
+        with patch.object(
+            connection.rate_limiter, 'acquire'
+        ) as acquire:
+            connection.send_messages([message])
+        acquire.assert_called_once_with('0600000000', ['1', '2'], 2)
+
+
+class HttpError(Exception):
+    def __init__(self, status: int) -> None:
+        super().__init__(f'HTTP {status}')
+        self.status = status
+
+
+class RetryTests(SimpleTestCase):
+
+    def test_is_retryable(self) -> None:
+        self.assertTrue(is_retryable(HttpError(429)))
+        self.assertTrue(is_retryable(HttpError(503)))
+        self.assertTrue(is_retryable(ConnectionResetError()))
+        self.assertTrue(is_retryable(TimeoutError()))
+        self.assertFalse(is_retryable(HttpError(400)))
+        self.assertFalse(is_retryable(ValueError()))
+
+    def test_get_delay(self) -> None:
+        policy = RetryPolicy(
+            max_attempts=4, backoff=1, max_backoff=3, jitter=False
+        )
+        error = HttpError(500)
+        self.assertEqual(
+            [policy.get_delay(error, attempt) for attempt in range(1, 5)],
+            [1, 2, 3, None]
+        )
+        self.assertIsNone(policy.get_delay(HttpError(404), 1))
+        policy = RetryPolicy(backoff=1, deadline=1.5, jitter=False)
+        self.assertEqual(policy.get_delay(error, 1, elapsed=0.5), 1)
+        self.assertIsNone(policy.get_delay(error, 1, elapsed=1))
+        policy = RetryPolicy(backoff=1)
+        for i in range(10):
+            delay = policy.get_delay(error, 1)
+            self.assertIsNotNone(delay)
+            self.assertTrue(0 <= delay <= 1)  # type: ignore
+
+    def test_call(self) -> None:
+        func = MagicMock(side_effect=[HttpError(503), HttpError(503), 'sent'])
+        policy = RetryPolicy(backoff=0.001)
+        self.assertEqual(policy.call(func, 'a', b='c'), 'sent')
+        self.assertEqual(func.call_count, 3)
+        func = MagicMock(side_effect=HttpError(400))
+        with self.assertRaises(HttpError):
+            policy.call(func)
+        self.assertEqual(func.call_count, 1)
+
+    def test_send_concurrently(self) -> None:
+        """
+        Make sure tasks waiting to be retried don't hold up the other tasks.
+        """
+        for max_workers in (1, 2):
+            with self.subTest(max_workers=max_workers):
+                calls: List[str] = []
+                failures = {'A': 2, 'B': 0, 'C': 5, 'D': 0}
+
+                def send(name: str) -> None:
+                    calls.append(name)
+                    if failures[name]:
+                        failures[name] -= 1
+                        raise HttpError(503)
+
+                errors = send_concurrently(
+                    send,
+                    [('A',), ('B',), ('C',), ('D',)],
+                    max_workers,
+                    RetryPolicy(max_attempts=3, backoff=0.05, jitter=False)
+                )
+                self.assertEqual([task for task, _ in errors], [('C',)])
+                self.assertEqual(calls.count('A'), 3)
+                self.assertEqual(calls.count('C'), 3)
+                self.assertEqual(set(calls[:4]), {'A', 'B', 'C', 'D'})
+
+    def test_backend_retry_policy(self) -> None:
+        message = Message(
+            'Here is the message', '+12065550100', ['+441134960000']
+        )
+        with override_settings(
+            TWILIO_ACCOUNT_SID='fake_account_sid',
+            TWILIO_AUTH_TOKEN='fake_auth_token',
+            SMS_RETRY_POLICIES={
+                'sms.backends.twilio.SmsBackend': {'backoff': 0.001}
+            },
+        ):
+            connection = sms.get_connection('sms.backends.twilio.SmsBackend')
+        self.assertEqual(
+            connection.retry_policy.backoff, 0.001  # type: ignore
+        )
+        connection.client.messages.create = MagicMock(  # type: ignore
+            side_effect=[HttpError(429), None]
+        )
+        self.assertEqual(connection.send_messages([message]), 1)
+
+
+class FailingBackend(BaseSmsBackend):
+    """A backend raising the exception of the class, if any."""
+    exception: Optional[Exception] = None
+
+    def send_messages(self, messages: List[Message]) -> int:
+        if self.exception is not None:
+            raise self.exception
+        return len(messages)
+
+
+@override_settings(SMS_CIRCUIT_BREAKERS={
+    'tests.tests.FailingBackend': {
+        'failure_rate': 0.5, 'min_calls': 4, 'cooldown': 10
+    },
+})
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.message = Message('Content', '+12065550100', ['+12065550101'])
+
+    def tearDown(self) -> None:
+        FailingBackend.exception = None
+        circuitbreaker._circuit_breakers.clear()
+        sms.outbox = []  # type: ignore
+
+    def test_states(self) -> None:
+        breaker = circuitbreaker.CircuitBreaker(
+            failure_rate=0.5, min_calls=4, window=60, cooldown=10
+        )
+        with patch('time.monotonic', return_value=100):
+            for failed in (True, False, False):
+                breaker.record(failed)
+            self.assertEqual(breaker.state, circuitbreaker.CLOSED)
+            breaker.record(True)
+            self.assertEqual(breaker.state, circuitbreaker.OPEN)
+            self.assertFalse(breaker.allow())
+        with patch('time.monotonic', return_value=110):
+            self.assertEqual(breaker.state, circuitbreaker.HALF_OPEN)
+            breaker.record(True)
+            self.assertEqual(breaker.state, circuitbreaker.OPEN)
+        with patch('time.monotonic', return_value=120):
+            self.assertTrue(breaker.available())
+            self.assertTrue(breaker.allow())
+            # A single trial call is allowed while half-open
+            self.assertFalse(breaker.available())
+            self.assertFalse(breaker.allow())
+        with patch('time.monotonic', return_value=130):
+            # The trial call never recorded its outcome
+            self.assertTrue(breaker.allow())
+            breaker.record(False)
+            self.assertEqual(breaker.state, circuitbreaker.CLOSED)
+            self.assertTrue(breaker.allow())
+
+        # Calls outside the window are forgotten
+        with patch('time.monotonic', return_value=200):
+            for failed in (True, True, True):
+                breaker.record(failed)
+        with patch('time.monotonic', return_value=300):
+            breaker.record(True)
+        self.assertEqual(breaker.state, circuitbreaker.CLOSED)
+
+    def test_fail_fast(self) -> None:
+        """
+        Make sure an open circuit stops sending text messages using the
+        backend until the cooldown has passed.
+        """
+        connection = sms.get_connection('tests.tests.FailingBackend')
+        FailingBackend.exception = ConnectionError('Provider is down')
+        for i in range(4):
+            with self.assertRaises(ConnectionError):
+                connection.send_messages([self.message])
+
+        FailingBackend.exception = None
+        with self.assertRaises(circuitbreaker.CircuitOpenError):
+            connection.send_messages([self.message])
+        connection.fail_silently = True
+        self.assertEqual(connection.send_messages([self.message]), 0)
+        self.assertEqual(
+            [recipient for _, recipient, _ in connection.errors],
+            self.message.recipients
+        )
+        self.assertIsInstance(
+            connection.errors[0][2], circuitbreaker.CircuitOpenError
+        )
+
+        # Another connection shares the same circuit
+        other = sms.get_connection('tests.tests.FailingBackend')
+        self.assertFalse(other.circuit_breaker.allow())  # type: ignore
+        with patch('time.monotonic', return_value=time.monotonic() + 10):
+            self.assertEqual(other.send_messages([self.message]), 1)
+        self.assertTrue(other.circuit_breaker.allow())  # type: ignore
+
+    def test_non_retryable_errors(self) -> None:
+        """
+        Make sure errors caused by the text messages don't open the circuit.
+        """
+        connection = sms.get_connection('tests.tests.FailingBackend')
+        FailingBackend.exception = HttpError(400)
+        for i in range(10):
+            with self.assertRaises(HttpError):
+                connection.send_messages([self.message])
+        self.assertTrue(connection.circuit_breaker.allow())  # type: ignore
+
+    def test_fallback(self) -> None:
+        connection = sms.get_connection(
+            'tests.tests.FailingBackend',
+            circuit_breaker={
+                'min_calls': 1,
+                'fallback': 'sms.backends.locmem.SmsBackend',
+            }
+        )
+        FailingBackend.exception = HttpError(503)
+        with self.assertRaises(HttpError):
+            connection.send_messages([self.message])
+        self.assertEqual(connection.send_messages([self.message]), 1)
+        self.assertEqual(len(sms.outbox), 1)  # type: ignore
+
+    def test_reported_errors(self) -> None:
+        """
+        Make sure failed recipients reported in the errors attribute of a
+        backend count as a failure.
+        """
+        with override_settings(
+            TWILIO_ACCOUNT_SID='fake_account_sid',
+            TWILIO_AUTH_TOKEN='fake_auth_token',
+        ):
+            connection = sms.get_connection(
+                'sms.backends.twilio.SmsBackend',
+                fail_silently=True,
+                circuit_breaker={'min_calls': 1},
+            )
+        connection.client.messages.create = MagicMock(  # type: ignore
+            side_effect=HttpError(500)
+        )
+        self.assertEqual(connection.send_messages([self.message]), 0)
+        self.assertFalse(connection.circuit_breaker.allow())  # type: ignore
+
+
+@override_settings(SMS_DEDUPLICATION={
+    'sms.backends.locmem.SmsBackend': {'ttl': 60},
+    'tests.tests.FailingBackend': {'ttl': 60},
+})
+class DeduplicationTests(SimpleTestCase):
+
+    def tearDown(self) -> None:
+        FailingBackend.exception = None
+        dedup._deduplicators.clear()
+        sms.outbox = []  # type: ignore
+
+    def test_normalize(self) -> None:
+        self.assertEqual(dedup.normalize('+31 6 1234-5678'), '+31612345678')
+        self.assertEqual(dedup.normalize('0031 (6) 12.34.56.78'),
+                         '+31612345678')
+        self.assertEqual(dedup.normalize('0612345678'), '0612345678')
+
+    def test_locmem_store(self) -> None:
+        """Make sure keys expire after the ttl and the store is bounded."""
+        store = dedup.LocMemStore(max_size=3)
+        with patch('time.monotonic', return_value=100):
+            self.assertEqual(
+                store.add_many(['a', 'b', 'a'], 10), [True, True, False]
+            )
+        with patch('time.monotonic', return_value=105):
+            self.assertEqual(store.add_many(['a', 'c'], 10), [False, True])
+        with patch('time.monotonic', return_value=110):
+            self.assertEqual(store.add_many(['a', 'c'], 10), [True, False])
+            self.assertEqual(store.add_many(['d', 'e'], 10), [True, True])
+            self.assertEqual(list(store.keys), ['a', 'd', 'e'])
+            store.delete_many(['d'])
+            self.assertEqual(store.add_many(['d'], 10), [True])
+
+    def test_duplicate_recipients(self) -> None:
+        """
+        Make sure duplicate recipients of a text message are dropped after
+        normalizing them, and reported in the duplicates attribute.
+        """
+        message = Message('Content', '+12065550100', [
+            '+31 6 1234 5678', '+31612345679', '0031612345678', '+31612345679'
+        ])
+        connection = sms.get_connection(
+            'sms.backends.locmem.SmsBackend', deduplicate={'ttl': 0}
+        )
+        self.assertEqual(connection.send_messages([message]), 1)
+        self.assertEqual(
+            sms.outbox[0].recipients,  # type: ignore
+            ['+31612345678', '+31612345679']
+        )
+        self.assertEqual(connection.duplicates, [
+            (message, '0031612345678'), (message, '+31612345679')
+        ])
+        self.assertEqual(
+            message.recipients[0], '+31 6 1234 5678',
+            'The original text message must not be changed.'
+        )
+        # Without a ttl, the same text message can be sent again
+        self.assertEqual(connection.send_messages([message]), 1)
+
+    def test_ttl(self) -> None:
+        """
+        Make sure the same text message to the same recipient is suppressed
+        within the ttl, shared by all connections of the backend.
+        """
+        send_sms('Content', '+12065550100', ['+31612345678'])
+        message = Message('Content', '+12065550100', [
+            '+31612345678', '+31612345679'
+        ])
+        connection = sms.get_connection()
+        self.assertEqual(connection.send_messages([message]), 1)
+        self.assertEqual(connection.duplicates, [(message, '+31612345678')])
+        self.assertEqual(connection.send_messages([message]), 0)
+        self.assertEqual(len(sms.outbox), 2)  # type: ignore
+        # A different body or originator isn't a duplicate
+        send_sms('Other content', '+12065550100', ['+31612345678'])
+        send_sms('Content', '+12065550101', ['+31612345678'])
+        self.assertEqual(len(sms.outbox), 4)  # type: ignore
+
+    def test_cache(self) -> None:
+        """Make sure the text messages can be remembered in a Django cache."""
+        config = {'ttl': 60, 'cache': 'default'}
+        message = Message('Content', '+12065550100', ['+31612345678'])
+        for i in range(2):
+            connection = sms.get_connection(
+                'sms.backends.locmem.SmsBackend', deduplicate=config
+            )
+            self.assertIsInstance(
+                connection.deduplicator.store,  # type: ignore
+                dedup.CacheStore
+            )
+            dedup._deduplicators.clear()
+            self.assertEqual(connection.send_messages([message]), 1 - i)
+        connection.deduplicator.store.cache.clear()  # type: ignore
+
+    def test_failed_recipients_forgotten(self) -> None:
+        """
+        Make sure recipients that failed to send aren't suppressed when they
+        are sent again.
+        """
+        message = Message('Content', '+12065550100', ['+31612345678'])
+        connection = sms.get_connection('tests.tests.FailingBackend')
+        FailingBackend.exception = ConnectionError()
+        with self.assertRaises(ConnectionError):
+            connection.send_messages([message])
+        FailingBackend.exception = None
+        self.assertEqual(connection.send_messages([message]), 1)
+        self.assertEqual(connection.send_messages([message]), 0)
+
+    def test_post_send(self) -> None:
+        """Make sure post_send reports the dropped recipients."""
+        calls: List[Dict[str, Any]] = []
+
+        def handler(**kwargs: Any) -> None:
+            calls.append(kwargs)
+
+        post_send.connect(handler)
+        try:
+            send_sms('Content', '+12065550100', ['+31612345678'] * 2)
+        finally:
+            post_send.disconnect(handler)
+        self.assertEqual(calls[0]['sent'], 1)
+        self.assertEqual(calls[0]['duplicates'], ['+31612345678'])
+
+    def test_invalid_config(self) -> None:
+        with self.assertRaises(ImproperlyConfigured):
+            dedup.Deduplicator({'window': 60})
+        with self.assertRaises(ImproperlyConfigured):
+            dedup.Deduplicator({'ttl': -1})
+
+
+class PhoneNumberTests(SimpleTestCase):
+
+    def test_clean(self) -> None:
+        self.assertEqual(
+            phonenumbers.clean('0031 (6) 12.34.56.78'), '+31612345678'
+        )
+        self.assertEqual(phonenumbers.clean('06-12345678'), '0612345678')
+        self.assertEqual(phonenumbers.clean('+1 invalid'), '+1invalid')
+
+    def test_parse(self) -> None:
+        self.assertEqual(
+            phonenumbers.parse('+31 (0)6 1234-5678'),
+            ('+31612345678', '31', '612345678')
+        )
+        self.assertEqual(
+            phonenumbers.normalize('0044 20 7946 0000'), '+442079460000'
+        )
+        self.assertEqual(
+            phonenumbers.normalize('06 12345678', '31'), '+31612345678'
+        )
+        self.assertEqual(
+            phonenumbers.normalize('(206) 555-0100', '1'), '+12065550100'
+        )
+        # The leading zero of Italian numbers is part of the number
+        self.assertEqual(
+            phonenumbers.normalize('06 1234 5678', '39'), '+390612345678'
+        )
+        for number, reason in (
+            ('0612345678', 'missing country calling code'),
+            ('+31 6 1234 567x', 'not a number'),
+            ('+1234567890123456', 'too long'),
+            ('+999 123456', 'unknown country calling code'),
+            ('+31 6 1234567', 'invalid length for country calling code +31'),
+        ):
+            with self.assertRaisesMessage(
+                phonenumbers.InvalidPhoneNumber, reason
+            ):
+                phonenumbers.parse(number)
+
+    def test_calling_codes(self) -> None:
+        """Make sure no calling code is a prefix of another one."""
+        for code in phonenumbers.CALLING_CODES:
+            for other in phonenumbers.CALLING_CODES:
+                if code != other:
+                    self.assertFalse(other.startswith(code), other)
+
+    def test_normalize_many(self) -> None:
+        valid, invalid = phonenumbers.normalize_many([
+            '+31612345678', '06 12345679', '+3161234567', '+44 113 496 0000'
+        ], '31')
+        self.assertEqual(
+            valid, ['+31612345678', '+31612345679', '+441134960000']
+        )
+        self.assertEqual([number for number, _ in invalid], ['+3161234567'])
+        self.assertIsInstance(invalid[0][1], phonenumbers.InvalidPhoneNumber)
+
+    def test_country_code(self) -> None:
+        self.assertEqual(phonenumbers.country_code('+12065550100'), '1')
+        self.assertEqual(phonenumbers.country_code('+35312345678'), '353')
+        self.assertIsNone(phonenumbers.country_code('0612345678'))
+
+    @override_settings(SMS_DEFAULT_COUNTRY_CODE='31')
+    def test_message_validate(self) -> None:
+        message = Message('Content', recipients=['0612345678', '+32470123456'])
+        message.validate()
+        self.assertEqual(message.recipients, ['+31612345678', '+32470123456'])
+        message = Message('Content', recipients=['0612345678', '12'])
+        with self.assertRaises(phonenumbers.InvalidPhoneNumber):
+            message.validate()
+        self.assertEqual(message.recipients, ['0612345678', '12'])
+
+    @override_settings(SMS_VALIDATE_RECIPIENTS=True)
+    def test_backend_validation(self) -> None:
+        """
+        Make sure invalid recipients are rejected without sending them, and
+        valid ones are sent in the E.164 format.
+        """
+        message = Message('Content', '+12065550100', [
+            '+31 6 12345678', '12345', '+32470123456'
+        ])
+        connection = sms.get_connection('tests.custombackend.SmsBackend')
+        with self.assertRaises(phonenumbers.InvalidPhoneNumber):
+            connection.send_messages([message])
+        outbox = connection.test_outbox  # type: ignore
+        self.assertEqual(
+            outbox[0].recipients, ['+31612345678', '+32470123456']
+        )
+        self.assertEqual(
+            [(error[0], error[1]) for error in connection.errors],
+            [(message, '12345')]
+        )
+
+        connection = sms.get_connection(
+            'tests.custombackend.SmsBackend', fail_silently=True
+        )
+        self.assertEqual(
+            connection.send_messages([Message('Content', '', ['12'])]), 0
+        )
+        self.assertEqual(connection.test_outbox, [])  # type: ignore
+        connection = sms.get_connection(
+            'tests.custombackend.SmsBackend', validate_recipients=False
+        )
+        self.assertEqual(
+            connection.send_messages([Message('Content', '', ['12'])]), 1
+        )
+
+
+class TemplateMessageTests(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.message = TemplateMessage(
+            'Hi {name}, your code is {code}', '+12065550100', [
+                ('+31612345670', {'name': 'Ann', 'code': 1}),
+                ('+31612345671', {'name': 'Bob', 'code': 2}),
+                ('+31612345672', {'name': 'Ann', 'code': 1, 'x': 'y'}),
+                ('+31612345673', {'name': 'Cid'}),
+            ]
+        )
+        sms.outbox = []  # type: ignore
+
+    def tearDown(self) -> None:
+        sms.outbox = []  # type: ignore
+
+    def test_template(self) -> None:
+        template = Template('Hi {user.name}, {total:.2f} {items[0]} {user}')
+        self.assertEqual(template.fields, ('user', 'total', 'items'))
+        self.assertIs(
+            compile_template('Hi {name}'), compile_template('Hi {name}')
+        )
+        for source in ('Hi {}', 'Hi {0}', 'Hi {0.name}'):
+            with self.assertRaises(ValueError):
+                Template(source)
+
+    def test_render(self) -> None:
+        """
+        Make sure recipients with identical bodies share a text message, and
+        identical contexts are rendered once.
+        """
+        self.assertEqual(self.message.body, 'Hi {name}, your code is {code}')
+        self.assertEqual(len(self.message.recipients), 4)
+        with patch.object(
+            Template, 'render', autospec=True, side_effect=Template.render
+        ) as render:
+            messages, failures = self.message.render()
+        self.assertEqual(render.call_count, 3)
+        self.assertEqual(
+            [(m.body, m.recipients, m.originator) for m in messages],
+            [
+                ('Hi Ann, your code is 1', ['+31612345670', '+31612345672'],
+                 '+12065550100'),
+                ('Hi Bob, your code is 2', ['+31612345671'], '+12065550100'),
+            ]
+        )
+        self.assertEqual(
+            [(recipient, type(exc)) for recipient, exc in failures],
+            [('+31612345673', KeyError)]
+        )
+
+        # Values that can't be formatted fail their recipient only
+        message = TemplateMessage('Total {total:.2f}', '', [
+            ('+1', {'total': None}), ('+2', {'total': 1.5}),
+        ])
+        messages, failures = message.render()
+        self.assertEqual([(m.body, m.recipients) for m in messages], [
+            ('Total 1.50', ['+2'])
+        ])
+        self.assertEqual(
+            [(recipient, type(exc)) for recipient, exc in failures],
+            [('+1', TypeError)]
+        )
+
+        # Contexts with unhashable values are rendered without the cache
+        message = TemplateMessage('{items}', '', (
+            (recipient, {'items': [1]}) for recipient in ('+1', '+2')
+        ))
+        messages, failures = message.render()
+        self.assertEqual([(m.body, m.recipients) for m in messages], [
+            ('[1]', ['+1', '+2'])
+        ])
+
+        # Equal values of different types are rendered separately
+        message = TemplateMessage('{code}', '', [
+            ('+1', {'code': 1}), ('+2', {'code': 1.0}), ('+3', {'code': True}),
+        ])
+        messages, failures = message.render()
+        self.assertEqual([(m.body, m.recipients) for m in messages], [
+            ('1', ['+1']), ('1.0', ['+2']), ('True', ['+3'])
+        ])
+
+    def test_send(self) -> None:
+        """
+        Make sure the backend sends a text message per distinct body, and
+        reports the results of the template message.
+        """
+        results = []
+
+        @receiver(post_send)
+        def f(instance, sent, failed, **kwargs):
+            results.append((instance, sent, failed))
+
+        self.addCleanup(post_send.disconnect, f)
+        connection = sms.get_connection('tests.custombackend.SmsBackend')
+        with self.assertRaises(KeyError):
+            connection.send_messages([self.message])
+        self.assertEqual(
+            [(m.body, m.recipients)
+             for m in connection.test_outbox],  # type: ignore
+            [
+                ('Hi Ann, your code is 1', ['+31612345670', '+31612345672']),
+                ('Hi Bob, your code is 2', ['+31612345671']),
+            ]
+        )
+        self.assertEqual(
+            [(error[0], error[1]) for error in connection.errors],
+            [(self.message, '+31612345673')]
+        )
+        self.assertEqual(results, [(self.message, 3, 1)])
+
+        self.message.contexts[3] = {'name': 'Cid', 'code': 3}
+        self.assertEqual(self.message.send(), 3)
+        self.assertEqual(len(sms.outbox), 3)  # type: ignore
+
+    @override_settings(SMS_VALIDATE_RECIPIENTS=True)
+    def test_validation(self) -> None:
+        message = TemplateMessage('Hi {name}', '', [
+            ('+31 6 12345678', {'name': 'Ann'}),
+            ('12345', {'name': 'Bob'}),
+        ])
+        connection = sms.get_connection(
+            'tests.custombackend.SmsBackend', fail_silently=True
+        )
+        self.assertEqual(connection.send_messages([message]), 1)
+        self.assertEqual(
+            [(m.body, m.recipients)
+             for m in connection.test_outbox],  # type: ignore
+            [('Hi Ann', ['+31612345678'])]
+        )
+        self.assertEqual(
+            [(error[0], error[1]) for error in connection.errors],
+            [(message, '12345')]
+        )
+
+
+@override_settings(
+    SMS_BACKEND='sms.backends.outbox.SmsBackend',
+    SMS_OUTBOX_BACKEND='sms.backends.locmem.SmsBackend',
+)
+class OutboxTests(TestCase):
+
+    def setUp(self) -> None:
+        from sms.contrib.outbox.models import OutboxMessage
+
+        self.OutboxMessage = OutboxMessage
+        sms.outbox = []  # type: ignore
+
+    def tearDown(self) -> None:
+        FailingBackend.exception = None
+        sms.outbox = []  # type: ignore
+
+    def dispatch(self, *args: str) -> str:
+        stdout = StringIO()
+        call_command('sms_dispatch', '--once', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_send_messages(self) -> None:
+        """
+        Make sure text messages are stored per recipient using bulk inserts
+        of the batch size.
+        """
+        connection = sms.get_connection(batch_size=2)
+        self.assertIsInstance(connection, outbox.SmsBackend)
+        with patch.object(
+            self.OutboxMessage.objects, 'bulk_create',
+            wraps=self.OutboxMessage.objects.bulk_create
+        ) as bulk_create:
+            count = connection.send_messages([
+                Message('Content', '+12065550100', ['+31612345678']),
+                Message('Other', '+12065550100', [
+                    '+31612345679', '+31612345680', '+31612345681'
+                ]),
+            ])
+        self.assertEqual(count, 4)
+        self.assertEqual(
+            [len(call.args[0]) for call in bulk_create.call_args_list],
+            [2, 2]
+        )
+        rows = self.OutboxMessage.objects.order_by('id')
+        self.assertEqual(
+            [(row.recipient, row.body, row.status) for row in rows], [
+                ('+31612345678', 'Content', 0),
+                ('+31612345679', 'Other', 0),
+                ('+31612345680', 'Other', 0),
+                ('+31612345681', 'Other', 0),
+            ]
+        )
+        self.assertEqual(sms.outbox, [])  # type: ignore
+
+    def test_dispatch(self) -> None:
+        """
+        Make sure the dispatcher sends all pending text messages in batches
+        and marks them as sent.
+        """
+        send_sms('Content', '+12065550100', [
+            '+31612345678', '+31612345679', '+31612345680'
+        ])
+        send_sms('Other', '+12065550100', ['+31612345681'])
+        output = self.dispatch('--batch-size', '2', '--verbosity', '2')
+        self.assertIn('Sent 4 text message(s), 0 failed.', output)
+        self.assertEqual(output.count('Sent 2 and failed 0'), 2)
+        self.assertEqual(
+            sorted(
+                (message.body, message.recipients)
+                for message in sms.outbox  # type: ignore
+            ), [
+                ('Content', ('+31612345678',)),
+                ('Content', ('+31612345679',)),
+                ('Content', ('+31612345680',)),
+                ('Other', ('+31612345681',)),
+            ]
+        )
+        Status = self.OutboxMessage.Status
+        self.assertEqual(
+            self.OutboxMessage.objects.filter(
+                status=Status.SENT, sent_at__isnull=False, attempts=1
+            ).count(),
+            4
+        )
+        # Sent text messages aren't sent again
+        self.assertIn('Sent 0 text message(s)', self.dispatch())
+        self.assertEqual(len(sms.outbox), 4)  # type: ignore
+
+    @override_settings(SMS_OUTBOX_BACKEND='tests.tests.FailingBackend')
+    def test_dispatch_failure(self) -> None:
+        """
+        Make sure transient errors are retried later and other errors mark
+        the text messages as failed.
+        """
+        Status = self.OutboxMessage.Status
+        send_sms('Content', '+12065550100', ['+31612345678'])
+        FailingBackend.exception = ConnectionError('Provider is down')
+        self.assertIn('Sent 0 text message(s), 0 failed.', self.dispatch())
+        row = self.OutboxMessage.objects.get()
+        self.assertEqual(
+            (row.status, row.attempts, row.error),
+            (Status.PENDING, 1, 'Provider is down')
+        )
+        self.assertGreater(row.scheduled_at, row.created_at)
+
+        row.scheduled_at = row.created_at
+        row.save()
+        FailingBackend.exception = ValueError('Invalid recipient')
+        self.assertIn('Sent 0 text message(s), 1 failed.', self.dispatch())
+        row.refresh_from_db()
+        self.assertEqual(
+            (row.status, row.attempts, row.error),
+            (Status.FAILED, 2, 'Invalid recipient')
+        )
+
+    @override_settings(
+        SMS_OUTBOX_BACKEND='tests.tests.FailingBackend',
+        SMS_CIRCUIT_BREAKERS={
+            'tests.tests.FailingBackend': {'min_calls': 1, 'cooldown': 30},
+        }
+    )
+    def test_dispatch_circuit_open(self) -> None:
+        """
+        Make sure text messages refused by an open circuit are sent again
+        later, without using up an attempt.
+        """
+        self.addCleanup(circuitbreaker._circuit_breakers.clear)
+        Status = self.OutboxMessage.Status
+        send_sms('Content', '+12065550100', ['+31612345678', '+31612345679'])
+        connection = sms.get_connection('tests.tests.FailingBackend')
+        breaker = connection.circuit_breaker
+        breaker.record(True)  # type: ignore
+        self.assertEqual(breaker.state, circuitbreaker.OPEN)  # type: ignore
+        self.assertIn('Sent 0 text message(s), 0 failed.', self.dispatch())
+        rows = self.OutboxMessage.objects.all()
+        self.assertEqual(
+            {(row.status, row.attempts) for row in rows}, {(Status.PENDING, 0)}
+        )
+        for row in rows:
+            self.assertGreater(
+                row.scheduled_at, row.created_at + timedelta(seconds=29)
+            )
+
+    def test_claim(self) -> None:
+        """
+        Make sure concurrent dispatchers claim different text messages, and
+        text messages of a stopped dispatcher are claimed again after the
+        lease.
+        """
+        from sms.contrib.outbox.management.commands import sms_dispatch
+
+        send_sms('Content', '+12065550100', [
+            f'+316123456{i:02d}' for i in range(5)
+        ])
+        dispatchers = []
+        for token in ('a', 'b'):
+            dispatcher = sms_dispatch.Command()
+            dispatcher.manager = self.OutboxMessage.objects
+            dispatcher.batch_size = 3
+            dispatcher.token = token
+            dispatcher.lease = timedelta(seconds=60)
+            dispatchers.append(dispatcher)
+        first = {row.id for row in dispatchers[0].claim()}
+        second = {row.id for row in dispatchers[1].claim()}
+        self.assertEqual((len(first), len(second)), (3, 2))
+        self.assertFalse(first & second)
+        self.assertEqual(dispatchers[1].claim(), [])
+
+        self.OutboxMessage.objects.filter(id__in=first).update(
+            claimed_at=timezone.now() - timedelta(seconds=61)
+        )
+        dispatchers[1].release_expired()
+        self.assertEqual(
+            {row.id for row in dispatchers[1].claim()}, first
+        )
+
+    def test_dispatch_reclaimed(self) -> None:
+        """
+        Make sure a dispatcher doesn't overwrite the status of text messages
+        claimed by another dispatcher after its lease expired.
+        """
+        from sms.contrib.outbox.management.commands import sms_dispatch
+
+        Status = self.OutboxMessage.Status
+        send_sms('Content', '+12065550100', ['+31612345678', '+31612345679'])
+        dispatcher = sms_dispatch.Command()
+        dispatcher.manager = self.OutboxMessage.objects
+        dispatcher.batch_size = 2
+        dispatcher.max_attempts = 1
+        dispatcher.token = 'a'
+        rows = dispatcher.claim()
+        self.OutboxMessage.objects.filter(id=rows[0].id).update(
+            claimed_by='b'
+        )
+        connection = sms.get_connection('tests.tests.FailingBackend')
+        FailingBackend.exception = ValueError('Invalid recipient')
+        self.assertEqual(dispatcher.dispatch(connection, rows), (0, 1))
+        self.assertEqual(
+            [
+                (row.status, row.claimed_by, row.error)
+                for row in self.OutboxMessage.objects.order_by('id')
+            ],
+            [
+                (Status.SENDING, 'b', ''),
+                (Status.FAILED, '', 'Invalid recipient'),
+            ]
+        )
+
+    @override_settings(SMS_OUTBOX_BACKEND=None)
+    def test_no_backend(self) -> None:
+        with self.assertRaisesMessage(CommandError, 'SMS_OUTBOX_BACKEND'):
+            self.dispatch()
+
+
+class CampaignTests(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.csv = os.path.join(self.tmp_dir, 'recipients.csv')
+        with open(self.csv, 'w') as file:
+            file.write('recipient,name\n')
+            for i in range(5):
+                file.write(f'+3161234567{i},Name {i}\n')
+        sms.outbox = []  # type: ignore
+
+    def tearDown(self) -> None:
+        sms.outbox = []  # type: ignore
+
+    def campaign(self, *args: str) -> str:
+        stdout = StringIO()
+        call_command(
+            'send_sms_campaign', *args, '--originator', '+12065550100',
+            stdout=stdout
+        )
+        return stdout.getvalue()
+
+    def test_send(self) -> None:
+        """
+        Make sure a text message is rendered and sent to each recipient, in
+        batches using a single connection.
+        """
+        with patch.object(
+            locmem.SmsBackend, 'open', autospec=True
+        ) as open_:
+            output = self.campaign(
+                self.csv, '--body', 'Hi {name}', '--batch-size', '2'
+            )
+        self.assertEqual(open_.call_count, 1)
+        self.assertEqual(
+            [(m.body, m.recipients) for m in sms.outbox],  # type: ignore
+            [(f'Hi Name {i}', [f'+3161234567{i}']) for i in range(5)]
+        )
+        self.assertIn('Sent: 5 sent, 0 failed, 5 rows done', output)
+
+    def test_stdin(self) -> None:
+        """Make sure the rows are read from stdin, using the body column."""
+        stdin = StringIO('recipient,body\n+31612345670,Content\n')
+        with patch('sys.stdin', stdin):
+            self.campaign('-')
+        message = sms.outbox[0]  # type: ignore
+        self.assertEqual(message.body, 'Content')
+        self.assertEqual(message.originator, '+12065550100')
+
+    def test_failures(self) -> None:
+        """
+        Make sure rows that can't be rendered or sent are reported and
+        written to the failures file.
+        """
+        with open(self.csv, 'a') as file:
+            file.write(',Nobody\n')
+        failures = os.path.join(self.tmp_dir, 'failures.csv')
+        output = self.campaign(
+            self.csv, '--body', 'Hi {name} {surname}', '--failures', failures
+        )
+        self.assertIn('0 sent, 6 failed', output)
+        with open(failures) as file:
+            rows = file.read().splitlines()
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0], "1,+31612345670,KeyError: 'surname'")
+        self.assertEqual(rows[5], "6,,Missing recipient column 'recipient'")
+
+        FailingBackend.exception = HttpError(503)
+        self.addCleanup(setattr, FailingBackend, 'exception', None)
+        output = self.campaign(
+            self.csv, '--body', 'Hi', '--backend', 'tests.tests.FailingBackend'
+        )
+        self.assertIn('0 sent, 6 failed', output)
+
+    @override_settings(SMS_VALIDATE_RECIPIENTS=True)
+    def test_validated_failures(self) -> None:
+        """
+        Make sure failed recipients reported in the E.164 format are traced
+        back to their rows.
+        """
+        with open(self.csv, 'w') as file:
+            file.write('recipient\n+31 6 12345678\n12345\n0031612345678\n')
+        failures = os.path.join(self.tmp_dir, 'failures.csv')
+        FailingBackend.exception = HttpError(400)
+        self.addCleanup(setattr, FailingBackend, 'exception', None)
+        output = self.campaign(
+            self.csv, '--body', 'Hi', '--failures', failures,
+            '--backend', 'tests.tests.FailingBackend'
+        )
+        self.assertIn('0 sent, 3 failed', output)
+        with open(failures) as file:
+            rows = sorted(file.read().splitlines())
+        self.assertEqual(
+            [row.split(',')[:2] for row in rows],
+            [['1', '+31 6 12345678'], ['2', '12345'], ['3', '0031612345678']]
+        )
+
+    def test_checkpoint(self) -> None:
+        """
+        Make sure the checkpoint file keeps track of the rows sent, so an
+        interrupted campaign resumes after them.
+        """
+        checkpoint = os.path.join(self.tmp_dir, 'checkpoint.json')
+        with open(checkpoint, 'w') as file:
+            json.dump({'rows': 3, 'sent': 3, 'failed': 0}, file)
+        output = self.campaign(
+            self.csv, '--body', 'Hi {name}', '--checkpoint', checkpoint
+        )
+        self.assertIn('Resuming after row 3.', output)
+        self.assertIn('Sent: 5 sent, 0 failed, 5 rows done', output)
+        self.assertEqual(
+            [m.body for m in sms.outbox],  # type: ignore
+            ['Hi Name 3', 'Hi Name 4']
+        )
+        with open(checkpoint) as file:
+            self.assertEqual(
+                json.load(file),
+                {'rows': 5, 'sent': 5, 'failed': 0, 'finished': []}
+            )
+
+        # Running the campaign again doesn't send any text message
+        sms.outbox = []  # type: ignore
+        self.campaign(self.csv, '--body', 'Hi', '--checkpoint', checkpoint)
+        self.assertEqual(sms.outbox, [])  # type: ignore
+
+    def test_checkpoint_out_of_order(self) -> None:
+        """
+        Make sure chunks that completed before the chunks preceding them
+        aren't sent again when resuming.
+        """
+        checkpoint = os.path.join(self.tmp_dir, 'checkpoint.json')
+        with open(checkpoint, 'w') as file:
+            json.dump(
+                {'rows': 1, 'sent': 3, 'failed': 0, 'finished': [[3, 4]]},
+                file
+            )
+        output = self.campaign(
+            self.csv, '--body', 'Hi {name}', '--checkpoint', checkpoint,
+            '--batch-size', '2'
+        )
+        self.assertIn('Sent: 5 sent, 0 failed, 5 rows done', output)
+        self.assertEqual(
+            [m.body for m in sms.outbox],  # type: ignore
+            ['Hi Name 1', 'Hi Name 4']
+        )
+        with open(checkpoint) as file:
+            self.assertEqual(
+                json.load(file),
+                {'rows': 5, 'sent': 5, 'failed': 0, 'finished': []}
+            )
+
+    def test_processes(self) -> None:
+        """
+        Make sure the rows are sent by a pool of processes, each with a
+        connection of its own.
+        """
+        out_dir = os.path.join(self.tmp_dir, 'out')
+        with override_settings(SMS_FILE_PATH=out_dir):
+            output = self.campaign(
+                self.csv, '--body', 'Hi {name}', '--processes', '2',
+                '--batch-size', '1',
+                '--backend', 'sms.backends.filebased.SmsBackend'
+            )
+        self.assertIn('Sent: 5 sent, 0 failed, 5 rows done', output)
+        content = ''
+        for filename in os.listdir(out_dir):
+            with open(os.path.join(out_dir, filename)) as file:
+                content += file.read()
+        for i in range(5):
+            self.assertIn(f'Hi Name {i}', content)
+
+    def test_invalid_options(self) -> None:
+        with self.assertRaises(CommandError):
+            self.campaign(self.csv, '--processes', '0')
+        with self.assertRaises(CommandError):
+            self.campaign(os.path.join(self.tmp_dir, 'missing.csv'))
+
+
+class SignalTests(SimpleTestCase):
+
+    def flush_mailbox(self) -> None:
+        sms.outbox = []  # type: ignore
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.flush_mailbox()
+
+    def test_signals_from_backend(self) -> None:
+        """
+        Make sure the signals are sent when calling send_messages() directly,
+        with the outcome of each text message.
+        """
+        calls: List[Any] = []
+
+        def on_pre_send(**kwargs) -> None:
+            calls.append(('pre_send', kwargs))
+
+        def on_post_send(**kwargs) -> None:
+            calls.append(('post_send', kwargs))
+
+        pre_send.connect(on_pre_send)
+        self.addCleanup(pre_send.disconnect, on_pre_send)
+        post_send.connect(on_post_send)
+        self.addCleanup(post_send.disconnect, on_post_send)
+
+        messages = [
+            Message('Here is the message', '+12065550100', ['+1', '+2']),
+            Message('Another message', '+12065550100', ['+3']),
+        ]
+        connection = sms.get_connection()
+        connection.send_messages(messages)
+        self.assertEqual([name for name, _ in calls], [
+            'pre_send', 'post_send', 'post_send'
+        ])
+        self.assertIs(calls[0][1]['backend'], connection)
+        self.assertEqual(calls[0][1]['messages'], messages)
+        kwargs = calls[1][1]
+        self.assertIs(kwargs['instance'], messages[0])
+        self.assertIs(kwargs['backend'], connection)
+        self.assertEqual(
+            (kwargs['sent'], kwargs['failed'], kwargs['errors']), (2, 0, [])
+        )
+        self.assertGreaterEqual(kwargs['duration'], 0)
+
+        # Failed recipients
+        calls.clear()
+        error = ValueError('Invalid recipient')
+        with override_settings(
+            TWILIO_ACCOUNT_SID='fake_account_sid',
+            TWILIO_AUTH_TOKEN='fake_auth_token',
+        ):
+            connection = sms.get_connection(
+                'sms.backends.twilio.SmsBackend', fail_silently=True
+            )
+
+        def create(to, **kwargs):
+            if to == '+2':
+                raise error
+
+        connection.client.messages.create = MagicMock(  # type: ignore
+            side_effect=create
+        )
+        connection.send_messages(messages)
+        self.assertEqual(
+            [
+                (kwargs['sent'], kwargs['failed'], kwargs['errors'])
+                for name, kwargs in calls if name == 'post_send'
+            ],
+            [(1, 1, [('+2', error)]), (1, 0, [])]
+        )
+
+        # Exceptions fail all recipients
+        calls.clear()
+        connection = sms.get_connection('tests.tests.FailingBackend')
+        FailingBackend.exception = error
+        self.addCleanup(setattr, FailingBackend, 'exception', None)
+        with self.assertRaises(ValueError):
+            connection.send_messages(messages[1:])
+        self.assertEqual(calls[1][1]['errors'], [('+3', error)])
+
+    @override_settings(SMS_ROUTER_BACKENDS=[
+        {'backend': 'sms.backends.locmem.SmsBackend'},
+    ])
+    def test_signals_from_outer_backend(self) -> None:
+        """Make sure the backends of a router don't send the signals."""
+        backends: List[Any] = []
+
+        def on_post_send(backend: BaseSmsBackend, **kwargs) -> None:
+            backends.append(backend)
+
+        post_send.connect(on_post_send)
+        self.addCleanup(post_send.disconnect, on_post_send)
+        connection = sms.get_connection('sms.backends.router.SmsBackend')
+        Message('Content', '+12065550100', ['+1'], connection).send()
+        self.assertEqual(backends, [connection])
+
+    def test_swallowed_failures(self) -> None:
+        """
+        Make sure recipients that failed silently aren't reported as sent.
+        """
+        registry = metrics.Registry()
+        sink = metrics.PrometheusSink(registry)
+        stream = MagicMock()
+        stream.write.side_effect = [None, None, None, OSError('Disk full')]
+        connection = sms.get_connection(
+            'sms.backends.console.SmsBackend',
+            fail_silently=True,
+            stream=stream
+        )
+        messages = [
+            Message('Here is the message', '+12065550100', ['+1']),
+            Message('Here is the message', '+12065550100', ['+2', '+3']),
+        ]
+        with patch('sms.backends.base.get_sinks', return_value=[sink]):
+            self.assertEqual(connection.send_messages(messages), 1)
+        self.assertEqual(
+            [recipient for _, recipient, _ in connection.errors], ['+2', '+3']
+        )
+        labels = (('backend', 'sms.backends.console.SmsBackend'),)
+        self.assertEqual(registry.get('sms_messages_sent_total', labels), 1)
+        self.assertEqual(registry.get('sms_messages_failed_total', labels), 2)
+
+    def test_prometheus_metrics(self) -> None:
+        registry = metrics.Registry()
+        sink = metrics.PrometheusSink(registry, buckets=[0.1, 1])
+        with patch('sms.backends.base.get_sinks', return_value=[sink]):
+            send_sms('Here is the message', '+12065550100', ['+1', '+2'])
+            send_sms('Here is the message', '+12065550100', ['+3'])
+        labels = (('backend', 'sms.backends.locmem.SmsBackend'),)
+        self.assertEqual(registry.get('sms_messages_sent_total', labels), 3)
+        self.assertEqual(registry.get('sms_messages_failed_total', labels), 0)
+        histogram = registry.get('sms_send_duration_seconds', labels)
+        self.assertEqual(histogram.count, 2)
+        output = registry.render()
+        self.assertIn(
+            'sms_messages_sent_total{backend="sms.backends.locmem.SmsBackend"}'
+            ' 3',
+            output
+        )
+        self.assertIn(
+            'sms_send_duration_seconds_bucket{backend="sms.backends.locmem.'
+            'SmsBackend",le="+Inf"} 2',
+            output
+        )
+
+    def test_statsd_metrics(self) -> None:
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        self.addCleanup(server.close)
+        with override_settings(SMS_METRICS=[{
+            'sink': 'sms.metrics.StatsdSink',
+            'options': {
+                'host': '127.0.0.1',
+                'port': server.getsockname()[1],
+                'tags': True,
+            },
+        }]):
+            send_sms('Here is the message', '+12065550100', ['+1', '+2'])
+        lines = server.recv(1024).decode().split('\n')
+        self.assertEqual(lines[:2], [
+            'sms.messages_sent:2|c|#backend:sms.backends.locmem.SmsBackend',
+            'sms.messages_failed:0|c|#backend:sms.backends.locmem.SmsBackend',
+        ])
+        self.assertRegex(lines[2], r'^sms\.send_duration:[0-9.]+\|ms\|#')
 
     def test_receiver_post_send_signal(self) -> None:
         """Make sure the post_send signal is called."""